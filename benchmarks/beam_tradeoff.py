@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Benchmark the speed/accuracy tradeoff of the zpar library variants
+built with different beam widths (see ``ZPAR_BEAMS`` in the Makefile)
+on the bundled sample of sentences. For each beam width, the median
+and total decoding time per sentence are reported for each model
+along with how closely its output agrees with that of the default
+build: the fraction of tokens with the same tag for the tagger, the
+fraction of identical trees for the parser, and the fraction of tokens
+with the same head (and the same head and label) for the dependency
+parser.
+
+:author: Nitin Madnani (nmadnani@ets.org)
+"""
+
+import argparse
+import os
+import time
+
+from six import print_
+
+from zpar import ZPar, available_beams
+from zpar.agreement import agreement, format_agreement
+
+_SAMPLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            'data', 'sample.txt')
+
+_MODEL_METHODS = [('tagger', 'get_tagger', 'tag_sentence'),
+                  ('parser', 'get_parser', 'parse_sentence'),
+                  ('depparser', 'get_depparser', 'dep_parse_sentence')]
+
+
+def decode(modeldir, beam, models, sentences):
+    """
+    Decode the given sentences with the given models using the library
+    built with the given beam width and return the outputs and the
+    per-sentence timings for each model.
+    """
+    results = {}
+    with ZPar(modeldir, beam=beam) as z:
+        for model_name, getter, method_name in _MODEL_METHODS:
+            if model_name not in models:
+                continue
+            method = getattr(getattr(z, getter)(), method_name)
+            outputs = []
+            timings = []
+            for sentence in sentences:
+                start = time.time()
+                outputs.append(method(sentence))
+                timings.append(time.time() - start)
+            results[model_name] = (outputs, timings)
+    return results
+
+
+def main():
+    # set up an argument parser
+    parser = argparse.ArgumentParser(prog='beam_tradeoff.py')
+    parser.add_argument('--modeldir', dest='modeldir',
+                        help="Path to directory containing zpar English models",
+                        required=True)
+    parser.add_argument('--models', dest='models', nargs='+',
+                        help="Benchmark only these models",
+                        default=['tagger', 'parser', 'depparser'])
+    parser.add_argument('--beams', dest='beams', type=int, nargs='+',
+                        help="Beam widths to benchmark (default: all "
+                             "of the library variants that were built)")
+    parser.add_argument('--input', dest='inputfile',
+                        help="File with one sentence per line to decode",
+                        default=_SAMPLE_PATH)
+
+    # parse given command line arguments
+    args = parser.parse_args()
+
+    with open(args.inputfile, 'rb') as inputf:
+        sentences = [line.decode('utf-8').strip() for line in inputf if line.strip()]
+
+    beams = args.beams if args.beams is not None else available_beams()
+    reference = decode(args.modeldir, None, args.models, sentences)
+    variants = [(None, reference)] + [(beam, decode(args.modeldir, beam, args.models, sentences))
+                                      for beam in beams]
+
+    print_('{} sentences from {}'.format(len(sentences), args.inputfile))
+    for model_name, _, _ in _MODEL_METHODS:
+        if model_name not in args.models:
+            continue
+        print_('\n{}:'.format(model_name))
+        for beam, results in variants:
+            outputs, timings = results[model_name]
+            timings = sorted(timings)
+            print_('  beam {:>7}: median {:.2f} ms, total {:.1f} ms, '
+                   '{}'.format('default' if beam is None else beam,
+                               timings[len(timings) // 2] * 1000,
+                               sum(timings) * 1000,
+                               format_agreement(agreement(model_name, outputs,
+                                                          reference[model_name][0]))))
+
+
+if __name__ == '__main__':
+    main()
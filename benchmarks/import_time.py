@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Benchmark how long it takes to ``import zpar`` and to construct a
+``ZPar`` object in a fresh Python process, since both are paid by
+every short-lived command line invocation and worker process.
+
+:author: Nitin Madnani (nmadnani@ets.org)
+"""
+
+import argparse
+import subprocess
+import sys
+
+from six import print_
+
+# the code timed in each fresh interpreter; the time taken by
+# the interpreter itself to start up is not included
+_IMPORT_CODE = """
+import time
+start = time.time()
+import zpar
+print(time.time() - start)
+"""
+
+_CONSTRUCT_CODE = """
+import time
+import zpar
+start = time.time()
+z = zpar.ZPar({!r})
+print(time.time() - start)
+"""
+
+
+def time_in_fresh_process(code, repeats):
+    timings = []
+    for _ in range(repeats):
+        output = subprocess.check_output([sys.executable, '-c', code])
+        timings.append(float(output.decode('utf-8').strip().split()[-1]))
+    return sorted(timings)
+
+
+def report(name, timings):
+    median = timings[len(timings) // 2]
+    print_('{}: median {:.1f} ms, min {:.1f} ms, max {:.1f} ms '
+           '({} runs)'.format(name, median * 1000, timings[0] * 1000,
+                              timings[-1] * 1000, len(timings)))
+
+
+def main():
+    # set up an argument parser
+    parser = argparse.ArgumentParser(prog='import_time.py')
+    parser.add_argument('--modeldir', dest='modeldir',
+                        help="Path to directory containing zpar English "
+                             "models; if given, also time ZPar construction",
+                        required=False)
+    parser.add_argument('--repeats', dest='repeats', type=int,
+                        help="Number of fresh processes to time",
+                        default=10)
+    parser.add_argument('--max-import-ms', dest='max_import_ms', type=float,
+                        help="Exit with an error if the median import "
+                             "time is more than this many milliseconds")
+
+    # parse given command line arguments
+    args = parser.parse_args()
+
+    import_timings = time_in_fresh_process(_IMPORT_CODE, args.repeats)
+    report('import zpar', import_timings)
+
+    if args.modeldir:
+        construct_timings = time_in_fresh_process(_CONSTRUCT_CODE.format(args.modeldir),
+                                                  args.repeats)
+        report('ZPar(...)', construct_timings)
+
+    # make sure that importing zpar did not pull in nltk
+    output = subprocess.check_output([sys.executable, '-c',
+                                      'import sys, zpar; print("nltk" in sys.modules)'])
+    if output.decode('utf-8').strip() != 'False':
+        sys.stderr.write('Error: importing zpar also imports nltk.\n')
+        sys.exit(1)
+
+    median_import_ms = import_timings[len(import_timings) // 2] * 1000
+    if args.max_import_ms and median_import_ms > args.max_import_ms:
+        sys.stderr.write('Error: median import time {:.1f} ms is more than '
+                         '{:.1f} ms.\n'.format(median_import_ms, args.max_import_ms))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Soak test for opening and closing ``ZPar`` sessions: a ``ZPar`` object
+is created, used and closed thousands of times in the same process and
+the resident set size (RSS) of the process is sampled as it goes. After
+the warm-up cycles, the RSS should stay flat; the script exits with an
+error if it grows by more than the given number of megabytes.
+
+:author: Nitin Madnani (nmadnani@ets.org)
+"""
+
+import argparse
+import os
+import resource
+import sys
+import time
+
+from six import print_
+
+from zpar import ZPar
+
+_MODEL_GETTERS = {'tagger': ('get_tagger', 'tag_sentence'),
+                  'parser': ('get_parser', 'parse_sentence'),
+                  'depparser': ('get_depparser', 'dep_parse_sentence')}
+
+_SENTENCE = "I am going to the market. Don't you want to come with me?"
+
+
+def rss_mb():
+    """
+    Return the current resident set size of this process in megabytes,
+    or the peak resident set size where the current one is not known.
+    """
+    try:
+        with open('/proc/self/statm') as statmf:
+            pages = int(statmf.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / float(1 << 20)
+    except (IOError, OSError):
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # the peak is in bytes on Mac and in kilobytes elsewhere
+        return maxrss / float(1 << 20 if sys.platform == 'darwin' else 1 << 10)
+
+
+def cycle(modeldir, models):
+    """
+    Open a session, get each of the given models twice, use them and
+    the tokenizer on a sentence and close the session again.
+    """
+    with ZPar(modeldir) as z:
+        z.tokenize(_SENTENCE)
+        for model_name in models:
+            getter, method_name = _MODEL_GETTERS[model_name]
+            getattr(z, getter)()
+            getattr(getattr(z, getter)(), method_name)(_SENTENCE)
+
+
+def main():
+    # set up an argument parser
+    parser = argparse.ArgumentParser(prog='session_soak.py')
+    parser.add_argument('--modeldir', dest='modeldir',
+                        help="Path to directory containing zpar English models",
+                        required=True)
+    parser.add_argument('--models', dest='models', nargs='+',
+                        choices=sorted(_MODEL_GETTERS), default=['tagger'],
+                        help="Models to load (twice) and decode with in "
+                             "every cycle")
+    parser.add_argument('--cycles', dest='cycles', type=int,
+                        help="Number of sessions to open and close",
+                        default=2000)
+    parser.add_argument('--warmup', dest='warmup', type=int,
+                        help="Number of cycles to run before the "
+                             "baseline RSS is taken",
+                        default=20)
+    parser.add_argument('--report-every', dest='report_every', type=int,
+                        help="Number of cycles between RSS samples",
+                        default=200)
+    parser.add_argument('--max-growth-mb', dest='max_growth_mb', type=float,
+                        help="Exit with an error if the RSS grows by more "
+                             "than this many megabytes after the warm-up",
+                        default=8.0)
+
+    # parse given command line arguments
+    args = parser.parse_args()
+
+    for _ in range(args.warmup):
+        cycle(args.modeldir, args.models)
+    baseline = rss_mb()
+    print_('baseline after {} cycles: {:.1f} MB'.format(args.warmup, baseline))
+
+    start = time.time()
+    for i in range(1, args.cycles + 1):
+        cycle(args.modeldir, args.models)
+        if i % args.report_every == 0 or i == args.cycles:
+            print_('{} cycles: {:.1f} MB ({:+.1f} MB), {:.2f} ms per '
+                   'cycle'.format(i, rss_mb(), rss_mb() - baseline,
+                                  (time.time() - start) * 1000 / i))
+
+    growth = rss_mb() - baseline
+    if growth > args.max_growth_mb:
+        sys.stderr.write('Error: RSS grew by {:.1f} MB over {} cycles, more than '
+                         '{:.1f} MB.\n'.format(growth, args.cycles, args.max_growth_mb))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Benchmark the optimized variants of the zpar library (see
+``ZPAR_VARIANTS`` in the Makefile) against the generic build by
+decoding the bundled sample of sentences with each model in a fresh
+process for each variant, and record the speedups next to the
+library so that ``ZPar`` loads the fastest variant. With ``--train``,
+just decode the sample once with the library that ``ZPAR_VARIANT``
+names; this is how the Makefile collects the profile for the
+profile-guided (pgo) variant.
+
+:author: Nitin Madnani (nmadnani@ets.org)
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from six import print_
+
+import zpar
+from zpar.variants import (VARIANT_ENV, VARIANTS, is_compatible,
+                           library_name, read_variants, record_speedups)
+
+_SAMPLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            'data', 'sample.txt')
+
+_DIST_PATH = os.path.join(os.path.dirname(os.path.abspath(zpar.__file__)), 'dist')
+
+_MODEL_METHODS = [('tagger', 'get_tagger', 'tag_sentence'),
+                  ('parser', 'get_parser', 'parse_sentence'),
+                  ('depparser', 'get_depparser', 'dep_parse_sentence')]
+
+
+def decode_sample(modeldir, sentences, repeats):
+    """
+    Decode the given sentences with each model the given number of
+    times using the library variant picked by ``ZPar`` and return the
+    fastest time taken by each model, in seconds.
+    """
+    timings = {}
+    with zpar.ZPar(modeldir) as z:
+        for model_name, getter, method_name in _MODEL_METHODS:
+            method = getattr(getattr(z, getter)(), method_name)
+            best = None
+            for _ in range(repeats):
+                start = time.time()
+                for sentence in sentences:
+                    method(sentence)
+                elapsed = time.time() - start
+                best = elapsed if best is None else min(best, elapsed)
+            timings[model_name] = best
+    return timings
+
+
+def time_variant(variant, args):
+    """
+    Time the given variant in a fresh process so that
+    each variant gets its own copy of the library.
+    """
+    env = os.environ.copy()
+    env[VARIANT_ENV] = variant
+    output = subprocess.check_output([sys.executable, os.path.abspath(__file__),
+                                      '--modeldir', args.modeldir,
+                                      '--input', args.inputfile,
+                                      '--repeats', str(args.repeats),
+                                      '--time'], env=env)
+    return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+
+def main():
+    # set up an argument parser
+    parser = argparse.ArgumentParser(prog='variant_speedup.py')
+    parser.add_argument('--modeldir', dest='modeldir',
+                        help="Path to directory containing zpar English models",
+                        required=True)
+    parser.add_argument('--input', dest='inputfile',
+                        help="File with one sentence per line to decode",
+                        default=_SAMPLE_PATH)
+    parser.add_argument('--repeats', dest='repeats', type=int,
+                        help="Number of times to decode the input with "
+                             "each model; the fastest time is used",
+                        default=3)
+    parser.add_argument('--train', dest='train', action='store_true',
+                        help="Just decode the input once (to collect a profile)")
+    parser.add_argument('--time', dest='time', action='store_true',
+                        help="Just print the timings of the current variant as JSON")
+    parser.add_argument('--no-record', dest='record', action='store_false',
+                        help="Do not record the speedups next to the library")
+
+    # parse given command line arguments
+    args = parser.parse_args()
+
+    with open(args.inputfile, 'rb') as inputf:
+        sentences = [line.decode('utf-8').strip() for line in inputf if line.strip()]
+
+    if args.train:
+        decode_sample(args.modeldir, sentences, 1)
+        return
+
+    if args.time:
+        print_(json.dumps(decode_sample(args.modeldir, sentences, args.repeats)))
+        return
+
+    # only the variants that can run on this CPU can be timed
+    variants = read_variants(_DIST_PATH)
+    built = [variant for variant in VARIANTS
+             if variant in variants and is_compatible(variants[variant]) and
+             os.path.exists(os.path.join(_DIST_PATH, library_name(variant)))]
+    if not built:
+        sys.stderr.write('No optimized variants of the zpar library that can '
+                         'run on this CPU were found in {}.\n'.format(_DIST_PATH))
+        sys.exit(1)
+
+    generic = time_variant('generic', args)
+    speedups = {}
+    print_('{} sentences from {}, fastest of {} runs'.format(len(sentences),
+                                                             args.inputfile,
+                                                             args.repeats))
+    print_('{:>8}  {:>10}  {:>10}  {:>10}  {:>8}'.format('variant', 'tagger',
+                                                         'parser', 'depparser',
+                                                         'speedup'))
+    for variant in ['generic'] + built:
+        timings = generic if variant == 'generic' else time_variant(variant, args)
+        speedup = sum(generic.values()) / sum(timings.values())
+        if variant != 'generic':
+            speedups[variant] = round(speedup, 3)
+        print_('{:>8}  {:>8.1f}ms  {:>8.1f}ms  {:>8.1f}ms  {:>7.2f}x'.format(variant,
+                                                                            timings['tagger'] * 1000,
+                                                                            timings['parser'] * 1000,
+                                                                            timings['depparser'] * 1000,
+                                                                            speedup))
+
+    if args.record:
+        record_speedups(speedups, _DIST_PATH)
+
+
+if __name__ == '__main__':
+    main()
@@ -19,6 +19,17 @@ def readme():
         return f.read()
 
 class build_zpar(build):
+
+    user_options = build.user_options + [
+        ('zpar-variants=', None,
+         'optimized variants of the ZPar library to also build, '
+         'e.g., "native lto pgo" (see ZPAR_VARIANTS in the Makefile)'),
+    ]
+
+    def initialize_options(self):
+        build.initialize_options(self)
+        self.zpar_variants = None
+
     def run(self):
 
         # run original build code
@@ -39,6 +50,10 @@ class build_zpar(build):
         else:
             cmd = ['make']
 
+        # pass on any optimized variants of the library to build
+        if self.zpar_variants:
+            env['ZPAR_VARIANTS'] = self.zpar_variants
+
         # compile the shared library path
         def compile():
             sys.stderr.write('*' * 80 + '\n')
@@ -108,5 +123,9 @@ setup(
         'install': install_zpar,
     },
     entry_points={'console_scripts':
-                  ['zpar_server = zpar.zpar_server:main']}
+                  ['zpar_server = zpar.zpar_server:main',
+                   'zpar_lemma_table = zpar.lemmatizer:main',
+                   'zpar_index = zpar.sentence_index:main',
+                   'zpar_prune = zpar.prune:main',
+                   'zpar_dispatch = zpar.dispatch:main']}
 )
@@ -34,6 +34,10 @@ struct zparSession_t
     CDepParser* depparser;
     char *output_buffer;
 
+    // the output of the last sentence function, whose
+    // memory is reused from one sentence to the next
+    std::string last_output;
+
     zparSession_t() {
         tagger = NULL;
         conparser = NULL;
@@ -55,7 +59,7 @@ struct zparSession_t
             depparser = NULL;
         }
         if (output_buffer) {
-            delete output_buffer;
+            delete[] output_buffer;
             output_buffer = NULL;
         }
     };
@@ -119,6 +123,12 @@ extern "C" int load_tagger(void* vzps, const char* sFeaturePath) {
 
     zparSession_t* zps = static_cast<zparSession_t *>(vzps);
 
+    // the tagger is shared by all the models in the session, so
+    // there is no need to load it again if it is already loaded
+    if (zps->tagger) {
+        return 0;
+    }
+
     std::string sTaggerFeatureFile = std::string(sFeaturePath) + "/tagger";
     std::cerr << "Loading tagger from " << sTaggerFeatureFile << std::endl;
     if (!FileExists(sTaggerFeatureFile)) {
@@ -143,6 +153,11 @@ extern "C" int load_parser(void* vzps, const char *sFeaturePath) {
         }
     }
 
+    // reuse the constituency parser if it is already loaded
+    if (zps->conparser) {
+        return 0;
+    }
+
     CConParser *conparser;
     std::string sConParserFeatureFile = std::string(sFeaturePath) + "/conparser";
     std::cerr << "Loading constituency parser from " << sConParserFeatureFile << std::endl;
@@ -169,6 +184,11 @@ extern "C" int load_depparser(void* vzps, const char *sFeaturePath) {
         }
     }
 
+    // reuse the dependency parser if it is already loaded
+    if (zps->depparser) {
+        return 0;
+    }
+
     CDepParser *depparser;
     std::string sDepParserFeatureFile = std::string(sFeaturePath) + "/depparser";
     std::cerr << "Loading dependency parser from " << sDepParserFeatureFile << std::endl;
@@ -197,12 +217,42 @@ extern "C" int load_models(void* vzps, const char *sFeaturePath) {
     return 0;
 }
 
-// Function to tag a sentence
-extern "C" char* tag_sentence(void* vzps, const char *input_sentence, bool tokenize)
+// copy the given output into a freshly allocated output
+// buffer in the session and return that buffer
+char* set_output_buffer(zparSession_t* zps, const std::string &output)
 {
+    if (zps->output_buffer != NULL) {
+        delete[] zps->output_buffer;
+        zps->output_buffer = NULL;
+    }
+    zps->output_buffer = new char[output.length() + 1];
+    strcpy(zps->output_buffer, output.c_str());
+    return zps->output_buffer;
+}
 
+// copy the given output into the caller's buffer if it fits and
+// return its length either way; if it did not fit, the caller can
+// grow its buffer and get the output with copy_output()
+long write_output(const std::string &output, char *buffer, long buffer_size)
+{
+    long output_length = output.length();
+    if (output_length <= buffer_size) {
+        memcpy(buffer, output.data(), output_length);
+    }
+    return output_length;
+}
+
+// Function to copy the output of the last call to one of the
+// *_into functions into the given buffer if it fits
+extern "C" long copy_output(void* vzps, char *buffer, long buffer_size)
+{
     zparSession_t* zps = static_cast<zparSession_t *>(vzps);
+    return write_output(zps->last_output, buffer, buffer_size);
+}
 
+// Tag a sentence into the given output string
+void tag_sentence_to_string(zparSession_t* zps, const char *input_sentence, bool tokenize, std::string &output)
+{
     try {
         // create a temporary string stream from the input char *
         CSentenceReader input_reader(std::string(input_sentence), false);
@@ -225,30 +275,17 @@ extern "C" char* tag_sentence(void* vzps, const char *input_sentence, bool token
         // tag the sentence
         tagger->tag(input_sent, tagged_sent);
 
-        // format the tagged sentence properly and return
-        std::string tagvec = format_tagged_vector(tagged_sent);
-        int tagveclen = tagvec.length();
-
-        if (zps->output_buffer != NULL) {
-            delete zps->output_buffer;
-            zps->output_buffer = NULL;
-        }
-        zps->output_buffer = new char[tagveclen + 1];
-        strcpy(zps->output_buffer, tagvec.c_str());
+        // format the tagged sentence properly
+        output = format_tagged_vector(tagged_sent);
     } catch (const std::string &e) {
         std::cerr << e << std::endl;
-        zps->output_buffer = new char[1];
-        strcpy(zps->output_buffer, "");
+        output.clear();
     }
-    return zps->output_buffer;
 }
 
-// Function to constituency parse a sentence
-extern "C" char* parse_sentence(void* vzps, const char *input_sentence, bool tokenize)
+// Constituency parse a sentence into the given output string
+void parse_sentence_to_string(zparSession_t* zps, const char *input_sentence, bool tokenize, std::string &output)
 {
-
-    zparSession_t* zps = static_cast<zparSession_t *>(vzps);
-
     try {
 
         // create a temporary string stream from the input char *
@@ -263,16 +300,10 @@ extern "C" char* parse_sentence(void* vzps, const char *input_sentence, bool tok
             input_reader.readSegmentedSentence(tokenized_sent);
         }
 
-        if (zps->output_buffer != NULL) {
-            delete zps->output_buffer;
-            zps->output_buffer = NULL;
-        }
-
         if(tokenized_sent->size() >= MAX_SENTENCE_SIZE){
             // The ZPar code asserts that length < MAX_SENTENCE_SIZE...
             std::cerr << "Sentence too long. Returning empty string. Sentence: " << input_sentence << std::endl;
-            zps->output_buffer = new char[1];
-            strcpy(zps->output_buffer, "");
+            output.clear();
         } else {
             // initialize the variables that will hold the tagged and parsed sentences
             CTwoStringVector tagged_sent[1];
@@ -286,26 +317,18 @@ extern "C" char* parse_sentence(void* vzps, const char *input_sentence, bool tok
             tagger->tag(tokenized_sent, tagged_sent);
             conparser->parse(*tagged_sent, parsed_sent);
 
-            // now put the parsed sentence into a string stream
-            std::string parse = parsed_sent->str_unbinarized();
-            int parselen = parse.length();
-            zps->output_buffer = new char[parselen + 1];
-            strcpy(zps->output_buffer, parse.c_str());
+            // now get the string for the parsed sentence
+            output = parsed_sent->str_unbinarized();
         }
     } catch (const std::string &e) {
         std::cerr << e << std::endl;
-        zps->output_buffer = new char[1];
-        strcpy(zps->output_buffer, "");
+        output.clear();
     }
-
-    return zps->output_buffer;
 }
 
-extern "C" char* parse_tagged_sentence(void* vzps, const char *input_tagged_sentence, const char seperator='/')
+// Constituency parse a tagged sentence into the given output string
+void parse_tagged_sentence_to_string(zparSession_t* zps, const char *input_tagged_sentence, const char seperator, std::string &output)
 {
-
-    zparSession_t* zps = static_cast<zparSession_t *>(vzps);
-
     try {
         // create a temporary string stream from the input char *
         CSentenceReader input_reader(std::string(input_tagged_sentence), false);
@@ -314,16 +337,10 @@ extern "C" char* parse_tagged_sentence(void* vzps, const char *input_tagged_sent
         CTwoStringVector tagged_sent[1];
         input_reader.readTaggedSentence(tagged_sent, false, seperator);
 
-        if (zps->output_buffer != NULL) {
-            delete zps->output_buffer;
-            zps->output_buffer = NULL;
-        }
-
         if(tagged_sent->size() >= MAX_SENTENCE_SIZE){
             // The ZPar code asserts that length < MAX_SENTENCE_SIZE...
             std::cerr << "Sentence too long. Returning empty string. Sentence: " << input_tagged_sentence << std::endl;
-            zps->output_buffer = new char[1];
-            strcpy(zps->output_buffer, "");
+            output.clear();
         } else {
             // initialize the variable that will hold the parsed sentence
             english::CCFGTree parsed_sent[1];
@@ -334,26 +351,19 @@ extern "C" char* parse_tagged_sentence(void* vzps, const char *input_tagged_sent
             // parse the tagged sentence
             conparser->parse(*tagged_sent, parsed_sent);
 
-            // now put the parsed sentence into a string stream
-            std::string parse = parsed_sent->str_unbinarized();
-            int parselen = parse.length();
-            zps->output_buffer = new char[parselen + 1];
-            strcpy(zps->output_buffer, parse.c_str());
+            // now get the string for the parsed sentence
+            output = parsed_sent->str_unbinarized();
         }
 
     } catch (const std::string &e) {
         std::cerr << e << std::endl;
-        zps->output_buffer = new char[1];
-        strcpy(zps->output_buffer, "");
+        output.clear();
     }
-    return zps->output_buffer;
 }
 
-// Function to dependency parse a sentence
-extern "C" char* dep_parse_sentence(void* vzps, const char *input_sentence, bool tokenize)
+// Dependency parse a sentence into the given output string
+void dep_parse_sentence_to_string(zparSession_t* zps, const char *input_sentence, bool tokenize, std::string &output)
 {
-    zparSession_t* zps = static_cast<zparSession_t *>(vzps);
-
     try {
 
         // create a temporary string stream from the input char *
@@ -368,16 +378,10 @@ extern "C" char* dep_parse_sentence(void* vzps, const char *input_sentence, bool
             input_reader.readSegmentedSentence(tokenized_sent);
         }
 
-        if (zps->output_buffer != NULL) {
-            delete zps->output_buffer;
-            zps->output_buffer = NULL;
-        }
-
         if(tokenized_sent->size() >= MAX_SENTENCE_SIZE){
             // The ZPar code asserts that length < MAX_SENTENCE_SIZE...
             std::cerr << "Sentence too long. Returning empty string. Sentence: " << input_sentence << std::endl;
-            zps->output_buffer = new char[1];
-            strcpy(zps->output_buffer, "");
+            output.clear();
         } else {
 
             // initialize the variable that will hold the tagged and parsed sentences
@@ -392,27 +396,19 @@ extern "C" char* dep_parse_sentence(void* vzps, const char *input_sentence, bool
             tagger->tag(tokenized_sent, tagged_sent);
             depparser->parse(*tagged_sent, parsed_sent);
 
-            // now output the formatted dependency tree
-            std::string deptree = format_dependency_tree(parsed_sent);
-            int deptreelen = deptree.length();
-            zps->output_buffer = new char[deptreelen + 1];
-            strcpy(zps->output_buffer, deptree.c_str());
+            // now get the formatted dependency tree
+            output = format_dependency_tree(parsed_sent);
         }
 
     } catch (const std::string &e) {
         std::cerr << e << std::endl;
-        zps->output_buffer = new char[1];
-        strcpy(zps->output_buffer, "");
+        output.clear();
     }
-
-    return zps->output_buffer;
 }
 
-// Function to dependency parse a sentence
-extern "C" char* dep_parse_tagged_sentence(void* vzps, const char *input_tagged_sentence, const char seperator='/')
+// Dependency parse a tagged sentence into the given output string
+void dep_parse_tagged_sentence_to_string(zparSession_t* zps, const char *input_tagged_sentence, const char seperator, std::string &output)
 {
-    zparSession_t* zps = static_cast<zparSession_t *>(vzps);
-
     try {
         // create a temporary string stream from the input char *
         CSentenceReader input_reader(std::string(input_tagged_sentence), false);
@@ -421,16 +417,10 @@ extern "C" char* dep_parse_tagged_sentence(void* vzps, const char *input_tagged_
         CTwoStringVector tagged_sent[1];
         input_reader.readTaggedSentence(tagged_sent, false, seperator);
 
-        if (zps->output_buffer != NULL) {
-            delete zps->output_buffer;
-            zps->output_buffer = NULL;
-        }
-
         if(tagged_sent->size() >= MAX_SENTENCE_SIZE){
             // The ZPar code asserts that length < MAX_SENTENCE_SIZE...
             std::cerr << "Sentence too long. Returning empty string. Sentence: " << input_tagged_sentence << std::endl;
-            zps->output_buffer = new char[1];
-            strcpy(zps->output_buffer, "");
+            output.clear();
         } else {
 
             // initialize the variable that will hold the parsed sentence
@@ -442,22 +432,133 @@ extern "C" char* dep_parse_tagged_sentence(void* vzps, const char *input_tagged_
             // parse the sentence
             depparser->parse(*tagged_sent, parsed_sent);
 
-            // now output the formatted dependency tree
-            std::string deptree = format_dependency_tree(parsed_sent);
-            int deptreelen = deptree.length();
-            zps->output_buffer = new char[deptreelen + 1];
-            strcpy(zps->output_buffer, deptree.c_str());
+            // now get the formatted dependency tree
+            output = format_dependency_tree(parsed_sent);
         }
 
     } catch (const std::string &e) {
         std::cerr << e << std::endl;
-        zps->output_buffer = new char[1];
-        strcpy(zps->output_buffer, "");
+        output.clear();
     }
+}
 
-    return zps->output_buffer;
+// Function to tag a sentence
+extern "C" char* tag_sentence(void* vzps, const char *input_sentence, bool tokenize)
+{
+    zparSession_t* zps = static_cast<zparSession_t *>(vzps);
+    tag_sentence_to_string(zps, input_sentence, tokenize, zps->last_output);
+    return set_output_buffer(zps, zps->last_output);
 }
 
+// Function to tag a sentence into the caller's buffer
+extern "C" long tag_sentence_into(void* vzps, const char *input_sentence, bool tokenize, char *buffer, long buffer_size)
+{
+    zparSession_t* zps = static_cast<zparSession_t *>(vzps);
+    tag_sentence_to_string(zps, input_sentence, tokenize, zps->last_output);
+    return write_output(zps->last_output, buffer, buffer_size);
+}
+
+// Function to constituency parse a sentence
+extern "C" char* parse_sentence(void* vzps, const char *input_sentence, bool tokenize)
+{
+    zparSession_t* zps = static_cast<zparSession_t *>(vzps);
+    parse_sentence_to_string(zps, input_sentence, tokenize, zps->last_output);
+    return set_output_buffer(zps, zps->last_output);
+}
+
+// Function to constituency parse a sentence into the caller's buffer
+extern "C" long parse_sentence_into(void* vzps, const char *input_sentence, bool tokenize, char *buffer, long buffer_size)
+{
+    zparSession_t* zps = static_cast<zparSession_t *>(vzps);
+    parse_sentence_to_string(zps, input_sentence, tokenize, zps->last_output);
+    return write_output(zps->last_output, buffer, buffer_size);
+}
+
+extern "C" char* parse_tagged_sentence(void* vzps, const char *input_tagged_sentence, const char seperator='/')
+{
+    zparSession_t* zps = static_cast<zparSession_t *>(vzps);
+    parse_tagged_sentence_to_string(zps, input_tagged_sentence, seperator, zps->last_output);
+    return set_output_buffer(zps, zps->last_output);
+}
+
+// Function to constituency parse a tagged sentence into the caller's buffer
+extern "C" long parse_tagged_sentence_into(void* vzps, const char *input_tagged_sentence, const char seperator, char *buffer, long buffer_size)
+{
+    zparSession_t* zps = static_cast<zparSession_t *>(vzps);
+    parse_tagged_sentence_to_string(zps, input_tagged_sentence, seperator, zps->last_output);
+    return write_output(zps->last_output, buffer, buffer_size);
+}
+
+// Function to dependency parse a sentence
+extern "C" char* dep_parse_sentence(void* vzps, const char *input_sentence, bool tokenize)
+{
+    zparSession_t* zps = static_cast<zparSession_t *>(vzps);
+    dep_parse_sentence_to_string(zps, input_sentence, tokenize, zps->last_output);
+    return set_output_buffer(zps, zps->last_output);
+}
+
+// Function to dependency parse a sentence into the caller's buffer
+extern "C" long dep_parse_sentence_into(void* vzps, const char *input_sentence, bool tokenize, char *buffer, long buffer_size)
+{
+    zparSession_t* zps = static_cast<zparSession_t *>(vzps);
+    dep_parse_sentence_to_string(zps, input_sentence, tokenize, zps->last_output);
+    return write_output(zps->last_output, buffer, buffer_size);
+}
+
+// Function to dependency parse a sentence
+extern "C" char* dep_parse_tagged_sentence(void* vzps, const char *input_tagged_sentence, const char seperator='/')
+{
+    zparSession_t* zps = static_cast<zparSession_t *>(vzps);
+    dep_parse_tagged_sentence_to_string(zps, input_tagged_sentence, seperator, zps->last_output);
+    return set_output_buffer(zps, zps->last_output);
+}
+
+// Function to dependency parse a tagged sentence into the caller's buffer
+extern "C" long dep_parse_tagged_sentence_into(void* vzps, const char *input_tagged_sentence, const char seperator, char *buffer, long buffer_size)
+{
+    zparSession_t* zps = static_cast<zparSession_t *>(vzps);
+    dep_parse_tagged_sentence_to_string(zps, input_tagged_sentence, seperator, zps->last_output);
+    return write_output(zps->last_output, buffer, buffer_size);
+}
+
+// join the given tokens with single spaces into the given output
+// string, skipping the newline token that the reader may add
+void join_tokens(CStringVector *tokenized_sent, std::string &output)
+{
+    output.clear();
+    CStringVector::const_iterator it;
+    for (it = tokenized_sent->begin(); it != tokenized_sent->end(); ++it)
+    {
+        if (*it == "\n") {
+            continue;
+        }
+        if (!output.empty()) {
+            output += ' ';
+        }
+        output += *it;
+    }
+}
+
+// Function to tokenize a sentence into the caller's buffer; this
+// needs no models or session, so it can be called from several
+// threads at once as long as each one uses its own buffer
+extern "C" long tokenize_sentence_into(const char *input_sentence, char *buffer, long buffer_size)
+{
+    std::string output;
+    try {
+        // create a temporary string stream from the input char *
+        CSentenceReader input_reader(std::string(input_sentence), false);
+
+        // tokenize the sentence
+        CStringVector tokenized_sent[1];
+        input_reader.readSegmentedSentenceAndTokenize(tokenized_sent);
+        join_tokens(tokenized_sent, output);
+    } catch (const std::string &e) {
+        std::cerr << e << std::endl;
+        output.clear();
+    }
+    return write_output(output, buffer, buffer_size);
+}
 
 // Function to tag all sentence in the given input file
 // and write tagged sentences to the given output file
@@ -735,6 +836,39 @@ extern "C" void dep_parse_tagged_file(void* vzps, const char *sInputFile, const
     fclose(outfp);
 }
 
+// Function to tokenize all sentences in the given input file and
+// write them to the given output file, one sentence per line with
+// the tokens separated by spaces; this needs no models or session
+extern "C" void tokenize_file(const char *sInputFile, const char *sOutputFile)
+{
+    std::cerr << "Processing file " <<  sInputFile << std::endl;
+
+    // initialize the input reader
+    CSentenceReader input_reader(sInputFile);
+
+    // open the output file
+    FILE *outfp = NULL;
+    outfp = fopen(sOutputFile, "w");
+    if (outfp == NULL) {
+        std::cerr << "Cannot open output file " << sOutputFile << std::endl;
+        return;
+    }
+
+    // initialize the temporary sentence variables
+    CStringVector tokenized_sent[1];
+    std::string output;
+
+    while ( input_reader.readSegmentedSentenceAndTokenize(tokenized_sent) )
+    {
+        join_tokens(tokenized_sent, output);
+        fprintf(outfp, "%s\n", output.c_str());
+    }
+
+    // close the output file
+    std::cerr << "Wrote output to " << sOutputFile << std::endl;
+    fclose(outfp);
+}
+
 // Function to unload all the models
 extern "C" void unload_models(void* vzps)
 {
@@ -0,0 +1,92 @@
+"""
+Run unit tests for the async sentence methods.
+
+:author: Nitin Madnani (nmadnani@ets.org)
+"""
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import asyncio
+import os
+
+from nose.tools import assert_equal, assert_true
+from zpar import ZPar
+
+z = None
+tagger = None
+depparser = None
+
+_sentences = ["I am going to the market .",
+              "Are you going to come with me ?"]
+
+
+def setUp():
+    """
+    set up things we need for the tests
+    """
+    global z, tagger, depparser
+
+    assert 'ZPAR_MODEL_DIR' in os.environ
+
+    model_dir = os.environ['ZPAR_MODEL_DIR']
+
+    z = ZPar(model_dir)
+    tagger = z.get_tagger()
+    depparser = z.get_depparser()
+
+
+def tearDown():
+    """
+    Clean up after the tests
+    """
+    global z, tagger, depparser
+
+    if z:
+        z.close()
+        del tagger
+        del depparser
+        del z
+
+
+def _run(coroutine):
+    return asyncio.new_event_loop().run_until_complete(coroutine)
+
+
+def test_atag_sentence():
+    """
+    Check that concurrent async tagging matches tag_sentence()
+    """
+    async def tag_all():
+        return await asyncio.gather(*[tagger.atag_sentence(sentence)
+                                      for sentence in _sentences * 10])
+
+    expected = [tagger.tag_sentence(sentence) for sentence in _sentences * 10]
+    assert_equal(_run(tag_all()), expected)
+
+
+def test_adep_parse_sentences():
+    """
+    Check that the async batch form matches dep_parse_sentence()
+    """
+    async def parse_all():
+        return await depparser.adep_parse_sentences(_sentences, tokenize=False)
+
+    expected = [depparser.dep_parse_sentence(sentence, tokenize=False)
+                for sentence in _sentences]
+    assert_equal(_run(parse_all()), expected)
+
+
+def test_cancelled_sentence():
+    """
+    Check that cancelling one sentence does not affect the others
+    """
+    async def tag_and_cancel():
+        cancelled = tagger.atag_sentence(_sentences[0])
+        kept = tagger.atag_sentence(_sentences[1])
+        cancelled.cancel()
+        return cancelled.cancelled(), await kept
+
+    was_cancelled, tagged_sentence = _run(tag_and_cancel())
+    assert_true(was_cancelled)
+    assert_equal(tagged_sentence, tagger.tag_sentence(_sentences[1]))
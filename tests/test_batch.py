@@ -0,0 +1,86 @@
+"""
+Run unit tests for batch decoding and its scheduling.
+
+:author: Nitin Madnani (nmadnani@ets.org)
+"""
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import os
+
+from nose.tools import assert_equal, assert_true
+from zpar import ZPar
+from zpar.batch import BatchRunner, schedule_chunks
+
+z = None
+
+_sentences = ["I am going to the market .",
+              "Are you going to come with me ?"] * 20
+
+
+def setUp():
+    """
+    set up things we need for the tests
+    """
+    global z
+
+    assert 'ZPAR_MODEL_DIR' in os.environ
+
+    model_dir = os.environ['ZPAR_MODEL_DIR']
+
+    z = ZPar(model_dir)
+
+
+def tearDown():
+    """
+    Clean up after the tests
+    """
+    global z
+
+    if z:
+        z.close()
+        del z
+
+
+def test_schedule_chunks_longest_first():
+    """
+    Check that the longest sentences are scheduled first
+    """
+    sentences = ['a'] * 10 + [' '.join(['a'] * 50)] + ['a b'] * 5
+    chunks = schedule_chunks(sentences, 2, chunk_size=4)
+    assert_equal(chunks[0], [10])
+    assert_equal(sorted(sum(chunks, [])), list(range(len(sentences))))
+    assert_true(all(len(chunk) <= 4 for chunk in chunks))
+
+
+def test_schedule_chunks_in_order():
+    """
+    Check that the in-order policy makes consecutive chunks
+    """
+    assert_equal(schedule_chunks(['a'] * 5, 2, policy='in-order', chunk_size=2),
+                 [[0, 1], [2, 3], [4]])
+
+
+def check_batch_runner(processes, policy):
+    """
+    Check that batches are decoded in input order
+    """
+    global z
+
+    runner = BatchRunner(z, processes=processes, chunk_size=4, policy=policy)
+    outputs = runner.run('tagger', 'tag_sentence', _sentences, tokenize=False)
+    runner.close()
+
+    assert_equal(outputs,
+                 ['I/PRP am/VBP going/VBG to/TO the/DT market/NN ./.',
+                  'Are/VBP you/PRP going/VBG to/TO come/VB with/IN me/PRP ?/.'] * 20)
+    if processes > 1:
+        assert_equal(runner.stats['policy'], policy)
+        assert_true(len(runner.stats['worker_utilization']) <= processes)
+
+
+def test_batch_runner():
+    yield check_batch_runner, 1, 'longest-first'
+    yield check_batch_runner, 2, 'longest-first'
+    yield check_batch_runner, 2, 'in-order'
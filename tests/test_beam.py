@@ -0,0 +1,66 @@
+"""
+Run unit tests for the zpar library variants built with other beam widths.
+
+:author: Nitin Madnani (nmadnani@ets.org)
+"""
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import os
+
+from nose.tools import assert_equal, raises
+from zpar import ZPar, available_beams
+
+z = None
+
+
+def setUp():
+    """
+    set up things we need for the tests
+    """
+    global z
+
+    assert 'ZPAR_MODEL_DIR' in os.environ
+
+    model_dir = os.environ['ZPAR_MODEL_DIR']
+
+    z = ZPar(model_dir)
+
+
+def tearDown():
+    """
+    Clean up after the tests
+    """
+    global z
+
+    if z:
+        z.close()
+        del z
+
+
+@raises(OSError)
+def test_missing_beam():
+    """
+    Check that asking for a beam width that was not built fails
+    """
+    ZPar(os.environ['ZPAR_MODEL_DIR'], beam=max(available_beams() + [0]) + 1)
+
+
+def check_beam_tagger(beam):
+    sentence = 'I am going to the market .'
+    default_tagger = z.get_tagger()
+    beam_tagger = z.get_tagger(beam=beam)
+    assert_equal(beam_tagger.beam, beam)
+
+    # the tagged sentences may differ but not their tokens
+    default_tokens = [token.rsplit('/', 1)[0] for token in
+                      default_tagger.tag_sentence(sentence, tokenize=False).split()]
+    beam_tokens = [token.rsplit('/', 1)[0] for token in
+                   beam_tagger.tag_sentence(sentence, tokenize=False).split()]
+    assert_equal(beam_tokens, default_tokens)
+
+
+def test_beam_tagger():
+    for beam in available_beams():
+        yield check_beam_tagger, beam
@@ -0,0 +1,118 @@
+"""
+Run unit tests for checkpointed, resumable file runs.
+
+:author: Nitin Madnani (nmadnani@ets.org)
+"""
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import glob
+import os
+
+from io import open
+from os.path import abspath, dirname, exists, join
+
+from nose.tools import assert_equal, assert_false, raises
+from zpar import ZPar
+
+_my_dir = abspath(dirname(__file__))
+
+z = None
+tagger = None
+
+_input_file = abspath(join(_my_dir, '..', 'examples', 'test_tokenized.txt'))
+
+
+def setUp():
+    """
+    set up things we need for the tests
+    """
+    global z, tagger
+
+    assert 'ZPAR_MODEL_DIR' in os.environ
+
+    model_dir = os.environ['ZPAR_MODEL_DIR']
+
+    z = ZPar(model_dir)
+    tagger = z.get_tagger()
+
+
+def tearDown():
+    """
+    Clean up after the tests
+    """
+    global z, tagger
+
+    if z:
+        z.close()
+        del tagger
+        del z
+
+    # delete all the files we may have created
+    data_dir = abspath(join(_my_dir, '..', 'examples'))
+    for f in glob.glob(join(data_dir, 'test_checkpoint*')):
+        os.unlink(f)
+
+
+def expected_output():
+    expected_file = abspath(join(_my_dir, '..', 'examples', 'test_checkpoint_expected.tag'))
+    tagger.tag_file(_input_file, expected_file, tokenize=False)
+    with open(expected_file, 'r') as expectedf:
+        return expectedf.read()
+
+
+def check_process_file(processes):
+    output_file = abspath(join(_my_dir, '..', 'examples', 'test_checkpoint.tag'))
+    num_sentences = z.process_file(_input_file, output_file, model='tagger',
+                                   processes=processes, chunk_size=1,
+                                   tokenize=False)
+    assert_equal(num_sentences, 2)
+    assert_false(exists(output_file + '.ckpt'))
+    with open(output_file, 'r') as outf:
+        assert_equal(outf.read(), expected_output())
+
+
+def test_process_file():
+    yield check_process_file, 1
+    yield check_process_file, 2
+
+
+class _Interrupted(Exception):
+    pass
+
+
+def _interrupt(status):
+    raise _Interrupted()
+
+
+def test_process_file_resume():
+    """
+    Check that an interrupted run resumes from its checkpoint
+    """
+    output_file = abspath(join(_my_dir, '..', 'examples', 'test_checkpoint_resumed.tag'))
+    try:
+        z.process_file(_input_file, output_file, model='tagger',
+                       chunk_size=1, progress=_interrupt, tokenize=False)
+    except _Interrupted:
+        pass
+
+    # the first sentence is checkpointed and any partial
+    # output after it is thrown away when we resume
+    assert exists(output_file + '.ckpt')
+    with open(output_file, 'a') as outf:
+        outf.write('partial output')
+
+    num_sentences = z.process_file(_input_file, output_file, model='tagger',
+                                   chunk_size=1, tokenize=False)
+    assert_equal(num_sentences, 2)
+    with open(output_file, 'r') as outf:
+        assert_equal(outf.read(), expected_output())
+
+
+@raises(ValueError)
+def test_process_file_bad_model():
+    """
+    Check that the tagger cannot be run on tagged input
+    """
+    z.process_file(_input_file, 'unused.tag', model='tagger', tagged=True)
@@ -166,3 +166,28 @@ def test_dep_parse_file():
                with_lemmas,
                tagged)
 
+
+
+def test_dep_parse_file_with_lemma_processes():
+    """
+    Check that lemmas can be added to the parses in worker processes
+    """
+    global depparser
+
+    input_file = abspath(join(_my_dir, '..', 'examples', 'test.txt'))
+    output_file = abspath(join(_my_dir, '..', 'examples', 'test_lemmas.dep'))
+    single_output_file = abspath(join(_my_dir, '..', 'examples', 'test_lemmas_single.dep'))
+
+    depparser.dep_parse_file(input_file, single_output_file, with_lemmas=True)
+    depparser.dep_parse_file(input_file,
+                             output_file,
+                             with_lemmas=True,
+                             lemma_processes=2)
+
+    with open(single_output_file, 'r') as outf:
+        expected_output = outf.read()
+    with open(output_file, 'r') as outf:
+        output = outf.read()
+
+    assert_equal(output, expected_output)
+    assert_equal(output.split('\n')[1], 'am\tVBP\t-1\tROOT\tbe')
@@ -0,0 +1,226 @@
+"""
+Run unit tests for dispatching files to several ZPar servers.
+
+:author: Nitin Madnani (nmadnani@ets.org)
+"""
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import glob
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from io import open
+from os.path import abspath, dirname, join
+
+from nose.tools import assert_equal, assert_true, raises
+from six.moves import socketserver, xmlrpc_client, xmlrpc_server
+from zpar.dispatch import DispatchError, Dispatcher, ManifestEntry, read_manifest
+
+_my_dir = abspath(dirname(__file__))
+
+# the ports of the servers used as workers
+_PORTS = [8871, 8872, 8873]
+
+# the port of the worker that forwards its chunks to the first
+# server after a delay, to have a straggler
+_SLOW_PORT = 8874
+
+processes = []
+slow_server = None
+slow_thread = None
+
+
+class _SlowServer(socketserver.ThreadingMixIn, xmlrpc_server.SimpleXMLRPCServer):
+    """
+    A worker that takes a while to pass each chunk on to a real server.
+    """
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, addr, target, delay):
+        xmlrpc_server.SimpleXMLRPCServer.__init__(self, addr, logRequests=False,
+                                                  allow_none=True)
+        self.target = target
+        self.delay = delay
+        self.register_function(self.process_chunk)
+
+    def process_chunk(self, method_name, data, args=()):
+        time.sleep(self.delay)
+        proxy = xmlrpc_client.ServerProxy(self.target, allow_none=True)
+        return proxy.process_chunk(method_name, data, args)
+
+
+def _wait_until_ready(port, timeout=300):
+    proxy = xmlrpc_client.ServerProxy('http://localhost:{}'.format(port),
+                                      allow_none=True)
+    deadline = time.time() + timeout
+    while True:
+        try:
+            if proxy.server_status()['ready']:
+                return
+        except Exception:
+            if time.time() > deadline:
+                raise
+        time.sleep(0.5)
+
+
+def setUp():
+    """
+    set up things we need for the tests
+    """
+    global processes, slow_server, slow_thread
+
+    assert 'ZPAR_MODEL_DIR' in os.environ
+
+    model_dir = os.environ['ZPAR_MODEL_DIR']
+
+    # each worker is a server in its own process, just
+    # like the servers on separate hosts in a real run
+    for port in _PORTS:
+        processes.append(subprocess.Popen([sys.executable, '-m', 'zpar.zpar_server',
+                                           '--modeldir', model_dir,
+                                           '--models', 'tagger',
+                                           '--port', str(port)],
+                                          cwd=abspath(join(_my_dir, '..'))))
+    for port in _PORTS:
+        _wait_until_ready(port)
+
+    slow_server = _SlowServer(('localhost', _SLOW_PORT),
+                              'http://localhost:{}'.format(_PORTS[0]), 2.0)
+    slow_thread = threading.Thread(target=slow_server.serve_forever)
+    slow_thread.daemon = True
+    slow_thread.start()
+
+def tearDown():
+    """
+    Clean up after the tests
+    """
+    global processes, slow_server, slow_thread
+
+    for port in _PORTS:
+        try:
+            xmlrpc_client.ServerProxy('http://localhost:{}'.format(port)).stop_server()
+        except Exception:
+            pass
+    for process in processes:
+        process.wait()
+    processes = []
+
+    if slow_server:
+        slow_server.shutdown()
+        slow_server.server_close()
+        slow_thread.join()
+        slow_server = None
+
+    # delete all the files we may have created
+    data_dir = abspath(join(_my_dir, '..', 'examples'))
+    for f in (glob.glob(join(data_dir, 'test*.dispatch*')) +
+              glob.glob(join(data_dir, 'test*.manifest'))):
+        os.unlink(f)
+
+
+def _write_input(num_copies=50):
+    # a longer input made up of copies of the example
+    input_file = abspath(join(_my_dir, '..', 'examples', 'test.txt'))
+    dispatch_input = abspath(join(_my_dir, '..', 'examples', 'test.dispatch.txt'))
+    with open(input_file, 'r') as inputf:
+        lines = [line.strip() for line in inputf if line.strip()]
+    with open(dispatch_input, 'w') as outputf:
+        for _ in range(num_copies):
+            for line in lines:
+                outputf.write(line + '\n')
+    return dispatch_input
+
+
+def test_dispatch():
+    """
+    Check that the chunks are put back together in order
+    """
+
+    dispatch_input = _write_input()
+    dispatch_output = abspath(join(_my_dir, '..', 'examples', 'test.dispatch.tag'))
+    range_output = abspath(join(_my_dir, '..', 'examples', 'test.dispatch.range.tag'))
+    manifest = abspath(join(_my_dir, '..', 'examples', 'test.manifest'))
+    with open(manifest, 'w') as manifestf:
+        manifestf.write(json.dumps({'input': dispatch_input,
+                                    'output': dispatch_output}) + '\n')
+        manifestf.write(json.dumps({'input': dispatch_input,
+                                    'output': range_output,
+                                    'start': 3,
+                                    'end': 7}) + '\n')
+
+    dispatcher = Dispatcher(['localhost:{}'.format(port) for port in _PORTS],
+                            model='tagger', method_args=[True], chunk_lines=4)
+    assert_equal(dispatcher.run(read_manifest(manifest)), 26)
+
+    with open(dispatch_output, 'r') as outf:
+        output = [l.strip() for l in outf.readlines()]
+    assert_equal(output, ['I/PRP am/VBP going/VBG to/TO the/DT market/NN ./.',
+                          'Are/VBP you/PRP going/VBG to/TO come/VB with/IN me/PRP ?/.'] * 50)
+
+    with open(range_output, 'r') as outf:
+        output = [l.strip() for l in outf.readlines()]
+    assert_equal(output, ['Are/VBP you/PRP going/VBG to/TO come/VB with/IN me/PRP ?/.',
+                          'I/PRP am/VBP going/VBG to/TO the/DT market/NN ./.'] * 2)
+
+
+def test_dispatch_with_failed_worker():
+    """
+    Check that the chunks of a worker that cannot be reached are retried
+    """
+
+    dispatch_input = _write_input()
+    dispatch_output = abspath(join(_my_dir, '..', 'examples', 'test.dispatch.tag'))
+
+    # nothing is listening on the last port
+    workers = ['localhost:{}'.format(port) for port in _PORTS] + ['localhost:8879']
+    dispatcher = Dispatcher(workers, model='tagger', method_args=[True],
+                            chunk_lines=4, retry_delay=0.01)
+    dispatcher.run([ManifestEntry(dispatch_input, dispatch_output, None, None, 'sentence')])
+
+    with open(dispatch_output, 'r') as outf:
+        assert_equal(len(outf.readlines()), 100)
+    assert_equal(dispatcher.stats['dropped_workers'], ['localhost:8879'])
+    assert_equal(dispatcher.stats['worker_chunks']['localhost:8879'], 0)
+
+
+@raises(DispatchError)
+def test_dispatch_without_workers():
+    """
+    Check that the run fails when none of the workers can be reached
+    """
+
+    dispatch_input = _write_input()
+    dispatch_output = abspath(join(_my_dir, '..', 'examples', 'test.dispatch.tag'))
+    dispatcher = Dispatcher(['localhost:8879'], model='tagger', retry_delay=0.01)
+    dispatcher.run([ManifestEntry(dispatch_input, dispatch_output, None, None, 'sentence')])
+
+
+def test_dispatch_with_slow_worker():
+    """
+    Check that the chunks of a slow worker are stolen and re-run
+    """
+
+    dispatch_input = _write_input()
+    dispatch_output = abspath(join(_my_dir, '..', 'examples', 'test.dispatch.tag'))
+
+    # the slow worker is first so that it starts with the first run of chunks
+    workers = (['localhost:{}'.format(_SLOW_PORT)] +
+               ['localhost:{}'.format(port) for port in _PORTS])
+    dispatcher = Dispatcher(workers, model='tagger', method_args=[True],
+                            chunk_lines=4, speculation_factor=2.0)
+    dispatcher.run([ManifestEntry(dispatch_input, dispatch_output, None, None, 'sentence')])
+
+    with open(dispatch_output, 'r') as outf:
+        output = [l.strip() for l in outf.readlines()]
+    assert_equal(output, ['I/PRP am/VBP going/VBG to/TO the/DT market/NN ./.',
+                          'Are/VBP you/PRP going/VBG to/TO come/VB with/IN me/PRP ?/.'] * 50)
+    assert_true(dispatcher.stats['num_stolen'] > 0)
+    assert_true(dispatcher.stats['num_speculative'] > 0)
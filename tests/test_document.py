@@ -0,0 +1,178 @@
+"""
+Run unit tests for the document-level analysis API.
+
+:author: Nitin Madnani (nmadnani@ets.org)
+"""
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import glob
+import os
+
+from io import open
+from os.path import abspath, dirname, join
+
+from nose.tools import assert_equal, assert_raises, assert_true
+from zpar import ZPar
+from zpar.document import align_tokens, segment_sentences
+
+_my_dir = abspath(dirname(__file__))
+
+z = None
+
+_document = ("I'm going to the market. Mr. Smith is going\nto come with me!\n\n"
+             "Are you going to come with me?")
+
+
+def setUp():
+    """
+    set up things we need for the tests
+    """
+    global z
+
+    assert 'ZPAR_MODEL_DIR' in os.environ
+
+    model_dir = os.environ['ZPAR_MODEL_DIR']
+
+    z = ZPar(model_dir)
+
+
+def tearDown():
+    """
+    Clean up after the tests
+    """
+    global z
+
+    if z:
+        z.close()
+        del z
+
+    # delete all the files we may have created
+    data_dir = abspath(join(_my_dir, '..', 'examples'))
+    for f in glob.glob(join(data_dir, 'test*.doc.*')):
+        os.unlink(f)
+
+
+def test_segment_sentences():
+    """
+    Check that documents are split into the right sentences
+    """
+    sentences = [_document[start:end] for start, end in segment_sentences(_document)]
+    assert_equal(sentences, ["I'm going to the market.",
+                             "Mr. Smith is going\nto come with me!",
+                             "Are you going to come with me?"])
+
+
+def test_align_tokens():
+    """
+    Check that tokens are aligned to the right character offsets
+    """
+    text = 'He said "Don\'t go."'
+    tokens = ['He', 'said', '``', 'Do', "n't", 'go', '.', "''"]
+    assert_equal(align_tokens(text, tokens, offset=10),
+                 [(10, 12), (13, 17), (18, 19), (19, 21), (21, 24),
+                  (25, 27), (27, 28), (28, 29)])
+
+
+def check_analyze_document(processes=1, copies=1):
+    """
+    Check analyze_document with and without worker processes
+    """
+    global z
+
+    # enough copies of the document make more than
+    # one chunk of sentences for the worker processes
+    document = '\n\n'.join([_document] * copies)
+    analyzed_sentences = z.analyze_document(document,
+                                            model='tagger',
+                                            processes=processes)
+
+    if processes > 1:
+        assert_true(z.batch_stats['num_chunks'] > 1)
+        assert_true(z.batch_stats['policy'] != 'in-process')
+
+    assert_equal(len(analyzed_sentences), 3 * copies)
+    assert_equal([s.analysis for s in analyzed_sentences[:3]] * copies,
+                 [s.analysis for s in analyzed_sentences])
+    assert_equal(analyzed_sentences[0].analysis,
+                 "I/PRP 'm/VBP going/VBG to/TO the/DT market/NN ./.")
+    assert_equal(analyzed_sentences[2].analysis,
+                 "Are/VBP you/PRP going/VBG to/TO come/VB with/IN me/PRP ?/.")
+    assert_equal([(s.start, s.end) for s in analyzed_sentences[:3]],
+                 [(0, 24), (25, 60), (62, 92)])
+    assert_equal(analyzed_sentences[0].token_offsets,
+                 [(0, 1), (1, 3), (4, 9), (10, 12), (13, 16), (17, 23), (23, 24)])
+    assert_equal(analyzed_sentences[-3].token_offsets,
+                 [(start + len(document) - len(_document), end + len(document) - len(_document))
+                  for start, end in analyzed_sentences[0].token_offsets])
+
+
+def test_analyze_document():
+    yield check_analyze_document, 1
+    yield check_analyze_document, 1, 20
+    yield check_analyze_document, 2, 20
+
+
+def test_analyze_document_file():
+    """
+    Check analyze_document_file writes analyses and offsets
+    """
+    global z
+
+    input_file = abspath(join(_my_dir, '..', 'examples', 'test.txt'))
+    output_file = abspath(join(_my_dir, '..', 'examples', 'test.doc.tag'))
+    offsets_file = abspath(join(_my_dir, '..', 'examples', 'test.doc.offsets'))
+
+    z.analyze_document_file(input_file, output_file,
+                            model='tagger', offsetsfile=offsets_file)
+
+    with open(output_file, 'r') as outf:
+        output = [l.strip() for l in outf.readlines()]
+
+    assert_equal(output, ['I/PRP am/VBP going/VBG to/TO the/DT market/NN ./.',
+                          'Are/VBP you/PRP going/VBG to/TO come/VB with/IN me/PRP ?/.'])
+
+    with open(offsets_file, 'r') as offsetsf:
+        assert_equal(len(offsetsf.readlines()), 2)
+
+
+def test_document_session():
+    """
+    Check that a document session only re-analyzes changed sentences
+    """
+    global z
+
+    session = z.document_session(model='tagger')
+    session.update(_document)
+    assert_equal((session.num_analyzed, session.num_reused), (3, 0))
+
+    edited_document = "Hello there. " + _document.replace('market', 'store')
+    analyzed_sentences = session.update(edited_document)
+    assert_equal((session.num_analyzed, session.num_reused), (2, 2))
+    assert_equal(analyzed_sentences[3].analysis,
+                 "Are/VBP you/PRP going/VBG to/TO come/VB with/IN me/PRP ?/.")
+    assert_equal(analyzed_sentences[3].start, 74)
+    assert_equal(analyzed_sentences[3].token_offsets[0], (74, 77))
+
+
+def test_document_session_after_error():
+    """
+    Check that a failed update does not leave anything in the cache
+    """
+    global z
+
+    session = z.document_session(model='tagger')
+    analyze = session._analyze
+
+    def failing_analyze(sentences):
+        raise RuntimeError('analysis failed')
+
+    session._analyze = failing_analyze
+    assert_raises(RuntimeError, session.update, _document)
+
+    session._analyze = analyze
+    analyzed_sentences = session.update(_document)
+    assert_equal((session.num_analyzed, session.num_reused), (3, 0))
+    assert_equal(analyzed_sentences[0].analysis,
+                 "I/PRP 'm/VBP going/VBG to/TO the/DT market/NN ./.")
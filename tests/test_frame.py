@@ -0,0 +1,94 @@
+"""
+Run unit tests for the pandas/Arrow column helpers.
+
+:author: Nitin Madnani (nmadnani@ets.org)
+"""
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import os
+
+from nose.plugins.skip import SkipTest
+from nose.tools import assert_equal, assert_raises
+
+try:
+    import pandas as pd
+    import pyarrow as pa
+except ImportError:
+    raise SkipTest('The column helper tests need pandas and pyarrow.')
+
+from zpar import ZPar
+from zpar.frame import dep_parse_column, tag_column
+
+z = None
+
+_sentences = ["I am going to the market .", None,
+              "Are you going to come with me ?"]
+
+
+def setUp():
+    """
+    set up things we need for the tests
+    """
+    global z
+
+    assert 'ZPAR_MODEL_DIR' in os.environ
+
+    model_dir = os.environ['ZPAR_MODEL_DIR']
+
+    z = ZPar(model_dir)
+
+
+def tearDown():
+    """
+    Clean up after the tests
+    """
+    global z
+
+    if z:
+        z.close()
+        del z
+
+
+def test_tag_column_series():
+    """
+    Check that tagging a Series keeps its index and nulls
+    """
+    global z
+
+    column = pd.Series(_sentences, index=[10, 20, 30], name='text')
+    tagged = tag_column(z, column, tokenize=False)
+
+    assert_equal(list(tagged.index), [10, 20, 30])
+    assert_equal(tagged.name, 'text')
+    assert_equal(tagged[10], 'I/PRP am/VBP going/VBG to/TO the/DT market/NN ./.')
+    assert_equal(pd.isna(tagged[20]), True)
+    assert_equal(tagged[30], 'Are/VBP you/PRP going/VBG to/TO come/VB with/IN me/PRP ?/.')
+
+
+def test_dep_parse_column_arrow():
+    """
+    Check that dependency parsing an Arrow array gives list columns
+    """
+    global z
+
+    table = dep_parse_column(z, pa.array(_sentences), tokenize=False)
+
+    assert_equal(table.column_names, ['tokens', 'tags', 'heads', 'labels'])
+    assert_equal(table.column('tokens').to_pylist(),
+                 [['I', 'am', 'going', 'to', 'the', 'market', '.'], None,
+                  ['Are', 'you', 'going', 'to', 'come', 'with', 'me', '?']])
+    assert_equal(table.column('heads').to_pylist()[0], [1, -1, 1, 2, 5, 3, 1])
+    assert_equal(table.column('labels').to_pylist()[2],
+                 ['ROOT', 'SUB', 'VMOD', 'VMOD', 'VMOD', 'VMOD', 'PMOD', 'P'])
+
+
+def test_unknown_output():
+    """
+    Check that an unknown kind of output is rejected
+    """
+    global z
+
+    assert_raises(ValueError, tag_column, z, pa.array(_sentences), output='list')
+    assert_raises(ValueError, dep_parse_column, z, pa.array(_sentences), output='strings')
@@ -0,0 +1,149 @@
+"""
+Run unit tests for the ZPar instrumentation hooks.
+
+:author: Nitin Madnani (nmadnani@ets.org)
+"""
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import glob
+import os
+
+from contextlib import contextmanager
+from os.path import abspath, dirname, join
+
+from nose.tools import assert_equal, assert_true
+from zpar import ZPar
+
+_my_dir = abspath(dirname(__file__))
+
+z = None
+tagger = None
+
+def setUp():
+    """
+    set up things we need for the tests
+    """
+    global z, tagger
+
+    assert 'ZPAR_MODEL_DIR' in os.environ
+
+    model_dir = os.environ['ZPAR_MODEL_DIR']
+
+    z = ZPar(model_dir)
+    tagger = z.get_tagger()
+
+def tearDown():
+    """
+    Clean up after the tests
+    """
+    global z, tagger
+
+    if z:
+        z.close()
+        del tagger
+        del z
+
+    # delete all the files we may have created
+    data_dir = abspath(join(_my_dir, '..', 'examples'))
+    for f in glob.glob(join(data_dir, 'test*.hooks.tag')):
+        os.unlink(f)
+
+
+def test_sentence_hooks():
+    """
+    Check that the hooks are called around sentence calls
+    """
+
+    global z, tagger
+
+    calls = []
+    handle = z.hooks.add(before=lambda info: calls.append(('before', info.method)),
+                         after=lambda info: calls.append(('after', info)))
+    try:
+        tagged = tagger.tag_sentence('I am going to the market.')
+    finally:
+        z.hooks.remove(handle)
+
+    assert_equal(tagged, 'I/PRP am/VBP going/VBG to/TO the/DT market/NN ./.')
+    assert_equal(calls[0], ('before', 'tag_sentence'))
+    info = calls[1][1]
+    assert_equal((info.kind, info.model, info.method), ('sentence', 'tagger', 'tag_sentence'))
+    assert_equal((info.num_sentences, info.num_tokens), (1, 6))
+    assert_true(info.elapsed >= 0)
+    assert_equal(info.error, None)
+
+    # nothing is called once the hooks are removed
+    tagger.tag_sentence('Are you going to come with me?')
+    assert_equal(len(calls), 2)
+
+
+def test_span_hooks():
+    """
+    Check that span hooks are entered around batch and file calls
+    """
+
+    global z
+
+    spans = []
+
+    @contextmanager
+    def span(info):
+        spans.append((info.kind, info.method))
+        yield
+
+    handle = z.hooks.add_span(span)
+    try:
+        input_file = abspath(join(_my_dir, '..', 'examples', 'test.txt'))
+        output_file = abspath(join(_my_dir, '..', 'examples', 'test.hooks.tag'))
+        tagger.tag_file(input_file, output_file)
+        z.process_files([(input_file, output_file)], model='tagger')
+        z.analyze_document('I am going to the market. Are you going to come with me?',
+                           model='tagger')
+    finally:
+        z.hooks.remove(handle)
+
+    assert_true(('file', 'tag_file') in spans)
+    assert_true(('batch', 'tag_sentence') in spans)
+    assert_true(('sentence', 'tag_sentence') in spans)
+
+
+def test_document_cache_status():
+    """
+    Check that document sessions report the sentences they reuse
+    """
+
+    global z
+
+    infos = []
+    handle = z.hooks.add(after=infos.append)
+    try:
+        session = z.document_session(model='tagger')
+        session.update('I am going to the market.')
+        session.update('I am going to the market. Are you going to come with me?')
+    finally:
+        z.hooks.remove(handle)
+
+    documents = [info for info in infos if info.kind == 'document']
+    assert_equal([info.cache for info in documents],
+                 [{'hits': 0, 'misses': 1}, {'hits': 1, 'misses': 1}])
+
+
+def test_failing_hook():
+    """
+    Check that a failing hook does not fail the call
+    """
+
+    global z, tagger
+
+    def fail(info):
+        raise ValueError('hook failed')
+
+    handle = z.hooks.add(before=fail)
+    try:
+        tagged = tagger.tag_sentence('I am going to the market.')
+    finally:
+        z.hooks.remove(handle)
+
+    assert_equal(tagged, 'I/PRP am/VBP going/VBG to/TO the/DT market/NN ./.')
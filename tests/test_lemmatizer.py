@@ -0,0 +1,66 @@
+"""
+Run unit tests for the lemma table based lemmatizer.
+
+:author: Nitin Madnani (nmadnani@ets.org)
+"""
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import os
+import tempfile
+
+from itertools import product
+
+from nose.tools import assert_equal
+from nltk.stem.wordnet import WordNetLemmatizer
+from zpar.lemmatizer import Lemmatizer, build_lemma_table
+
+table_path = None
+lemmatizer = None
+wordnet_lemmatizer = None
+
+
+def setUp():
+    """
+    set up things we need for the tests
+    """
+    global table_path, lemmatizer, wordnet_lemmatizer
+
+    fd, table_path = tempfile.mkstemp(suffix='.bin')
+    os.close(fd)
+    build_lemma_table(table_path)
+
+    lemmatizer = Lemmatizer(table_path)
+    wordnet_lemmatizer = WordNetLemmatizer()
+
+
+def tearDown():
+    """
+    Clean up after the tests
+    """
+    global table_path, lemmatizer
+
+    if lemmatizer:
+        lemmatizer.close()
+    if table_path:
+        os.unlink(table_path)
+
+
+def check_lemmatize(word, pos):
+    """
+    Check that the lemma table gives the same lemma as NLTK
+    """
+    global lemmatizer, wordnet_lemmatizer
+
+    assert_equal(lemmatizer.lemmatize(word, pos),
+                 wordnet_lemmatizer.lemmatize(word, pos))
+
+
+def test_lemmatize():
+    words = ['i', "'m", 'am', 'are', 'going', 'went', 'to', 'the',
+             'market', 'markets', 'children', 'axes', 'better', 'best',
+             'boxes', 'dresses', 'flies', 'women', 'came', 'with', '.',
+             'xyzzy', 'xyzzies', "n't", 'do', 'dogss', 'boxeses']
+    for word, pos in product(words, ['n', 'v', 'a', 'r']):
+        yield check_lemmatize, word, pos
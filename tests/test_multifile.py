@@ -0,0 +1,92 @@
+"""
+Run unit tests for processing many files in one call.
+
+:author: Nitin Madnani (nmadnani@ets.org)
+"""
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import glob
+import os
+
+from io import open
+from os.path import abspath, dirname, join
+
+from nose.tools import assert_equal
+from zpar import ZPar
+
+_my_dir = abspath(dirname(__file__))
+
+z = None
+tagger = None
+
+_data_dir = abspath(join(_my_dir, '..', 'examples'))
+
+
+def setUp():
+    """
+    set up things we need for the tests
+    """
+    global z, tagger
+
+    assert 'ZPAR_MODEL_DIR' in os.environ
+
+    model_dir = os.environ['ZPAR_MODEL_DIR']
+
+    z = ZPar(model_dir)
+    tagger = z.get_tagger()
+
+
+def tearDown():
+    """
+    Clean up after the tests
+    """
+    global z, tagger
+
+    if z:
+        z.close()
+        del tagger
+        del z
+
+    # delete all the files we may have created
+    for f in glob.glob(join(_data_dir, '*test_multifile*')):
+        os.unlink(f)
+
+
+def check_process_files(processes):
+    input_file = join(_data_dir, 'test_tokenized.txt')
+    expected_file = join(_data_dir, 'test_multifile_expected.tag')
+    tagger.tag_file(input_file, expected_file, tokenize=False)
+    with open(expected_file, 'r') as expectedf:
+        expected = expectedf.read()
+
+    # the same input file three times, with tiny batches,
+    # plus one input file that does not exist
+    pairs = [(input_file, join(_data_dir, 'test_multifile{}.tag'.format(i)))
+             for i in range(3)]
+    pairs.append((join(_data_dir, 'test_multifile_missing.txt'),
+                  join(_data_dir, 'test_multifile_missing.tag')))
+    results = z.process_files(pairs, model='tagger', processes=processes,
+                              batch_bytes=1, tokenize=False)
+
+    assert_equal([result.status for result in results], ['ok', 'ok', 'ok', 'error'])
+    assert_equal([result.num_sentences for result in results], [2, 2, 2, 0])
+    for inputfile, outputfile in pairs[:3]:
+        with open(outputfile, 'r') as outf:
+            assert_equal(outf.read(), expected)
+
+
+def test_process_files():
+    yield check_process_files, 1
+    yield check_process_files, 2
+
+
+def test_process_files_glob():
+    """
+    Check that the output files for a glob are named after the inputs
+    """
+    results = z.process_files(join(_data_dir, 'test_tokenized.txt'), model='tagger',
+                              output_suffix='.test_multifile.tag', tokenize=False)
+    assert_equal([result.outputfile for result in results],
+                 [join(_data_dir, 'test_tokenized.txt.test_multifile.tag')])
@@ -9,6 +9,9 @@ from __future__ import (absolute_import, division, print_function,
 
 import glob
 import os
+import pickle
+import subprocess
+import sys
 
 from io import open
 from itertools import product
@@ -16,6 +19,7 @@ from os.path import abspath, dirname, join
 
 from nose.tools import assert_equal
 from zpar import ZPar
+from zpar.tree import ParseTree
 
 _my_dir = abspath(dirname(__file__))
 
@@ -84,6 +88,51 @@ def test_parse_sentence():
         yield check_parse_sentence, tokenize, tagged
 
 
+def test_parse_sentence_tree():
+    """
+    Check parse_sentence method with a tree as the result
+    """
+    global parser
+
+    tree = parser.parse_sentence("I 'm going to the market .",
+                                 tokenize=False,
+                                 return_tree=True)
+
+    assert_equal(str(tree), "(S (NP (PRP I)) (VP (VBP 'm) (VP (VBG going) (PP (TO to) (NP (DT the) (NN market))))) (. .))")
+    assert_equal(tree.words, ('I', "'m", 'going', 'to', 'the', 'market', '.'))
+    assert_equal(tree.spans('NP'), [('NP', 0, 1), ('NP', 4, 6)])
+    assert_equal(tree.root.label, 'S')
+    assert_equal(str(tree.covering(3, 5)), "(PP (TO to) (NP (DT the) (NN market)))")
+    assert_equal(tree.pos()[1], ("'m", 'VBP'))
+
+
+# builds trees with labels in a different order than the tests
+# so that the label ids in the subprocess differ from ours
+_PICKLE_TREE_CODE = """
+import pickle, sys
+from zpar.tree import ParseTree
+ParseTree.from_string('(X (NN a) (FRAG (DT b)))')
+tree = ParseTree.from_string({!r})
+getattr(sys.stdout, 'buffer', sys.stdout).write(pickle.dumps(tree, 2))
+"""
+
+
+def test_parse_tree_pickle():
+    """
+    Check that a tree pickled in another process has the same labels
+    """
+    bracketed = "(S (NP (PRP I)) (VP (VBP 'm) (VP (VBG going) (PP (TO to) (NP (DT the) (NN market))))) (. .))"
+    ParseTree.from_string('(ROOT (SINV (VB x)))')
+    output = subprocess.check_output([sys.executable, '-c',
+                                      _PICKLE_TREE_CODE.format(bracketed)],
+                                     cwd=abspath(join(_my_dir, '..')))
+    tree = pickle.loads(output)
+    assert_equal(str(tree), bracketed)
+    assert_equal(tree.root.label, 'S')
+    assert_equal(tree.spans('NP'), [('NP', 0, 1), ('NP', 4, 6)])
+    assert_equal(str(pickle.loads(pickle.dumps(tree, 2))), bracketed)
+
+
 def check_parse_file(tokenize=False, tagged=False):
     """
     Check parse_file method with and without tokenization
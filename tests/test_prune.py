@@ -0,0 +1,79 @@
+"""
+Run unit tests for pruning and compacting model weights.
+
+:author: Nitin Madnani (nmadnani@ets.org)
+"""
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import glob
+import os
+import shutil
+
+from os.path import abspath, dirname, join
+
+from nose.tools import assert_equal
+from zpar import ZPar
+from zpar.prune import compact_line, compact_model_file, compact_weight
+
+_my_dir = abspath(dirname(__file__))
+
+_output_dir = abspath(join(_my_dir, '..', 'examples', 'test_prune_models'))
+
+
+def setUp():
+    """
+    set up things we need for the tests
+    """
+    assert 'ZPAR_MODEL_DIR' in os.environ
+
+
+def tearDown():
+    """
+    Clean up after the tests
+    """
+    for path in glob.glob(join(_my_dir, '..', 'examples', 'test_prune*')):
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def test_compact_weight():
+    assert_equal(compact_weight('0 / 0'), None)
+    assert_equal(compact_weight('3 / 1024'), '3 / 1024')
+    assert_equal(compact_weight('2 / -4', threshold=5), None)
+    assert_equal(compact_weight('7 / 13', quantize=5), '5 / 15')
+    assert_equal(compact_weight('0.26 / 1.74', quantize=0.5), '0.5 / 1.5')
+    assert_equal(compact_weight('0.00001 / 3', quantize=1e-05), '0.00001 / 3')
+
+
+def check_compact_line(line, expected, threshold):
+    stats = {'weights': 0, 'pruned': 0}
+    assert_equal(compact_line(line, stats, threshold=threshold), expected)
+
+
+def test_compact_line():
+    yield check_compact_line, 'Word\n', 'Word\n', 0
+    yield check_compact_line, '[ the ] : 0 / 0\n', None, 0
+    yield check_compact_line, '[ a ] : 3 / 1024\n', '[ a ] : 3 / 1024\n', 0
+    yield (check_compact_line, '[ a ] : { NN : 0 / 0 , VB : -1 / -20 }\n',
+           '[ a ] : { VB : -1 / -20 }\n', 0)
+    yield check_compact_line, '[ a ] : { NN : 1 / 2 }\n', None, 2
+    yield check_compact_line, '[ a ] : { not weights }\n', '[ a ] : { not weights }\n', 0
+    yield check_compact_line, 'the : 3\n', 'the : 3\n', 5
+    yield check_compact_line, 'the : { NN : 3 , VB : 1 }\n', 'the : { NN : 3 , VB : 1 }\n', 5
+
+
+def test_compact_tagger():
+    """
+    Check that a tagger without its zero weights tags the same
+    """
+    model_dir = os.environ['ZPAR_MODEL_DIR']
+    os.makedirs(_output_dir)
+    stats = compact_model_file(join(model_dir, 'tagger'), join(_output_dir, 'tagger'))
+    assert stats['output_size'] <= stats['input_size']
+
+    sentence = 'I am going to the market .'
+    with ZPar(model_dir) as z:
+        expected = z.get_tagger().tag_sentence(sentence, tokenize=False)
+    with ZPar(_output_dir) as z:
+        assert_equal(z.get_tagger().tag_sentence(sentence, tokenize=False), expected)
@@ -0,0 +1,84 @@
+"""
+Run unit tests for the sentence offset index and input ranges.
+
+:author: Nitin Madnani (nmadnani@ets.org)
+"""
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import os
+import shutil
+import tempfile
+
+from io import open
+from os.path import join
+
+from nose.tools import assert_equal
+from zpar.sentence_index import (build_sentence_index, load_sentence_index,
+                                 range_input)
+
+_temp_dir = None
+_input_file = None
+
+_sentences = ['sentence number {} {}'.format(i, 'x' * (i % 7)) for i in range(250)]
+
+
+def setUp():
+    """
+    set up things we need for the tests
+    """
+    global _temp_dir, _input_file
+
+    _temp_dir = tempfile.mkdtemp()
+    _input_file = join(_temp_dir, 'input.txt')
+    with open(_input_file, 'w', encoding='utf-8') as inputf:
+        inputf.write('\n'.join(_sentences) + '\n')
+
+
+def tearDown():
+    """
+    Clean up after the tests
+    """
+    shutil.rmtree(_temp_dir)
+
+
+def read_range(start, end, unit='sentence'):
+    with range_input(_input_file, join(_temp_dir, 'output.txt'),
+                     start=start, end=end, unit=unit) as rangefile:
+        with open(rangefile, 'r', encoding='utf-8') as rangef:
+            return rangef.read().splitlines()
+
+
+def check_sentence_range(start, end):
+    assert_equal(read_range(start, end), _sentences[start:end])
+
+
+def test_sentence_ranges():
+    for indexed in [False, True]:
+        if indexed:
+            assert_equal(build_sentence_index(_input_file, every=16), len(_sentences))
+        for start, end in [(0, 10), (15, 17), (16, 48), (240, None), (249, 250), (300, 400)]:
+            yield check_sentence_range, start, end
+
+
+def test_byte_ranges():
+    """
+    Check that adjacent byte ranges cover every sentence exactly once
+    """
+    size = os.path.getsize(_input_file)
+    bounds = [0, 1, 100, 101, 2000, size - 3, size]
+    sentences = []
+    for start, end in zip(bounds, bounds[1:]):
+        sentences.extend(read_range(start, end, unit='byte'))
+    assert_equal(sentences, _sentences)
+
+
+def test_out_of_date_index():
+    """
+    Check that an index is ignored once its file changes
+    """
+    build_sentence_index(_input_file, every=16)
+    with open(_input_file, 'a', encoding='utf-8') as inputf:
+        inputf.write('one more sentence\n')
+    assert_equal(load_sentence_index(_input_file), None)
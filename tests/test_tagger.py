@@ -8,9 +8,11 @@ from __future__ import (absolute_import, division, print_function,
                         unicode_literals)
 
 import glob
+import gzip
+import json
 import os
 
-from io import open
+from io import BytesIO, open
 from os.path import abspath, dirname, join
 
 from nose.tools import assert_equal
@@ -47,7 +49,9 @@ def tearDown():
 
     # delete all the files we may have created
     data_dir = abspath(join(_my_dir, '..', 'examples'))
-    for f in glob.glob(join(data_dir, 'test*.tag')):
+    for f in (glob.glob(join(data_dir, 'test*.tag')) +
+              glob.glob(join(data_dir, 'test*.jsonl')) +
+              glob.glob(join(data_dir, 'test*.gz'))):
         os.unlink(f)
 
 
@@ -69,6 +73,22 @@ def test_tag_sentence():
     yield check_tag_sentence, True
 
 
+def test_tag_long_sentence():
+    """
+    Check that an output longer than the reusable buffer comes back whole
+    """
+    global tagger
+
+    words = ['antidisestablishmentarianism{}'.format(i) for i in range(500)]
+    tagged_sentence = tagger.tag_sentence(' '.join(words), tokenize=False)
+    assert len(tagged_sentence) > 16384
+    assert_equal([token.rsplit('/', 1)[0] for token in tagged_sentence.split()], words)
+
+    # and the next sentence is not mixed up with it
+    assert_equal(tagger.tag_sentence("I 'm going to the market .", tokenize=False),
+                 "I/PRP 'm/VBP going/VBG to/TO the/DT market/NN ./.")
+
+
 def check_tag_file(tokenize=False):
     """
     Check tag_file method with and without tokenization
@@ -97,3 +117,67 @@ def check_tag_file(tokenize=False):
 def test_tag_file():
     yield check_tag_file, False
     yield check_tag_file, True
+
+
+def test_tag_file_jsonl():
+    """
+    Check tag_file method with JSON lines output
+    """
+
+    global tagger
+
+    input_file = abspath(join(_my_dir, '..', 'examples', 'test_tokenized.txt'))
+    output_file = abspath(join(_my_dir, '..', 'examples', 'test_tokenized.jsonl'))
+
+    # tag the file
+    tagger.tag_file(input_file, output_file, tokenize=False, output_format='jsonl')
+
+    # read the output file and make sure we have the expected output
+    with open(output_file, 'r') as outf:
+        output = [json.loads(l) for l in outf.readlines()]
+
+    assert_equal(output, [{'tokens': ['I', 'am', 'going', 'to', 'the', 'market', '.'],
+                           'tags': ['PRP', 'VBP', 'VBG', 'TO', 'DT', 'NN', '.']},
+                          {'tokens': ['Are', 'you', 'going', 'to', 'come', 'with', 'me', '?'],
+                           'tags': ['VBP', 'PRP', 'VBG', 'TO', 'VB', 'IN', 'PRP', '.']}])
+
+
+def test_tag_file_range():
+    """
+    Check tag_file method on a range of sentences
+    """
+
+    global tagger
+
+    input_file = abspath(join(_my_dir, '..', 'examples', 'test_tokenized.txt'))
+    output_file = abspath(join(_my_dir, '..', 'examples', 'test_tokenized_range.tag'))
+
+    # tag just the second sentence of the file
+    tagger.tag_file(input_file, output_file, tokenize=False, start=1, end=2)
+
+    # read the output file and make sure we have the expected output
+    with open(output_file, 'r') as outf:
+        output = [l.strip() for l in outf.readlines()]
+
+    assert_equal(output, ["Are/VBP you/PRP going/VBG to/TO come/VB with/IN me/PRP ?/."])
+
+
+def test_tag_file_streams():
+    """
+    Check tag_file method with a gzip input file and a file object output
+    """
+
+    global tagger
+
+    input_file = abspath(join(_my_dir, '..', 'examples', 'test_tokenized.txt'))
+    compressed_file = abspath(join(_my_dir, '..', 'examples', 'test_tokenized.txt.gz'))
+    with open(input_file, 'rb') as inputf, gzip.open(compressed_file, 'wb') as compressedf:
+        compressedf.write(inputf.read())
+
+    # tag the compressed file into memory
+    output = BytesIO()
+    tagger.tag_file(compressed_file, output, tokenize=False)
+
+    assert_equal(output.getvalue().decode('utf-8').splitlines(),
+                 ["I/PRP am/VBP going/VBG to/TO the/DT market/NN ./.",
+                  "Are/VBP you/PRP going/VBG to/TO come/VB with/IN me/PRP ?/."])
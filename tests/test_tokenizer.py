@@ -0,0 +1,111 @@
+"""
+Run unit tests for the ZPar tokenizer.
+
+:author: Nitin Madnani (nmadnani@ets.org)
+"""
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import glob
+import os
+
+from io import open
+from os.path import abspath, dirname, join
+
+from nose.tools import assert_equal
+from zpar import ZPar
+
+_my_dir = abspath(dirname(__file__))
+
+z = None
+
+def setUp():
+    """
+    set up things we need for the tests
+    """
+    global z
+
+    assert 'ZPAR_MODEL_DIR' in os.environ
+
+    model_dir = os.environ['ZPAR_MODEL_DIR']
+
+    z = ZPar(model_dir)
+
+def tearDown():
+    """
+    Clean up after the tests
+    """
+    global z
+
+    if z:
+        z.close()
+        del z
+
+    # delete all the files we may have created
+    data_dir = abspath(join(_my_dir, '..', 'examples'))
+    for f in glob.glob(join(data_dir, 'test*.tok')):
+        os.unlink(f)
+
+
+def test_tokenize():
+    """
+    Check tokenize method
+    """
+
+    global z
+
+    assert_equal(z.tokenize('I am going to the market.'),
+                 ['I', 'am', 'going', 'to', 'the', 'market', '.'])
+    assert_equal(z.tokenize('  '), [])
+
+
+def check_tokenize_batch(threads):
+    """
+    Check tokenize_batch method with one and more threads
+    """
+
+    global z
+
+    sentences = ['I am going to the market.',
+                 'Are you going to come with me?'] * 20
+    expected = [['I', 'am', 'going', 'to', 'the', 'market', '.'],
+                ['Are', 'you', 'going', 'to', 'come', 'with', 'me', '?']] * 20
+    assert_equal(z.tokenize_batch(sentences, threads=threads), expected)
+
+
+def test_tokenize_batch():
+    yield check_tokenize_batch, 1
+    yield check_tokenize_batch, 4
+
+
+def test_tokenize_long_sentence():
+    """
+    Check that tokenize works when the output needs a larger buffer
+    """
+
+    global z
+
+    sentence = ' '.join(['antidisestablishmentarianism'] * 500)
+    assert_equal(z.tokenize(sentence), sentence.split())
+
+
+def test_tokenize_file():
+    """
+    Check tokenize_file method
+    """
+
+    global z
+
+    input_file = abspath(join(_my_dir, '..', 'examples', 'test.txt'))
+    output_file = abspath(join(_my_dir, '..', 'examples', 'test.tok'))
+
+    # tokenize the file
+    z.tokenize_file(input_file, output_file)
+
+    # read the output file and make sure we have the expected output
+    with open(output_file, 'r') as outf:
+        output = [l.strip() for l in outf.readlines()]
+
+    assert_equal(output, ['I am going to the market .',
+                          'Are you going to come with me ?'])
@@ -0,0 +1,100 @@
+"""
+Run unit tests for picking the optimized variant of the zpar library.
+
+:author: Nitin Madnani (nmadnani@ets.org)
+"""
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import os
+import platform
+import shutil
+import tempfile
+
+from nose.tools import assert_equal, raises
+from zpar import variants
+
+_dist_path = None
+
+
+def setUp():
+    """
+    set up a fake library directory
+    """
+    global _dist_path
+    _dist_path = tempfile.mkdtemp(prefix='test_variants')
+    for name in ['zpar.so', 'zpar-native.so', 'zpar-lto.so', 'zpar-pgo.so']:
+        open(os.path.join(_dist_path, name), 'w').close()
+
+
+def tearDown():
+    """
+    Clean up after the tests
+    """
+    shutil.rmtree(_dist_path, ignore_errors=True)
+
+
+def write_variants(info):
+    variants._write_variants(_dist_path, info)
+
+
+def this_machine(**kwargs):
+    info = {'machine': platform.machine(),
+            'cpu_flags': sorted(variants.cpu_flags() or [])}
+    info.update(kwargs)
+    return info
+
+
+def test_no_variants():
+    write_variants({})
+    assert_equal(variants.best_variant(_dist_path), 'generic')
+
+
+def test_most_optimized_without_speedups():
+    write_variants({'native': this_machine(), 'lto': this_machine()})
+    assert_equal(variants.best_variant(_dist_path), 'lto')
+
+
+def test_fastest_with_speedups():
+    write_variants({'native': this_machine(speedup=1.2),
+                    'lto': this_machine(speedup=1.1),
+                    'pgo': this_machine(speedup=1.05)})
+    assert_equal(variants.best_variant(_dist_path), 'native')
+
+
+def test_slower_variants_not_used():
+    write_variants({'native': this_machine(speedup=0.9)})
+    assert_equal(variants.best_variant(_dist_path), 'generic')
+
+
+def test_incompatible_cpu():
+    write_variants({'native': this_machine(cpu_flags=['not_a_real_cpu_flag']),
+                    'lto': this_machine(machine='not_a_real_machine')})
+    assert_equal(variants.best_variant(_dist_path), 'generic')
+
+
+def test_forced_variant():
+    write_variants({'native': this_machine(speedup=1.2)})
+    os.environ[variants.VARIANT_ENV] = 'generic'
+    try:
+        assert_equal(variants.best_variant(_dist_path), 'generic')
+    finally:
+        del os.environ[variants.VARIANT_ENV]
+
+
+@raises(OSError)
+def test_forced_variant_missing():
+    os.environ[variants.VARIANT_ENV] = 'pgo-train'
+    try:
+        variants.best_variant(_dist_path)
+    finally:
+        del os.environ[variants.VARIANT_ENV]
+
+
+def test_record_speedups():
+    write_variants({'native': this_machine()})
+    variants.record_speedups({'native': 1.3, 'lto': 1.5}, _dist_path)
+    recorded = variants.read_variants(_dist_path)
+    assert_equal(recorded['native']['speedup'], 1.3)
+    assert_equal(sorted(recorded), ['native'])
@@ -0,0 +1,156 @@
+"""
+Run unit tests for the compressed and compact server responses.
+
+:author: Nitin Madnani (nmadnani@ets.org)
+"""
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import os
+import threading
+
+from nose.tools import assert_equal, assert_true
+from six.moves import xmlrpc_client
+from zpar import ZPar
+from zpar.wire import (COMPRESSIONS, CompactClient, CompressingTransport,
+                       Vocabulary, compress, decode, decompress, encode)
+from zpar.zpar_server import StoppableServer
+
+# the port of the server used in the tests
+_PORT = 8874
+
+z = None
+tagger = None
+depparser = None
+server = None
+thread = None
+
+def setUp():
+    """
+    set up things we need for the tests
+    """
+    global z, tagger, depparser, server, thread
+
+    assert 'ZPAR_MODEL_DIR' in os.environ
+
+    model_dir = os.environ['ZPAR_MODEL_DIR']
+
+    z = ZPar(model_dir)
+    tagger = z.get_tagger()
+    depparser = z.get_depparser()
+
+    server = StoppableServer(('localhost', _PORT), model_dir, ['tagger', 'depparser'],
+                             logRequests=False, allow_none=True,
+                             compression_threshold=0)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+def tearDown():
+    """
+    Clean up after the tests
+    """
+    global z, tagger, depparser, server, thread
+
+    if z:
+        z.close()
+        del tagger
+        del depparser
+        del z
+
+    if server:
+        server.stop_server()
+        thread.join()
+        server = None
+
+
+def check_round_trip(model_name, text):
+    vocabulary = Vocabulary()
+    compact = encode(model_name, text, vocabulary)
+    assert_true(compact is not None)
+    assert_true(len(compact) < len(text) or not text)
+    assert_equal(decode(compact, vocabulary.strings), text)
+
+
+def test_round_trip():
+    """
+    Check that the compact encoding gives back the same output
+    """
+
+    global tagger, depparser
+
+    sentence = "I am going to the market. Don't you want to come with me?"
+    yield check_round_trip, 'tagger', tagger.tag_sentence(sentence)
+    yield check_round_trip, 'tagger', ''
+    yield check_round_trip, 'depparser', depparser.dep_parse_sentence(sentence)
+    yield check_round_trip, 'depparser', depparser.dep_parse_sentence(sentence,
+                                                                      with_lemmas=True)
+
+
+def test_unencodable_output():
+    """
+    Check that output in an unexpected form is not encoded
+    """
+
+    assert_equal(encode('tagger', 'I am', Vocabulary()), None)
+    assert_equal(encode('depparser', 'I\tPRP\tone\tSUB', Vocabulary()), None)
+
+
+def check_compression(encoding):
+    data = b'I/PRP am/VBP going/VBG to/TO the/DT market/NN ./.\n' * 100
+    compressed = compress(data, encoding)
+    assert_true(len(compressed) < len(data))
+    assert_equal(decompress(compressed, encoding), data)
+
+
+def test_compression():
+    for encoding in COMPRESSIONS:
+        yield check_compression, encoding
+
+
+class _RecordingTransport(CompressingTransport):
+    """
+    A transport that remembers how the last response was compressed.
+    """
+
+    def parse_response(self, response):
+        self.content_encoding = response.getheader('Content-Encoding')
+        return CompressingTransport.parse_response(self, response)
+
+
+def check_server_compression(compressions, expected_encoding):
+    transport = _RecordingTransport(compressions=compressions)
+    proxy = xmlrpc_client.ServerProxy('http://localhost:{}'.format(_PORT),
+                                      transport=transport,
+                                      allow_none=True)
+    assert_equal(proxy.tag_sentence('I am going to the market.'),
+                 'I/PRP am/VBP going/VBG to/TO the/DT market/NN ./.')
+    assert_equal(transport.content_encoding, expected_encoding)
+
+
+def test_server_compression():
+    for encoding in COMPRESSIONS:
+        yield check_server_compression, [encoding], encoding
+    yield check_server_compression, [], None
+
+    # the server picks the first of its own compressions that the client accepts
+    yield check_server_compression, list(reversed(COMPRESSIONS)), COMPRESSIONS[0]
+
+
+def test_compact_client():
+    """
+    Check that the compact methods give the same output as the usual ones
+    """
+
+    proxy = xmlrpc_client.ServerProxy('http://localhost:{}'.format(_PORT),
+                                      transport=CompressingTransport(),
+                                      allow_none=True)
+    client = CompactClient(proxy)
+    sentence = "I am going to the market. Don't you want to come with me?"
+    for _ in range(2):
+        assert_equal(client.tag_sentence(sentence), proxy.tag_sentence(sentence))
+        assert_equal(client.dep_parse_sentence(sentence), proxy.dep_parse_sentence(sentence))
+
+    # the vocabulary is only sent once
+    assert_equal(len(client.strings), len(server.vocabulary))
@@ -8,26 +8,53 @@ import ctypes as c
 import logging
 import os
 
-# do we have nltk installed and if so, do we have its
-# wordnet corpus installed?
-try:
-    import nltk
-    nltk.data.find('corpora/wordnet')
-except (ImportError, LookupError):
-    _HAS_LEMMATIZER = False
-else:
-    _HAS_LEMMATIZER = True
-    from nltk.stem.wordnet import WordNetLemmatizer
+from .buffers import OutputBuffer
+from .formats import check_output_format, convert_file, temporary_output
+from .hooks import Hooks, instrumented
+from .sentence_index import range_input
+from .streams import native_paths, needs_streaming, piped_output
+
+# whether we have nltk installed along with its wordnet
+# corpus; this is only checked when lemmas are first asked
+# for since importing nltk is slow
+_HAS_LEMMATIZER = None
+
+
+def _has_lemmatizer():
+    global _HAS_LEMMATIZER
+    if _HAS_LEMMATIZER is None:
+        try:
+            import nltk
+            nltk.data.find('corpora/wordnet')
+        except (ImportError, LookupError):
+            _HAS_LEMMATIZER = False
+        else:
+            _HAS_LEMMATIZER = True
+    return _HAS_LEMMATIZER
 
 
 class DepParser(object):
     """The ZPar English Dependency Parser"""
 
-    def __init__(self, modelpath, libptr, zpar_session_obj):
+    # the name of the model reported to the instrumentation hooks
+    model_name = 'depparser'
+
+    def __init__(self, modelpath, libptr, zpar_session_obj, lemma_table=None,
+                 zpar_obj=None, beam=None):
         super(DepParser, self).__init__()
 
-        # save the zpar session object
+        # save the zpar session object and the ZPar object
+        # that owns it, which we need for the async methods
         self._zpar_session_obj = zpar_session_obj
+        self._zpar_obj = zpar_obj
+
+        # the beam width of the library variant the given library
+        # pointer is for (``None`` for the default build)
+        self.beam = beam
+
+        # the instrumentation hooks run around each sentence and
+        # file call, which are shared with the ZPar object, if any
+        self.hooks = zpar_obj.hooks if zpar_obj is not None else Hooks()
 
         # set up a logger
         self.logger = logging.getLogger(__name__)
@@ -54,36 +81,72 @@ class DepParser(object):
         self._dep_parse_tagged_file.restype = None
         self._dep_parse_tagged_file.argtypes = [c.c_void_p, c.c_char_p, c.c_char_p, c.c_char]
 
+        # use the versions of the sentence methods that write into
+        # a reusable buffer instead, if the library has them
+        self._output = OutputBuffer.for_library(libptr, self._zpar_session_obj)
+        if self._output:
+            self._dep_parse_sentence_into = OutputBuffer.set_argtypes(libptr.dep_parse_sentence_into,
+                                                                      [c.c_void_p, c.c_char_p, c.c_bool])
+            self._dep_parse_tagged_sentence_into = OutputBuffer.set_argtypes(libptr.dep_parse_tagged_sentence_into,
+                                                                             [c.c_void_p, c.c_char_p, c.c_char])
+
         if self._load_depparser(self._zpar_session_obj, modelpath.encode('utf-8')):
             raise OSError('Cannot find dependency parser model at {}\n'.format(modelpath))
 
-        # set up the wordnet lemmatizer if we have it
-        if _HAS_LEMMATIZER:
-            self.lemmatizer = WordNetLemmatizer()
-        else:
-            self.lemmatizer = None
+        # the lemmatizer is only set up when lemmas are first asked for
+        self._lemma_table = lemma_table or os.environ.get('ZPAR_LEMMA_TABLE')
+        self._lemmatizer = None
+        self._lemmatizer_loaded = False
+
+    @property
+    def lemmatizer(self):
+        # set up the lemmatizer, preferring a precomputed lemma
+        # table if we have one and NLTK's wordnet otherwise
+        if not self._lemmatizer_loaded:
+            from .lemmatizer import Lemmatizer
+            if self._lemma_table:
+                self._lemmatizer = Lemmatizer(self._lemma_table)
+            elif _has_lemmatizer():
+                self._lemmatizer = Lemmatizer()
+            self._lemmatizer_loaded = True
+        return self._lemmatizer
 
     def annotate_parse_with_lemmas(self, parse):
         if not parse.strip():
             return parse
         else:
-            new_parse_lines = []
-            for line in parse.strip().split('\n'):
-                fields = line.strip().split('\t')
-                word, pos = fields[:2]
-                if pos.startswith('J'):
-                    param = 'a'
-                elif pos.startswith('R'):
-                    param = 'r'
-                elif pos.startswith('V'):
-                    param = 'v'
-                else:
-                    param = 'n'
-                lemma = self.lemmatizer.lemmatize(word.lower(), param)
-                new_parse_line = '\t'.join(fields + [lemma])
-                new_parse_lines.append(new_parse_line)
-            return '\n'.join(new_parse_lines) + '\n'
+            from .lemmatizer import annotate_conll_lines
+            return annotate_conll_lines(parse.strip().split('\n'), self.lemmatizer)
+
+    def _annotate_file_with_lemmas(self, parse_file_func, outputfile, processes):
+        from .lemmatizer import annotate_conll_file, annotation_pool
 
+        # the worker processes are forked before the pipe is
+        # opened so that they do not hold on to its write end
+        pool = annotation_pool(self.lemmatizer, processes) if processes > 1 else None
+
+        # let the given function parse the whole file in C++ space
+        # into a pipe whose output is streamed through the lemmatizer
+        # into the output file as the parses arrive
+        def annotate(parsed_file):
+            annotate_conll_file(parsed_file, outputfile, self.lemmatizer, pool=pool)
+        try:
+            with piped_output(annotate) as parsed_path:
+                parse_file_func(parsed_path)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+    def _convert_file(self, parse_file_func, outputfile, with_lemmas, output_format):
+        # let the given function write the parses in the CoNLL text
+        # format to a temporary file and then convert that file
+        with temporary_output(outputfile, suffix='.dep') as textfile:
+            parse_file_func(textfile)
+            convert_file(textfile, outputfile, 'depparser', output_format,
+                         with_lemmas=with_lemmas and self.lemmatizer is not None)
+
+    @instrumented('sentence')
     def dep_parse_sentence(self,
                            sentence,
                            tokenize=True,
@@ -95,10 +158,15 @@ class DepParser(object):
             zpar_compatible_sentence = sentence.strip() + "\n "
             zpar_compatible_sentence = zpar_compatible_sentence.strip() + "\n "
             zpar_compatible_sentence = zpar_compatible_sentence.encode('utf-8')
-            parsed_sent = self._dep_parse_sentence(self._zpar_session_obj,
-                                                   zpar_compatible_sentence,
-                                                   tokenize)
-            ans = parsed_sent.decode('utf-8')
+            if self._output:
+                ans = self._output.call(self._dep_parse_sentence_into,
+                                        zpar_compatible_sentence,
+                                        tokenize)
+            else:
+                parsed_sent = self._dep_parse_sentence(self._zpar_session_obj,
+                                                       zpar_compatible_sentence,
+                                                       tokenize)
+                ans = parsed_sent.decode('utf-8')
 
             # if we are asked to add lemma information, then we need
             # to add another field to each of the lines in the
@@ -111,27 +179,87 @@ class DepParser(object):
                                         'install NLTK and its Wordnet corpus.')
         return ans
 
+    def adep_parse_sentence(self, sentence, tokenize=True, with_lemmas=False):
+        """
+        Return an awaitable for ``dep_parse_sentence()`` of the given
+        sentence; sentences that are awaited concurrently are
+        parsed together in batches off the event loop.
+        """
+        return self._coalescer('dep_parse_sentence').submit(sentence,
+                                                            tokenize=tokenize,
+                                                            with_lemmas=with_lemmas)
+
+    def adep_parse_sentences(self, sentences, tokenize=True, with_lemmas=False):
+        """
+        Return an awaitable for the list of parses
+        for the given list of sentences.
+        """
+        return self._coalescer('dep_parse_sentence').submit_batch(sentences,
+                                                                  tokenize=tokenize,
+                                                                  with_lemmas=with_lemmas)
+
+    @instrumented('file')
     def dep_parse_file(self,
                        inputfile,
                        outputfile,
                        tokenize=True,
-                       with_lemmas=False):
+                       with_lemmas=False,
+                       lemma_processes=1,
+                       output_format='text',
+                       start=None,
+                       end=None,
+                       range_unit='sentence'):
 
-
-        if not os.path.exists(inputfile):
+        check_output_format(output_format)
+        if needs_streaming(inputfile, outputfile):
+            # let ZPar read and write through pipes that are
+            # fed from and drained into the given files
+            with native_paths(inputfile, outputfile) as (inputpath, outputpath):
+                self.dep_parse_file(inputpath,
+                                    outputpath,
+                                    tokenize=tokenize,
+                                    with_lemmas=with_lemmas,
+                                    lemma_processes=lemma_processes,
+                                    output_format=output_format,
+                                    start=start,
+                                    end=end,
+                                    range_unit=range_unit)
+        elif not os.path.exists(inputfile):
             raise OSError('File {} does not exist.'.format(inputfile))
+        elif start is not None or end is not None:
+            # only parse the given range of sentences or bytes
+            with range_input(inputfile, outputfile, start=start, end=end,
+                             unit=range_unit) as rangefile:
+                self.dep_parse_file(rangefile,
+                                    outputfile,
+                                    tokenize=tokenize,
+                                    with_lemmas=with_lemmas,
+                                    lemma_processes=lemma_processes,
+                                    output_format=output_format)
+        elif output_format != 'text':
+            def parse_file_func(textfile):
+                self.dep_parse_file(inputfile,
+                                    textfile,
+                                    tokenize=tokenize,
+                                    with_lemmas=with_lemmas,
+                                    lemma_processes=lemma_processes)
+            self._convert_file(parse_file_func, outputfile, with_lemmas, output_format)
         else:
             parsed = False
 
-            # if we want lemmas, we have to individually parse
-            # each sentence and then annotate its parse with lemmas
+            # if we want lemmas, we parse the file in C++ space
+            # and then annotate the parses with lemmas in a
+            # streaming pass over the output
             if with_lemmas:
                 if self.lemmatizer:
-                    with open(inputfile, 'r') as inputf, open(outputfile, 'w') as outf:
-                        for sentence in inputf:
-                            outf.write(self.dep_parse_sentence(sentence,
-                                                                tokenize=tokenize,
-                                                                with_lemmas=True) + '\n')
+                    def parse_file_func(parsed_file):
+                        self._dep_parse_file(self._zpar_session_obj,
+                                             inputfile.encode('utf-8'),
+                                             parsed_file.encode('utf-8'),
+                                             tokenize)
+                    self._annotate_file_with_lemmas(parse_file_func,
+                                                    outputfile,
+                                                    lemma_processes)
                     parsed = True
                 else:
                     self.logger.warning('No lemmatizer available. Please '
@@ -144,6 +272,7 @@ class DepParser(object):
                                          outputfile.encode('utf-8'),
                                          tokenize)
 
+    @instrumented('sentence')
     def dep_parse_tagged_sentence(self,
                                   tagged_sentence,
                                   sep='/',
@@ -153,10 +282,15 @@ class DepParser(object):
             ans = ""
         else:
             zpar_compatible_sentence = tagged_sentence.strip().encode('utf-8')
-            parsed_sent = self._dep_parse_tagged_sentence(self._zpar_session_obj,
-                                                          zpar_compatible_sentence,
-                                                          sep.encode('utf-8'))
-            ans = parsed_sent.decode('utf-8')
+            if self._output:
+                ans = self._output.call(self._dep_parse_tagged_sentence_into,
+                                        zpar_compatible_sentence,
+                                        sep.encode('utf-8'))
+            else:
+                parsed_sent = self._dep_parse_tagged_sentence(self._zpar_session_obj,
+                                                              zpar_compatible_sentence,
+                                                              sep.encode('utf-8'))
+                ans = parsed_sent.decode('utf-8')
 
         # if we are asked to add lemma information, then we need
         # to add another field to each of the lines in the
@@ -169,24 +303,85 @@ class DepParser(object):
                                     'install NLTK and its Wordnet corpus.')
         return ans
 
-    def dep_parse_tagged_file(self, inputfile, outputfile, sep='/', with_lemmas=False):
+    def adep_parse_tagged_sentence(self, tagged_sentence, sep='/', with_lemmas=False):
+        return self._coalescer('dep_parse_tagged_sentence').submit(tagged_sentence,
+                                                                   sep=sep,
+                                                                   with_lemmas=with_lemmas)
+
+    def adep_parse_tagged_sentences(self, tagged_sentences, sep='/', with_lemmas=False):
+        return self._coalescer('dep_parse_tagged_sentence').submit_batch(tagged_sentences,
+                                                                         sep=sep,
+                                                                         with_lemmas=with_lemmas)
 
-        if not os.path.exists(inputfile):
+    def _coalescer(self, method_name):
+        if self._zpar_obj is None:
+            raise Exception('The async methods need a dependency parser '
+                            'obtained from ZPar.get_depparser().')
+        return self._zpar_obj._get_coalescer('depparser', method_name)
+
+    @instrumented('file')
+    def dep_parse_tagged_file(self,
+                              inputfile,
+                              outputfile,
+                              sep='/',
+                              with_lemmas=False,
+                              lemma_processes=1,
+                              output_format='text',
+                              start=None,
+                              end=None,
+                              range_unit='sentence'):
+
+        check_output_format(output_format)
+        if needs_streaming(inputfile, outputfile):
+            # let ZPar read and write through pipes that are
+            # fed from and drained into the given files
+            with native_paths(inputfile, outputfile) as (inputpath, outputpath):
+                self.dep_parse_tagged_file(inputpath,
+                                           outputpath,
+                                           sep=sep,
+                                           with_lemmas=with_lemmas,
+                                           lemma_processes=lemma_processes,
+                                           output_format=output_format,
+                                           start=start,
+                                           end=end,
+                                           range_unit=range_unit)
+        elif not os.path.exists(inputfile):
             raise OSError('File {} does not exist.'.format(inputfile))
+        elif start is not None or end is not None:
+            # only parse the given range of sentences or bytes
+            with range_input(inputfile, outputfile, start=start, end=end,
+                             unit=range_unit) as rangefile:
+                self.dep_parse_tagged_file(rangefile,
+                                           outputfile,
+                                           sep=sep,
+                                           with_lemmas=with_lemmas,
+                                           lemma_processes=lemma_processes,
+                                           output_format=output_format)
+        elif output_format != 'text':
+            def parse_file_func(textfile):
+                self.dep_parse_tagged_file(inputfile,
+                                           textfile,
+                                           sep=sep,
+                                           with_lemmas=with_lemmas,
+                                           lemma_processes=lemma_processes)
+            self._convert_file(parse_file_func, outputfile, with_lemmas, output_format)
         else:
 
             parsed = False
 
-            # if we want lemmas, we have to individually parse
-            # each sentence and then annotate its parse with lemmas
+            # if we want lemmas, we parse the file in C++ space
+            # and then annotate the parses with lemmas in a
+            # streaming pass over the output
             if with_lemmas:
                 if self.lemmatizer:
-                    with open(inputfile, 'r') as inputf, open(outputfile, 'w') as outf:
-                        for sentence in inputf:
-                            outf.write(self.dep_parse_tagged_sentence(sentence,
-                                                                      sep=sep,
-                                                                      with_lemmas=with_lemmas) + '\n')
-
+                    def parse_file_func(parsed_file):
+                        self._dep_parse_tagged_file(self._zpar_session_obj,
+                                                    inputfile.encode('utf-8'),
+                                                    parsed_file.encode('utf-8'),
+                                                    sep.encode('utf-8'))
+                    self._annotate_file_with_lemmas(parse_file_func,
+                                                    outputfile,
+                                                    lemma_processes)
                     parsed = True
                 else:
                     self.logger.warning('No lemmatizer available. Please '
@@ -205,4 +400,14 @@ class DepParser(object):
         self._dep_parse_file = None
         self._dep_parse_tagged_sentence = None
         self._dep_parse_tagged_file = None
+        if self._output:
+            self._output.release()
+            self._output = None
+            self._dep_parse_sentence_into = None
+            self._dep_parse_tagged_sentence_into = None
         self._zpar_session_obj = None
+        self._zpar_obj = None
+        if self._lemmatizer:
+            self._lemmatizer.close()
+            self._lemmatizer = None
+        self._lemmatizer_loaded = True
@@ -8,15 +8,35 @@ import ctypes as c
 import logging
 import os
 
+from .buffers import OutputBuffer
+from .formats import check_output_format, convert_file, temporary_output
+from .hooks import Hooks, instrumented
+from .sentence_index import range_input
+from .streams import native_paths, needs_streaming
+from .tree import ParseTree
+
 
 class Parser(object):
     """The ZPar English Constituency Parser"""
 
-    def __init__(self, modelpath, libptr, zpar_session_obj):
+    # the name of the model reported to the instrumentation hooks
+    model_name = 'parser'
+
+    def __init__(self, modelpath, libptr, zpar_session_obj, zpar_obj=None, beam=None):
         super(Parser, self).__init__()
 
-        # save the zpar session object
+        # save the zpar session object and the ZPar object
+        # that owns it, which we need for the async methods
         self._zpar_session_obj = zpar_session_obj
+        self._zpar_obj = zpar_obj
+
+        # the beam width of the library variant the given library
+        # pointer is for (``None`` for the default build)
+        self.beam = beam
+
+        # the instrumentation hooks run around each sentence and
+        # file call, which are shared with the ZPar object, if any
+        self.hooks = zpar_obj.hooks if zpar_obj is not None else Hooks()
 
         # set up a logger
         self.logger = logging.getLogger(__name__)
@@ -43,10 +63,20 @@ class Parser(object):
         self._parse_tagged_file.restype = None
         self._parse_tagged_file.argtypes = [c.c_void_p, c.c_char_p, c.c_char_p, c.c_char]
 
+        # use the versions of the sentence methods that write into
+        # a reusable buffer instead, if the library has them
+        self._output = OutputBuffer.for_library(libptr, self._zpar_session_obj)
+        if self._output:
+            self._parse_sentence_into = OutputBuffer.set_argtypes(libptr.parse_sentence_into,
+                                                                  [c.c_void_p, c.c_char_p, c.c_bool])
+            self._parse_tagged_sentence_into = OutputBuffer.set_argtypes(libptr.parse_tagged_sentence_into,
+                                                                         [c.c_void_p, c.c_char_p, c.c_char])
+
         if self._load_parser(self._zpar_session_obj, modelpath.encode('utf-8')):
             raise OSError('Cannot find parser model at {}\n'.format(modelpath))
 
-    def parse_sentence(self, sentence, tokenize=True):
+    @instrumented('sentence')
+    def parse_sentence(self, sentence, tokenize=True, return_tree=False):
         if not sentence.strip():
             # return empty string if the input is empty
             ans = ""
@@ -54,32 +84,139 @@ class Parser(object):
             zpar_compatible_sentence = sentence.strip() + "\n "
             zpar_compatible_sentence = zpar_compatible_sentence.strip() + "\n "
             zpar_compatible_sentence = zpar_compatible_sentence.encode('utf-8')
-            parsed_sent = self._parse_sentence(self._zpar_session_obj, zpar_compatible_sentence, tokenize)
-            ans = parsed_sent.decode('utf-8')
-
+            if self._output:
+                ans = self._output.call(self._parse_sentence_into,
+                                        zpar_compatible_sentence, tokenize)
+            else:
+                parsed_sent = self._parse_sentence(self._zpar_session_obj, zpar_compatible_sentence, tokenize)
+                ans = parsed_sent.decode('utf-8')
+
+        # if we are asked for a tree, convert the bracketed
+        # string into a compact tree object
+        if return_tree:
+            ans = ParseTree.from_string(ans)
         return ans
 
-    def parse_file(self, inputfile, outputfile, tokenize=True):
-        if os.path.exists(inputfile):
-            self._parse_file(self._zpar_session_obj, inputfile.encode('utf-8'), outputfile.encode('utf-8'), tokenize)
-        else:
+    def aparse_sentence(self, sentence, tokenize=True, return_tree=False):
+        """
+        Return an awaitable for ``parse_sentence()`` of the given
+        sentence; sentences that are awaited concurrently are
+        parsed together in batches off the event loop.
+        """
+        return self._coalescer('parse_sentence').submit(sentence,
+                                                        tokenize=tokenize,
+                                                        return_tree=return_tree)
+
+    def aparse_sentences(self, sentences, tokenize=True, return_tree=False):
+        """
+        Return an awaitable for the list of parses
+        for the given list of sentences.
+        """
+        return self._coalescer('parse_sentence').submit_batch(sentences,
+                                                              tokenize=tokenize,
+                                                              return_tree=return_tree)
+
+    @instrumented('file')
+    def parse_file(self,
+                   inputfile,
+                   outputfile,
+                   tokenize=True,
+                   output_format='text',
+                   start=None,
+                   end=None,
+                   range_unit='sentence'):
+        check_output_format(output_format)
+        if needs_streaming(inputfile, outputfile):
+            # let ZPar read and write through pipes that are
+            # fed from and drained into the given files
+            with native_paths(inputfile, outputfile) as (inputpath, outputpath):
+                self.parse_file(inputpath, outputpath, tokenize=tokenize,
+                                output_format=output_format, start=start,
+                                end=end, range_unit=range_unit)
+        elif not os.path.exists(inputfile):
             raise OSError('File {} does not exist.'.format(inputfile))
+        elif start is not None or end is not None:
+            # only parse the given range of sentences or bytes
+            with range_input(inputfile, outputfile, start=start, end=end,
+                             unit=range_unit) as rangefile:
+                self.parse_file(rangefile, outputfile, tokenize=tokenize,
+                                output_format=output_format)
+        elif output_format != 'text':
+            # parse the file in C++ space and then convert the output
+            with temporary_output(outputfile) as textfile:
+                self.parse_file(inputfile, textfile, tokenize=tokenize)
+                convert_file(textfile, outputfile, 'parser', output_format)
+        else:
+            self._parse_file(self._zpar_session_obj, inputfile.encode('utf-8'), outputfile.encode('utf-8'), tokenize)
 
-    def parse_tagged_sentence(self, tagged_sentence, sep='/'):
+    @instrumented('sentence')
+    def parse_tagged_sentence(self, tagged_sentence, sep='/', return_tree=False):
         if not tagged_sentence.strip():
             # return empty string if the input is empty
             ans = ""
         else:
             zpar_compatible_sentence = tagged_sentence.strip().encode('utf-8')
-            parsed_sent = self._parse_tagged_sentence(self._zpar_session_obj, zpar_compatible_sentence, sep.encode('utf-8'))
-            ans = parsed_sent.decode('utf-8')
+            if self._output:
+                ans = self._output.call(self._parse_tagged_sentence_into,
+                                        zpar_compatible_sentence, sep.encode('utf-8'))
+            else:
+                parsed_sent = self._parse_tagged_sentence(self._zpar_session_obj, zpar_compatible_sentence, sep.encode('utf-8'))
+                ans = parsed_sent.decode('utf-8')
+
+        # if we are asked for a tree, convert the bracketed
+        # string into a compact tree object
+        if return_tree:
+            ans = ParseTree.from_string(ans)
         return ans
 
-    def parse_tagged_file(self, inputfile, outputfile, sep='/'):
-        if os.path.exists(inputfile):
-            self._parse_tagged_file(self._zpar_session_obj, inputfile.encode('utf-8'), outputfile.encode('utf-8'), sep.encode('utf-8'))
-        else:
+    def aparse_tagged_sentence(self, tagged_sentence, sep='/', return_tree=False):
+        return self._coalescer('parse_tagged_sentence').submit(tagged_sentence,
+                                                               sep=sep,
+                                                               return_tree=return_tree)
+
+    def aparse_tagged_sentences(self, tagged_sentences, sep='/', return_tree=False):
+        return self._coalescer('parse_tagged_sentence').submit_batch(tagged_sentences,
+                                                                     sep=sep,
+                                                                     return_tree=return_tree)
+
+    def _coalescer(self, method_name):
+        if self._zpar_obj is None:
+            raise Exception('The async methods need a parser obtained '
+                            'from ZPar.get_parser().')
+        return self._zpar_obj._get_coalescer('parser', method_name)
+
+    @instrumented('file')
+    def parse_tagged_file(self,
+                          inputfile,
+                          outputfile,
+                          sep='/',
+                          output_format='text',
+                          start=None,
+                          end=None,
+                          range_unit='sentence'):
+        check_output_format(output_format)
+        if needs_streaming(inputfile, outputfile):
+            # let ZPar read and write through pipes that are
+            # fed from and drained into the given files
+            with native_paths(inputfile, outputfile) as (inputpath, outputpath):
+                self.parse_tagged_file(inputpath, outputpath, sep=sep,
+                                       output_format=output_format, start=start,
+                                       end=end, range_unit=range_unit)
+        elif not os.path.exists(inputfile):
             raise OSError('File {} does not exist.'.format(inputfile))
+        elif start is not None or end is not None:
+            # only parse the given range of sentences or bytes
+            with range_input(inputfile, outputfile, start=start, end=end,
+                             unit=range_unit) as rangefile:
+                self.parse_tagged_file(rangefile, outputfile, sep=sep,
+                                       output_format=output_format)
+        elif output_format != 'text':
+            # parse the file in C++ space and then convert the output
+            with temporary_output(outputfile) as textfile:
+                self.parse_tagged_file(inputfile, textfile, sep=sep)
+                convert_file(textfile, outputfile, 'parser', output_format)
+        else:
+            self._parse_tagged_file(self._zpar_session_obj, inputfile.encode('utf-8'), outputfile.encode('utf-8'), sep.encode('utf-8'))
 
     def cleanup(self):
         self._load_parser = None
@@ -87,4 +224,10 @@ class Parser(object):
         self._parse_file = None
         self._parse_tagged_sentence = None
         self._parse_tagged_file = None
+        if self._output:
+            self._output.release()
+            self._output = None
+            self._parse_sentence_into = None
+            self._parse_tagged_sentence_into = None
         self._zpar_session_obj = None
+        self._zpar_obj = None
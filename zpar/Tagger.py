@@ -7,15 +7,34 @@ import ctypes as c
 import logging
 import os
 
+from .buffers import OutputBuffer
+from .formats import check_output_format, convert_file, temporary_output
+from .hooks import Hooks, instrumented
+from .sentence_index import range_input
+from .streams import native_paths, needs_streaming
+
 
 class Tagger(object):
     """The ZPar English POS Tagger"""
 
-    def __init__(self, modelpath, libptr, zpar_session_obj):
+    # the name of the model reported to the instrumentation hooks
+    model_name = 'tagger'
+
+    def __init__(self, modelpath, libptr, zpar_session_obj, zpar_obj=None, beam=None):
         super(Tagger, self).__init__()
 
-        # save the zpar session object
+        # save the zpar session object and the ZPar object
+        # that owns it, which we need for the async methods
         self._zpar_session_obj = zpar_session_obj
+        self._zpar_obj = zpar_obj
+
+        # the beam width of the library variant the given library
+        # pointer is for (``None`` for the default build)
+        self.beam = beam
+
+        # the instrumentation hooks run around each sentence and
+        # file call, which are shared with the ZPar object, if any
+        self.hooks = zpar_obj.hooks if zpar_obj is not None else Hooks()
 
         # set up a logger
         self.logger = logging.getLogger(__name__)
@@ -34,9 +53,17 @@ class Tagger(object):
         self._tag_file.restype = None
         self._tag_file.argtypes = [c.c_void_p, c.c_char_p, c.c_char_p, c.c_bool]
 
+        # use the version of the sentence method that writes into a
+        # reusable buffer instead, if the library has it
+        self._output = OutputBuffer.for_library(libptr, self._zpar_session_obj)
+        if self._output:
+            self._tag_sentence_into = OutputBuffer.set_argtypes(libptr.tag_sentence_into,
+                                                                [c.c_void_p, c.c_char_p, c.c_bool])
+
         if self._load_tagger(self._zpar_session_obj, modelpath.encode('utf-8')):
             raise OSError('Cannot find tagger model at {}\n'.format(modelpath))
 
+    @instrumented('sentence')
     def tag_sentence(self, sentence, tokenize=True):
         if not sentence.strip():
             # return empty string if the input is empty
@@ -44,21 +71,78 @@ class Tagger(object):
         else:
             zpar_compatible_sentence = sentence.strip() + "\n "
             zpar_compatible_sentence = zpar_compatible_sentence.encode('utf-8')
-            tagged_sent = self._tag_sentence(self._zpar_session_obj, zpar_compatible_sentence, tokenize)
-            ans = tagged_sent.decode('utf-8')
+            if self._output:
+                ans = self._output.call(self._tag_sentence_into,
+                                        zpar_compatible_sentence, tokenize)
+            else:
+                tagged_sent = self._tag_sentence(self._zpar_session_obj, zpar_compatible_sentence, tokenize)
+                ans = tagged_sent.decode('utf-8')
             return ans
 
         return ans
 
-    def tag_file(self, inputfile, outputfile, tokenize=True):
-        if os.path.exists(inputfile):
-            self._tag_file(self._zpar_session_obj, inputfile.encode('utf-8'), outputfile.encode('utf-8'), tokenize)
-        else:
+    def atag_sentence(self, sentence, tokenize=True):
+        """
+        Return an awaitable for ``tag_sentence()`` of the given
+        sentence; sentences that are awaited concurrently are
+        tagged together in batches off the event loop.
+        """
+        return self._coalescer('tag_sentence').submit(sentence, tokenize=tokenize)
+
+    def atag_sentences(self, sentences, tokenize=True):
+        """
+        Return an awaitable for the list of tagged sentences
+        for the given list of sentences.
+        """
+        return self._coalescer('tag_sentence').submit_batch(sentences, tokenize=tokenize)
+
+    def _coalescer(self, method_name):
+        if self._zpar_obj is None:
+            raise Exception('The async methods need a tagger obtained '
+                            'from ZPar.get_tagger().')
+        return self._zpar_obj._get_coalescer('tagger', method_name)
+
+    @instrumented('file')
+    def tag_file(self,
+                 inputfile,
+                 outputfile,
+                 tokenize=True,
+                 output_format='text',
+                 start=None,
+                 end=None,
+                 range_unit='sentence'):
+        check_output_format(output_format)
+        if needs_streaming(inputfile, outputfile):
+            # let ZPar read and write through pipes that are
+            # fed from and drained into the given files
+            with native_paths(inputfile, outputfile) as (inputpath, outputpath):
+                self.tag_file(inputpath, outputpath, tokenize=tokenize,
+                              output_format=output_format, start=start,
+                              end=end, range_unit=range_unit)
+        elif not os.path.exists(inputfile):
             raise OSError('File {} does not exist.'.format(inputfile))
+        elif start is not None or end is not None:
+            # only tag the given range of sentences or bytes
+            with range_input(inputfile, outputfile, start=start, end=end,
+                             unit=range_unit) as rangefile:
+                self.tag_file(rangefile, outputfile, tokenize=tokenize,
+                              output_format=output_format)
+        elif output_format != 'text':
+            # tag the file in C++ space and then convert the output
+            with temporary_output(outputfile) as textfile:
+                self.tag_file(inputfile, textfile, tokenize=tokenize)
+                convert_file(textfile, outputfile, 'tagger', output_format)
+        else:
+            self._tag_file(self._zpar_session_obj, inputfile.encode('utf-8'), outputfile.encode('utf-8'), tokenize)
 
     def cleanup(self):
         self._load_tagger = None
         self._tag_sentence = None
         self._tag_file = None
+        if self._output:
+            self._output.release()
+            self._output = None
+            self._tag_sentence_into = None
         self._zpar_session_obj = None
+        self._zpar_obj = None
 
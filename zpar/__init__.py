@@ -7,42 +7,169 @@
 import _ctypes
 import ctypes as c
 import os
+import re
+import shutil
+import tempfile
+
+from io import open
 
 from .Tagger import Tagger
 from .Parser import Parser
 from .DepParser import DepParser
+from .hooks import Hooks
+from .variants import best_variant, library_name
+
+# the other submodules are only imported by the methods that use them
+# so that ``import zpar`` stays fast for short-lived processes
 
 __all__ = ['Tagger', 'Parser', 'DepParser']
 
+# the directory that holds the zpar shared library and its variants
+_DIST_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dist')
+
+
+def available_beams():
+    """
+    Return the sorted list of beam widths for which a variant of the
+    zpar shared library has been built (see ``ZPAR_BEAMS`` in the
+    Makefile); a beam width of 1 is greedy decoding.
+    """
+    beams = []
+    if os.path.isdir(_DIST_PATH):
+        for name in os.listdir(_DIST_PATH):
+            match = re.match(r'^zpar-beam(\d+)\.so$', name)
+            if match:
+                beams.append(int(match.group(1)))
+    return sorted(beams)
+
+
+def _library_path(beam=None, variant='generic'):
+    """
+    Return the path to the zpar shared library built with the given
+    beam width, or to the given optimized variant of the default
+    library if no beam width is given.
+    """
+    if beam is None:
+        return os.path.join(_DIST_PATH, library_name(variant))
+    zpar_path = os.path.join(_DIST_PATH, 'zpar-beam{}.so'.format(beam))
+    if not os.path.exists(zpar_path):
+        raise OSError('No zpar library was built with beam width {} (available: {}); '
+                      'rebuild with ZPAR_BEAMS="{}" make python-zpar'.format(beam,
+                                                                             available_beams() or 'none',
+                                                                             beam))
+    return zpar_path
+
+
+# the zpar shared libraries loaded so far, keyed by path; they are
+# never unloaded since reloading a library costs more than keeping
+# it around and every session owns all of its own native memory
+_LIBRARIES = {}
+
+
+def _load_private_library(zpar_path):
+    """
+    Load a copy of the given zpar shared library that shares none of
+    ZPar's global state (e.g., its word and tag tables) with any other
+    loaded copy. The loader would return the already loaded library
+    for the same file, so the copy is made under a new name first; it
+    stays mapped after the file is removed.
+    """
+    fd, copy_path = tempfile.mkstemp(prefix='zpar-', suffix='.so')
+    try:
+        with os.fdopen(fd, 'wb') as copyf, open(zpar_path, 'rb') as libf:
+            shutil.copyfileobj(libf, copyf)
+        try:
+            return c.cdll.LoadLibrary(copy_path)
+        except OSError as e:
+            raise OSError('Cannot load a private copy of the zpar library from {} '
+                          '({}); set TMPDIR to a directory that allows executable '
+                          'files.'.format(copy_path, e))
+    finally:
+        os.unlink(copy_path)
+
+
+def _load_library(beam=None, variant='generic', private=False):
+    """
+    Load the zpar shared library for the given beam width (or variant),
+    unless it is already loaded, and call its initialize method to
+    instantiate a new session object associated with it. If ``private``
+    is set, a new copy of the library is loaded for the session instead
+    of the shared one. Returns the library and the session.
+    """
+    zpar_path = _library_path(beam, variant)
+    libptr = None if private else _LIBRARIES.get(zpar_path)
+    if libptr is None:
+        libptr = _load_private_library(zpar_path) if private else c.cdll.LoadLibrary(zpar_path)
+        libptr.initialize.restype = c.c_void_p
+        libptr.initialize.argtypes = None
+        libptr.unload_models.restype = None
+        libptr.unload_models.argtypes = [c.c_void_p]
+        if not private:
+            _LIBRARIES[zpar_path] = libptr
+    return libptr, libptr.initialize()
+
+
 class ZPar(object):
     """The ZPar wrapper object"""
 
-    def __init__(self, modelpath):
+    def __init__(self, modelpath, beam=None, hooks=None, private_library=False):
         super(ZPar, self).__init__()
 
-        # get a pointer to the zpar shared library
-        base_path = os.path.dirname(os.path.abspath(__file__))
-        zpar_path = os.path.join(base_path, 'dist', 'zpar.so')
-        self.libptr = c.cdll.LoadLibrary(zpar_path)
+        # get a pointer to the zpar shared library built with the
+        # given beam width (the default build if none is given, in
+        # its fastest variant for this CPU) and the session object
+        # associated with this session; with ``private_library``,
+        # this object gets its own copy of the library so that it
+        # can load models while another ZPar object is decoding
+        self.beam = beam
+        self.variant = best_variant(_DIST_PATH) if beam is None else 'generic'
+        self.private_library = private_library
+        self.libptr, self._zpar_session_obj = _load_library(beam, self.variant,
+                                                            private=private_library)
 
-        # call the library's initialize method to instantiate
-        # the session object associated with this session
-        self._initialize = self.libptr.initialize
-        self._initialize.restype = c.c_void_p
-        self._initialize.argtypes = None
-        self._zpar_session_obj = self._initialize()
+        # the libraries and sessions for models that were asked
+        # for with a different beam width, keyed by beam width
+        self._beam_variants = {}
 
         self.modelpath = modelpath
         self.tagger = None
         self.parser = None
         self.depparser = None
+        self._batch_runners = {}
+        self._last_batch_runner = None
+        self._tokenizer = None
+
+        # the instrumentation hooks run around each sentence, batch
+        # and file call of the models (a new registry by default;
+        # pass one in to share it between several ZPar objects)
+        self.hooks = hooks if hooks is not None else Hooks()
+
+        # the settings and state for the async methods
+        self.async_processes = 1
+        self.async_max_batch_size = 64
+        self.async_max_delay = 0.002
+        self._async_executor = None
+        self._coalescers = {}
 
     def close(self):
 
-        # unload the models on the C++ side
-        _unload_models = self.libptr.unload_models
-        _unload_models.restype = None
-        _unload_models.argtypes = [c.c_void_p]
+        # closing twice is harmless
+        if self.libptr is None:
+            return
+
+        # wait for any pending async batches to finish
+        if self._async_executor is not None:
+            self._async_executor.shutdown(wait=True)
+        self._async_executor = None
+        self._coalescers = {}
+
+        # shut down any worker processes
+        for runner in self._batch_runners.values():
+            runner.close()
+        self._batch_runners = {}
+        self._last_batch_runner = None
+
+        # unload the models and free the session on the C++ side
         self.libptr.unload_models(self._zpar_session_obj)
 
         # clean up the data structures on the python side
@@ -55,16 +182,28 @@ class ZPar(object):
         if self.depparser:
             self.depparser.cleanup()
 
+        if self._tokenizer:
+            self._tokenizer.cleanup()
+        self._tokenizer = None
+
+        # free the sessions for the other beam widths
+        for libptr, zpar_session_obj in self._beam_variants.values():
+            libptr.unload_models(zpar_session_obj)
+            if self.private_library:
+                _ctypes.dlclose(libptr._handle)
+        self._beam_variants = {}
+
         # set all the fields to none to enable clean reuse
         self.tagger = None
         self.parser = None
         self.depparser = None
         self.modelpath = None
 
-        # clean up the CDLL object too so that upon reuse, we get a new one
-        _ctypes.dlclose(self.libptr._handle)
-        # pretty sure once the old object libptr was pointed to should
-        # get garbage collected at some point after this
+        # the shared library itself stays loaded so that the next
+        # ZPar object only needs to create a new session in it, but
+        # nothing else can use a private copy, so that is closed
+        if self.private_library:
+            _ctypes.dlclose(self.libptr._handle)
         self.libptr = None
         self._zpar_session_obj = None
 
@@ -76,27 +215,316 @@ class ZPar(object):
         """Clean up when done"""
         self.close()
 
-    def get_tagger(self):
+    def _get_session(self, beam=None):
+        """
+        Return the library and the session to load a model into for
+        the given beam width; models with the beam width of this ZPar
+        object share its own session, while each other beam width gets
+        its own copy of the library, loaded the first time it is used.
+        """
+        if beam is None or beam == self.beam:
+            return self.libptr, self._zpar_session_obj
+        if beam not in self._beam_variants:
+            self._beam_variants[beam] = _load_library(beam, private=self.private_library)
+        return self._beam_variants[beam]
+
+    def get_tagger(self, beam=None):
         if not self.libptr:
             raise Exception('Cannot get tagger from uninitialized ZPar environment.')
             return None
         else:
-            self.tagger = Tagger(self.modelpath, self.libptr, self._zpar_session_obj)
+            libptr, zpar_session_obj = self._get_session(beam)
+            self.tagger = Tagger(self.modelpath, libptr, zpar_session_obj,
+                                 zpar_obj=self, beam=beam or self.beam)
             return self.tagger
 
-    def get_parser(self):
+    def get_parser(self, beam=None):
         if not self.libptr:
             raise Exception('Cannot get parser from uninitialized ZPar environment.')
             return None
         else:
-            self.parser = Parser(self.modelpath, self.libptr, self._zpar_session_obj)
+            libptr, zpar_session_obj = self._get_session(beam)
+            self.parser = Parser(self.modelpath, libptr, zpar_session_obj,
+                                 zpar_obj=self, beam=beam or self.beam)
             return self.parser
 
-    def get_depparser(self):
+    def get_depparser(self, lemma_table=None, beam=None):
         if not self.libptr:
             raise Exception('Cannot get parser from uninitialized ZPar environment.')
             return None
         else:
-            self.depparser = DepParser(self.modelpath, self.libptr, self._zpar_session_obj)
+            libptr, zpar_session_obj = self._get_session(beam)
+            self.depparser = DepParser(self.modelpath, libptr, zpar_session_obj,
+                                       lemma_table=lemma_table, zpar_obj=self,
+                                       beam=beam or self.beam)
             return self.depparser
 
+    def _get_tokenizer(self):
+        if not self.libptr:
+            raise Exception('Cannot tokenize with uninitialized ZPar environment.')
+        if self._tokenizer is None:
+            from .tokenizer import Tokenizer
+            try:
+                self._tokenizer = Tokenizer(self.libptr, hooks=self.hooks)
+            except AttributeError:
+                raise Exception('The zpar library was built without the tokenizer '
+                                'functions; rebuild it to use them.')
+        return self._tokenizer
+
+    def tokenize(self, sentence):
+        """
+        Return the list of tokens in the given sentence as tokenized by
+        ZPar, which needs no models. The tokens can be decoded without
+        tokenizing them again with, e.g.,
+        ``tagger.tag_sentence(' '.join(tokens), tokenize=False)``.
+        """
+        return self._get_tokenizer().tokenize(sentence)
+
+    def tokenize_batch(self, sentences, threads=1):
+        """
+        Return the list of tokens for each of the given sentences,
+        tokenizing them in the given number of threads.
+        """
+        return self._get_tokenizer().tokenize_batch(sentences, threads=threads)
+
+    def tokenize_file(self, inputfile, outputfile):
+        """
+        Tokenize the sentences in the given input file, one per line,
+        and write them to the given output file with the tokens
+        separated by spaces.
+        """
+        self._get_tokenizer().tokenize_file(inputfile, outputfile)
+
+
+    def _get_batch_runner(self, processes, policy='longest-first'):
+        if (processes, policy) not in self._batch_runners:
+            from .batch import BatchRunner
+            self._batch_runners[(processes, policy)] = BatchRunner(self,
+                                                                   processes=processes,
+                                                                   policy=policy)
+        self._last_batch_runner = self._batch_runners[(processes, policy)]
+        return self._last_batch_runner
+
+    def configure_async(self, processes=1, max_batch_size=64, max_delay=0.002):
+        """
+        Set how the async methods of the models decode the sentences
+        that are awaited concurrently: they are collected for up to
+        ``max_delay`` seconds or until ``max_batch_size`` of them are
+        pending and then decoded as one batch using the given number
+        of worker processes. Only affects batches that have not been
+        created yet, so call this before using any async method.
+        """
+        self.async_processes = processes
+        self.async_max_batch_size = max_batch_size
+        self.async_max_delay = max_delay
+        self._coalescers = {}
+
+    def _get_coalescer(self, model_name, method_name):
+        if not self.libptr:
+            raise Exception('Cannot use async methods with uninitialized ZPar environment.')
+
+        # all batches for all models are decoded on a single
+        # thread since the models share the one session object
+        if self._async_executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            self._async_executor = ThreadPoolExecutor(max_workers=1)
+
+        if (model_name, method_name) not in self._coalescers:
+            from .aio import BatchCoalescer
+            from .batch import BatchRunner
+            runner_key = ('async', self.async_processes)
+            if runner_key not in self._batch_runners:
+                self._batch_runners[runner_key] = BatchRunner(self,
+                                                              processes=self.async_processes)
+            runner = self._batch_runners[runner_key]
+            self._coalescers[(model_name, method_name)] = BatchCoalescer(runner,
+                                                                         self._async_executor,
+                                                                         model_name,
+                                                                         method_name,
+                                                                         max_batch_size=self.async_max_batch_size,
+                                                                         max_delay=self.async_max_delay)
+        return self._coalescers[(model_name, method_name)]
+
+    @property
+    def batch_stats(self):
+        """
+        The scheduling policy, timings and per-worker utilization
+        of the most recent batch of sentences.
+        """
+        return self._last_batch_runner.stats if self._last_batch_runner else {}
+
+    def analyze_document(self,
+                         text,
+                         model='depparser',
+                         processes=1,
+                         policy='longest-first',
+                         **kwargs):
+        """
+        Split the given text into sentences and analyze all of them
+        with the given model ('tagger', 'parser' or 'depparser') as
+        one batch, using the given number of worker processes and
+        scheduling policy ('longest-first' or 'in-order'). Any
+        other keyword arguments (e.g., ``with_lemmas``) are passed to
+        the model's sentence method. Returns a list of
+        ``AnalyzedSentence`` tuples containing the character offsets
+        of each sentence and of each of its tokens in the text.
+        """
+        from .document import analyze_spans, segment_sentences
+        spans = segment_sentences(text)
+        return analyze_spans(self._get_batch_runner(processes, policy),
+                             model, text, spans, **kwargs)
+
+    def document_session(self, model='depparser', processes=1, **kwargs):
+        """
+        Return a ``DocumentSession`` that analyzes successive versions
+        of an edited document with the given model, only sending the
+        sentences that are new or have changed to ZPar.
+        """
+        from .incremental import DocumentSession
+        return DocumentSession(self._get_batch_runner(processes),
+                               model=model, **kwargs)
+
+    def analyze_document_file(self,
+                              inputfile,
+                              outputfile,
+                              model='depparser',
+                              processes=1,
+                              offsetsfile=None,
+                              output_format='text',
+                              **kwargs):
+        """
+        Analyze the document in the given input file like
+        ``analyze_document()`` and write the analyses to the given
+        output file, either in the same text format as the model's
+        file methods or in a structured output format ('jsonl',
+        'arrow' or 'parquet') with the character offsets of each
+        sentence included. If an offsets file is given, the start and
+        end character offsets of each sentence are also written to
+        it, one per line.
+        """
+        from .formats import analysis_record, check_output_format, write_records
+        check_output_format(output_format)
+        if not os.path.exists(inputfile):
+            raise OSError('File {} does not exist.'.format(inputfile))
+
+        with open(inputfile, 'r', encoding='utf-8') as inputf:
+            text = inputf.read()
+
+        analyzed_sentences = self.analyze_document(text,
+                                                   model=model,
+                                                   processes=processes,
+                                                   **kwargs)
+
+        if output_format != 'text':
+            with_lemmas = kwargs.get('with_lemmas', False) and model == 'depparser'
+            records = []
+            for analyzed_sentence in analyzed_sentences:
+                record = analysis_record(model, analyzed_sentence.analysis, with_lemmas)
+                record['start'] = analyzed_sentence.start
+                record['end'] = analyzed_sentence.end
+                records.append(record)
+            write_records(records, outputfile, output_format, model,
+                          with_lemmas=with_lemmas, extra_fields=['start', 'end'])
+        else:
+            with open(outputfile, 'w', encoding='utf-8') as outf:
+                for analyzed_sentence in analyzed_sentences:
+                    outf.write(analyzed_sentence.analysis + '\n')
+
+        if offsetsfile:
+            with open(offsetsfile, 'w', encoding='utf-8') as offsetsf:
+                for analyzed_sentence in analyzed_sentences:
+                    offsetsf.write(u'{}\t{}\n'.format(analyzed_sentence.start,
+                                                       analyzed_sentence.end))
+
+    def process_file(self,
+                     inputfile,
+                     outputfile,
+                     model='depparser',
+                     tagged=False,
+                     processes=1,
+                     checkpoint_file=None,
+                     chunk_size=1000,
+                     progress=None,
+                     **kwargs):
+        """
+        Run the file method of the given model ('tagger', 'parser' or
+        'depparser'; the ``tagged`` variant for already tagged input)
+        over the given input file, ``chunk_size`` sentences at a time,
+        using the given number of worker processes. After each chunk,
+        the output file is synced to disk and the input offset, the
+        output offset and the number of sentences done so far are
+        recorded in the checkpoint file (the output file path plus
+        ``.ckpt`` by default). If that checkpoint file already exists,
+        the output is truncated to it and the run picks up from there.
+        Progress and the estimated time left are logged and passed to
+        the ``progress`` callback, if given. Any other keyword arguments
+        (e.g., ``tokenize`` or ``with_lemmas``) are passed to the file
+        method. Returns the number of sentences in the input file.
+        """
+        from .checkpoint import FILE_METHODS, CheckpointedRun
+        if (model, tagged) not in FILE_METHODS:
+            raise ValueError('Unknown model {} for {} input. Choices are: "tagger", '
+                             '"parser", and "depparser" (only the parsers for tagged '
+                             'input).'.format(model, 'tagged' if tagged else 'untagged'))
+        if not os.path.exists(inputfile):
+            raise OSError('File {} does not exist.'.format(inputfile))
+
+        run = CheckpointedRun(self,
+                              model,
+                              FILE_METHODS[(model, tagged)],
+                              inputfile,
+                              outputfile,
+                              checkpoint_file=checkpoint_file,
+                              chunk_size=chunk_size,
+                              processes=processes,
+                              progress=progress)
+        return run.run(**kwargs)
+
+    def process_files(self,
+                      files,
+                      model='depparser',
+                      tagged=False,
+                      processes=1,
+                      output_dir=None,
+                      output_suffix=None,
+                      batch_bytes=1 << 20,
+                      output_format='text',
+                      **kwargs):
+        """
+        Run the file method of the given model ('tagger', 'parser' or
+        'depparser'; the ``tagged`` variant for already tagged input)
+        over many input files at once. The files can be given as a list
+        of (input, output) pairs, a directory or a glob pattern; for the
+        latter two, the output files are named after the input files
+        with the given suffix (``.tag``, ``.parse`` or ``.dep`` by
+        default) and written to the given output directory (next to the
+        input files by default). The files are packed into batches of
+        about ``batch_bytes`` bytes that are each processed with a single
+        call to the file method, optionally in several worker processes,
+        with only one input or output file open at a time. Any other
+        keyword arguments are passed to the file method. Returns a list
+        of ``FileResult`` tuples with the status ('ok' or 'error'), the
+        number of sentences, the time taken and any error for each file.
+        """
+        from .checkpoint import FILE_METHODS
+        from .formats import check_output_format
+        from .multifile import OUTPUT_SUFFIXES, expand_files, process_files
+        check_output_format(output_format)
+        if (model, tagged) not in FILE_METHODS:
+            raise ValueError('Unknown model {} for {} input. Choices are: "tagger", '
+                             '"parser", and "depparser" (only the parsers for tagged '
+                             'input).'.format(model, 'tagged' if tagged else 'untagged'))
+
+        pairs = expand_files(files,
+                             output_dir=output_dir,
+                             output_suffix=output_suffix or OUTPUT_SUFFIXES[model])
+        if output_dir and not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+        return process_files(self,
+                             model,
+                             FILE_METHODS[(model, tagged)],
+                             pairs,
+                             processes=processes,
+                             batch_bytes=batch_bytes,
+                             output_format=output_format,
+                             **kwargs)
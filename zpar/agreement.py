@@ -0,0 +1,53 @@
+# License: MIT
+'''
+Measure how closely the output of one model (e.g., a pruned model or
+one decoded with a smaller beam) agrees with a reference output for
+the same sentences, for when there are no gold annotations at hand.
+
+:author: Nitin Madnani (nmadnani@ets.org)
+:organization: ETS
+'''
+
+
+def _tags(tagged_sentence):
+    return [token.rsplit('/', 1)[-1] for token in tagged_sentence.split()]
+
+
+def _dependencies(dep_parse):
+    return [line.split('\t') for line in dep_parse.splitlines() if line.strip()]
+
+
+def agreement(model_name, outputs, reference):
+    """
+    Return a dictionary with the agreement of the given outputs of the
+    given model with the given reference outputs: the fraction of tokens
+    with the same tag for the tagger, the fraction of identical trees for
+    the parser and the fraction of tokens with the same head (``heads``)
+    and with the same head and label (``labels``) for the dependency
+    parser.
+    """
+    if model_name == 'tagger':
+        same = total = 0
+        for output, ref in zip(outputs, reference):
+            ref_tags = _tags(ref)
+            same += sum(tag == ref_tag for tag, ref_tag in zip(_tags(output), ref_tags))
+            total += len(ref_tags)
+        return {'tags': float(same) / total if total else 1.0}
+    elif model_name == 'parser':
+        same = sum(output == ref for output, ref in zip(outputs, reference))
+        return {'trees': float(same) / len(reference) if reference else 1.0}
+    else:
+        heads = labels = total = 0
+        for output, ref in zip(outputs, reference):
+            ref_rows = _dependencies(ref)
+            for row, ref_row in zip(_dependencies(output), ref_rows):
+                if row[2] == ref_row[2]:
+                    heads += 1
+                    labels += row[3] == ref_row[3]
+            total += len(ref_rows)
+        return {'heads': float(heads) / total if total else 1.0,
+                'labels': float(labels) / total if total else 1.0}
+
+
+def format_agreement(scores):
+    return ', '.join('{} {:.1%}'.format(name, scores[name]) for name in sorted(scores))
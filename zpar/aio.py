@@ -0,0 +1,121 @@
+# License: MIT
+'''
+Support for the asyncio versions of the sentence methods. Concurrent
+requests for the same model method are collected on the event loop
+and decoded together as one batch on the executor thread of the
+ZPar session, so that awaiting them does not block the event loop.
+
+:author: Nitin Madnani (nmadnani@ets.org)
+:organization: ETS
+'''
+
+import asyncio
+
+from collections import OrderedDict
+from functools import partial
+
+
+class BatchCoalescer(object):
+    """
+    Collects the sentences submitted for one model method on the
+    event loop until either ``max_batch_size`` of them are pending
+    or ``max_delay`` seconds have passed since the first of them,
+    and then decodes them as one batch (one per distinct set of
+    keyword arguments) with the given batch runner on the given
+    executor. Sentences whose futures were cancelled before their
+    batch started are skipped, and a batch whose futures were all
+    cancelled before it started is cancelled too.
+    """
+
+    def __init__(self,
+                 runner,
+                 executor,
+                 model_name,
+                 method_name,
+                 max_batch_size=64,
+                 max_delay=0.002):
+        super(BatchCoalescer, self).__init__()
+
+        self.runner = runner
+        self.executor = executor
+        self.model_name = model_name
+        self.method_name = method_name
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+
+        self._loop = None
+        self._pending = []
+        self._timer = None
+
+    def submit(self, sentence, **kwargs):
+        """
+        Return a future for the output of the
+        method for the given sentence.
+        """
+        self._loop = asyncio.get_event_loop()
+        future = self._loop.create_future()
+        self._pending.append((sentence, kwargs, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = self._loop.call_later(self.max_delay, self._flush)
+        return future
+
+    def submit_batch(self, sentences, **kwargs):
+        """
+        Return a future for the list of outputs of the method for
+        the given sentences; cancelling it cancels all of them.
+        """
+        return asyncio.gather(*[self.submit(sentence, **kwargs)
+                                for sentence in sentences])
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending = self._pending, []
+
+        # group the sentences that are still wanted by
+        # the keyword arguments that they were submitted with
+        batches = OrderedDict()
+        for sentence, kwargs, future in pending:
+            if not future.cancelled():
+                key = tuple(sorted(kwargs.items()))
+                batches.setdefault(key, []).append((sentence, future))
+
+        for key, items in batches.items():
+            batch_future = self._loop.run_in_executor(self.executor,
+                                                      partial(self._run_batch, items, dict(key)))
+            batch_future.add_done_callback(partial(self._deliver, items))
+            for sentence, future in items:
+                future.add_done_callback(partial(self._cancel_batch_if_unwanted,
+                                                 items, batch_future))
+
+    def _run_batch(self, items, kwargs):
+        # this runs on the executor thread, so we
+        # check once more for any cancelled futures
+        items = [(sentence, future) for sentence, future in items
+                 if not future.cancelled()]
+        outputs = self.runner.run(self.model_name,
+                                  self.method_name,
+                                  [sentence for sentence, future in items],
+                                  **kwargs)
+        return [(future, output) for (sentence, future), output in zip(items, outputs)]
+
+    def _deliver(self, items, batch_future):
+        if batch_future.cancelled():
+            for sentence, future in items:
+                if not future.done():
+                    future.cancel()
+        elif batch_future.exception() is not None:
+            for sentence, future in items:
+                if not future.done():
+                    future.set_exception(batch_future.exception())
+        else:
+            for future, output in batch_future.result():
+                if not future.done():
+                    future.set_result(output)
+
+    def _cancel_batch_if_unwanted(self, items, batch_future, future):
+        if all(item_future.cancelled() for sentence, item_future in items):
+            batch_future.cancel()
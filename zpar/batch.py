@@ -0,0 +1,208 @@
+# License: MIT
+'''
+Decode batches of sentences with one of the ZPar models, either in
+the current process or spread over several worker processes that
+each have their own ZPar session.
+
+:author: Nitin Madnani (nmadnani@ets.org)
+:organization: ETS
+'''
+
+import os
+import time
+
+# the ZPar method used to get each of the models
+_MODEL_GETTERS = {'tagger': 'get_tagger',
+                  'parser': 'get_parser',
+                  'depparser': 'get_depparser'}
+
+# the ZPar object that forked worker processes inherit from
+# the parent process so that they can reuse its loaded models
+_inherited_zpar = None
+
+# the ZPar object used by each worker process
+_worker_zpar = None
+
+
+def get_model(z, model_name):
+    """
+    Return the given model ('tagger', 'parser' or 'depparser')
+    of the given ZPar object, loading it first if needed.
+    """
+    if model_name not in _MODEL_GETTERS:
+        raise ValueError('Unknown model {}. Choices are: "tagger", "parser", '
+                         'and "depparser".'.format(model_name))
+    model = getattr(z, model_name)
+    if model is None:
+        model = getattr(z, _MODEL_GETTERS[model_name])()
+    return model
+
+
+def decode_sentences(model, method_name, sentences, **kwargs):
+    method = getattr(model, method_name)
+    return [method(sentence, **kwargs) for sentence in sentences]
+
+
+def _init_worker(modelpath, beam=None):
+    global _worker_zpar
+    if _inherited_zpar is not None:
+        _worker_zpar = _inherited_zpar
+    else:
+        from . import ZPar
+        _worker_zpar = ZPar(modelpath, beam=beam)
+
+
+def _decode_chunk(args):
+    model_name, method_name, indices, sentences, kwargs = args
+    start_time = time.time()
+    model = get_model(_worker_zpar, model_name)
+    outputs = decode_sentences(model, method_name, sentences, **kwargs)
+    return os.getpid(), time.time() - start_time, indices, outputs
+
+
+def estimate_cost(sentence, exponent=2):
+    """
+    Estimate the relative cost of decoding the given sentence from
+    its number of tokens, since beam-search decoding gets more
+    expensive much faster than the sentence gets longer.
+    """
+    return max(1, len(sentence.split())) ** exponent
+
+
+def schedule_chunks(sentences,
+                    processes,
+                    policy='longest-first',
+                    chunk_size=16,
+                    chunks_per_process=4):
+    """
+    Split the indices of the given sentences into chunks for the
+    given number of worker processes. With the 'in-order' policy,
+    the chunks are consecutive runs of ``chunk_size`` sentences.
+    With the 'longest-first' policy, the sentences are sorted by
+    their estimated cost, most expensive first, and grouped into
+    chunks of roughly equal cost (and at most ``chunk_size``
+    sentences) so that there are about ``chunks_per_process`` chunks
+    for each process; the workers then keep taking the next chunk
+    as soon as they are done with one so that no one worker is left
+    with a cluster of long sentences at the end.
+    """
+    if policy == 'in-order':
+        return [list(range(i, min(i + chunk_size, len(sentences))))
+                for i in range(0, len(sentences), chunk_size)]
+    elif policy != 'longest-first':
+        raise ValueError('Unknown scheduling policy {}. Choices are: '
+                         '"longest-first" and "in-order".'.format(policy))
+
+    costs = [estimate_cost(sentence) for sentence in sentences]
+    target_cost = float(sum(costs)) / max(1, processes * chunks_per_process)
+    chunks = []
+    chunk = []
+    chunk_cost = 0
+    for index in sorted(range(len(sentences)), key=lambda i: -costs[i]):
+        chunk.append(index)
+        chunk_cost += costs[index]
+        if chunk_cost >= target_cost or len(chunk) >= chunk_size:
+            chunks.append(chunk)
+            chunk = []
+            chunk_cost = 0
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+class BatchRunner(object):
+    """
+    Runs a model method over a list of sentences and returns the
+    outputs in the same order. With more than one process, the
+    sentences are split into chunks by :func:`schedule_chunks` that
+    are decoded in a pool of worker processes; on platforms that
+    fork, the workers share the models that are already loaded in
+    the given ZPar object and otherwise each of them loads its own.
+    After each run, ``stats`` holds the scheduling policy that was
+    used along with how busy each worker process was.
+    """
+
+    def __init__(self, z, processes=1, chunk_size=16, policy='longest-first'):
+        super(BatchRunner, self).__init__()
+
+        self.z = z
+        self.processes = processes
+        self.chunk_size = chunk_size
+        self.policy = policy
+        self.stats = {}
+        self._pool = None
+
+    def _get_pool(self):
+        global _inherited_zpar
+        if self._pool is None:
+            # multiprocessing is slow to import and only
+            # needed once there are worker processes
+            import multiprocessing
+            _inherited_zpar = self.z
+            try:
+                self._pool = multiprocessing.Pool(self.processes,
+                                                  initializer=_init_worker,
+                                                  initargs=(self.z.modelpath,
+                                                            getattr(self.z, 'beam', None)))
+            finally:
+                _inherited_zpar = None
+        return self._pool
+
+    def run(self, model_name, method_name, sentences, **kwargs):
+        hooks = getattr(self.z, 'hooks', None)
+        if not hooks:
+            return self._run(model_name, method_name, sentences, **kwargs)
+        with hooks.call('batch', model_name, method_name, obj=self,
+                        num_sentences=len(sentences),
+                        num_tokens=sum(len(sentence.split()) for sentence in sentences)):
+            return self._run(model_name, method_name, sentences, **kwargs)
+
+    def _run(self, model_name, method_name, sentences, **kwargs):
+        start_time = time.time()
+
+        if self.processes <= 1 or len(sentences) <= self.chunk_size:
+            model = get_model(self.z, model_name)
+            outputs = decode_sentences(model, method_name, sentences, **kwargs)
+            wall_time = time.time() - start_time
+            self.stats = {'policy': 'in-process',
+                          'num_sentences': len(sentences),
+                          'num_chunks': 1,
+                          'wall_time': wall_time,
+                          'worker_busy_time': {os.getpid(): wall_time},
+                          'worker_utilization': {os.getpid(): 1.0}}
+            return outputs
+
+        chunks = schedule_chunks(sentences,
+                                 self.processes,
+                                 policy=self.policy,
+                                 chunk_size=self.chunk_size)
+        tasks = [(model_name,
+                  method_name,
+                  indices,
+                  [sentences[i] for i in indices],
+                  kwargs) for indices in chunks]
+
+        # the chunks are handed out one at a time to whichever
+        # worker is free and put back in input order as they come in
+        outputs = [None] * len(sentences)
+        worker_busy_time = {}
+        for pid, busy_time, indices, chunk_outputs in self._get_pool().imap_unordered(_decode_chunk, tasks):
+            for index, output in zip(indices, chunk_outputs):
+                outputs[index] = output
+            worker_busy_time[pid] = worker_busy_time.get(pid, 0) + busy_time
+
+        wall_time = time.time() - start_time
+        self.stats = {'policy': self.policy,
+                      'num_sentences': len(sentences),
+                      'num_chunks': len(chunks),
+                      'wall_time': wall_time,
+                      'worker_busy_time': worker_busy_time,
+                      'worker_utilization': dict((pid, busy_time / wall_time if wall_time else 0.0)
+                                                 for pid, busy_time in worker_busy_time.items())}
+        return outputs
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
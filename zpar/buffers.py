@@ -0,0 +1,91 @@
+# License: MIT
+'''
+A reusable output buffer for the ``*_into`` sentence functions of the
+zpar library, which write their output straight into memory owned by
+Python and return its length instead of returning a pointer to a
+freshly allocated copy that ctypes then has to copy again.
+
+:author: Nitin Madnani (nmadnani@ets.org)
+:organization: ETS
+'''
+
+import codecs
+import ctypes as c
+
+# the size of a new output buffer, which is plenty
+# for the output of most sentences
+_INITIAL_SIZE = 1 << 14
+
+
+class OutputBuffer(object):
+    """
+    A growable ``bytearray`` that the sentence functions of the given
+    library write their output into for the given session. When the
+    output of a sentence does not fit, the buffer is grown to at least
+    twice its size and the output is copied into it from the session
+    without decoding the sentence again.
+    """
+
+    def __init__(self, libptr, zpar_session_obj, size=_INITIAL_SIZE):
+        super(OutputBuffer, self).__init__()
+
+        self._zpar_session_obj = zpar_session_obj
+
+        # get the library method that copies the last output again
+        self._copy_output = libptr.copy_output
+        self._copy_output.restype = c.c_long
+        self._copy_output.argtypes = [c.c_void_p, c.c_void_p, c.c_long]
+
+        self._allocate(size)
+
+    @classmethod
+    def for_library(cls, libptr, zpar_session_obj):
+        """
+        Return an output buffer for the given library, or ``None``
+        if it was built before the ``*_into`` functions existed.
+        """
+        try:
+            libptr.copy_output
+        except AttributeError:
+            return None
+        return cls(libptr, zpar_session_obj)
+
+    def _allocate(self, size):
+        # the ctypes array shares the memory of the bytearray,
+        # so the library writes directly into the bytearray
+        self.buffer = bytearray(size)
+        self._memory = memoryview(self.buffer)
+        self._view = (c.c_char * size).from_buffer(self.buffer)
+        self._address = c.addressof(self._view)
+        self._size = size
+
+    @staticmethod
+    def set_argtypes(function, argtypes):
+        """
+        Set up the given ``*_into`` library function, which takes the
+        given arguments followed by the buffer and its size.
+        """
+        function.restype = c.c_long
+        function.argtypes = list(argtypes) + [c.c_void_p, c.c_long]
+        return function
+
+    def call(self, function, sentence, option):
+        """
+        Call the given ``*_into`` library function for the given encoded
+        sentence and option (``tokenize`` or the tag separator) and
+        return its output decoded from the buffer.
+        """
+        length = function(self._zpar_session_obj, sentence, option, self._address, self._size)
+        if length > self._size:
+            self._allocate(max(length, 2 * self._size))
+            self._copy_output(self._zpar_session_obj, self._address, self._size)
+        # decoding a slice of the memoryview does not copy the bytes
+        return codecs.decode(self._memory[:length], 'utf-8')
+
+    def release(self):
+        self._view = None
+        self._address = None
+        self._memory = None
+        self.buffer = None
+        self._copy_output = None
+        self._zpar_session_obj = None
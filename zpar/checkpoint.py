@@ -0,0 +1,234 @@
+# License: MIT
+'''
+Checkpointed runs of the file methods over large input files. The
+input is processed a chunk of sentences at a time, either in the
+current process or in a pool of worker processes, and after each
+chunk the output is synced to disk along with a small checkpoint
+file recording how far the run has gotten, so that a run that dies
+can pick up from the last checkpoint instead of starting over.
+
+:author: Nitin Madnani (nmadnani@ets.org)
+:organization: ETS
+'''
+
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+from . import batch
+from .sentence_index import _open_mmap, _skip_lines
+
+# the file method of each model for untagged and tagged input
+FILE_METHODS = {('tagger', False): 'tag_file',
+                ('parser', False): 'parse_file',
+                ('parser', True): 'parse_tagged_file',
+                ('depparser', False): 'dep_parse_file',
+                ('depparser', True): 'dep_parse_tagged_file'}
+
+# the extension of the checkpoint file used by default for an output file
+CHECKPOINT_SUFFIX = '.ckpt'
+
+
+def _format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return '{}:{:02d}:{:02d}'.format(hours, minutes, seconds)
+
+
+def _process_chunk(z, model_name, method_name, inputfile, start_byte, end_byte,
+                   chunk_dir, kwargs):
+    """
+    Run the given file method over the given byte range of the input
+    file and return the path of the output for the range along with
+    the number of sentences in it.
+    """
+    chunk_input = os.path.join(chunk_dir, '{}.input'.format(start_byte))
+    chunk_output = os.path.join(chunk_dir, '{}.output'.format(start_byte))
+    fileobj, buf = _open_mmap(inputfile)
+    try:
+        data = buf[start_byte:end_byte]
+    finally:
+        if buf:
+            buf.close()
+        fileobj.close()
+    with open(chunk_input, 'wb') as chunkf:
+        chunkf.write(data)
+
+    model = batch.get_model(z, model_name)
+    getattr(model, method_name)(chunk_input, chunk_output, **kwargs)
+    os.unlink(chunk_input)
+
+    num_sentences = data.count(b'\n') + (1 if data and not data.endswith(b'\n') else 0)
+    return start_byte, end_byte, num_sentences, chunk_output
+
+
+def _process_chunk_in_worker(args):
+    return _process_chunk(batch._worker_zpar, *args)
+
+
+def read_checkpoint(checkpoint_file):
+    with open(checkpoint_file, 'r') as checkpointf:
+        return json.load(checkpointf)
+
+
+def write_checkpoint(checkpoint_file, checkpoint):
+    """
+    Write the given checkpoint to a temporary file, sync it to disk
+    and then move it into place, so that the checkpoint file always
+    holds either the previous or the new checkpoint.
+    """
+    tmpfile = checkpoint_file + '.tmp'
+    with open(tmpfile, 'w') as checkpointf:
+        json.dump(checkpoint, checkpointf)
+        checkpointf.flush()
+        os.fsync(checkpointf.fileno())
+    os.rename(tmpfile, checkpoint_file)
+
+
+class CheckpointedRun(object):
+    """
+    Runs one of the file methods of a model over an input file with
+    checkpoints every ``chunk_size`` sentences. If the checkpoint file
+    (the output file path plus ``.ckpt`` by default) already exists,
+    the output file is truncated to the last checkpoint and the run
+    continues from there. The checkpoint file is removed once the
+    whole input has been processed. Progress along with an estimate
+    of the time left is logged after each checkpoint and passed to
+    the ``progress`` callback, if one is given.
+    """
+
+    def __init__(self,
+                 z,
+                 model_name,
+                 method_name,
+                 inputfile,
+                 outputfile,
+                 checkpoint_file=None,
+                 chunk_size=1000,
+                 processes=1,
+                 progress=None):
+        super(CheckpointedRun, self).__init__()
+
+        self.z = z
+        self.model_name = model_name
+        self.method_name = method_name
+        self.inputfile = inputfile
+        self.outputfile = outputfile
+        self.checkpoint_file = checkpoint_file or outputfile + CHECKPOINT_SUFFIX
+        self.chunk_size = chunk_size
+        self.processes = processes
+        self.progress = progress
+        self.logger = logging.getLogger(__name__)
+
+    def _start(self):
+        """
+        Return the checkpoint to start from, truncating the
+        output file to it if we are resuming a run.
+        """
+        stat = os.stat(self.inputfile)
+        checkpoint = {'inputfile': os.path.abspath(self.inputfile),
+                      'input_size': stat.st_size,
+                      'input_mtime': stat.st_mtime,
+                      'method': self.method_name,
+                      'input_offset': 0,
+                      'output_offset': 0,
+                      'num_sentences': 0}
+
+        if not os.path.exists(self.checkpoint_file):
+            open(self.outputfile, 'wb').close()
+            return checkpoint
+
+        previous = read_checkpoint(self.checkpoint_file)
+        for key in ['input_size', 'input_mtime', 'method']:
+            if previous[key] != checkpoint[key]:
+                raise ValueError('Checkpoint {} is for a different input file or '
+                                 'method; delete it to start over.'.format(self.checkpoint_file))
+        if (not os.path.exists(self.outputfile) or
+                os.path.getsize(self.outputfile) < previous['output_offset']):
+            raise ValueError('Output file {} is shorter than its checkpoint {}; '
+                             'delete the checkpoint to start over.'.format(self.outputfile,
+                                                                           self.checkpoint_file))
+        with open(self.outputfile, 'r+b') as outputf:
+            outputf.truncate(previous['output_offset'])
+        self.logger.info('Resuming from sentence {} of {}'.format(previous['num_sentences'],
+                                                                  self.inputfile))
+        return previous
+
+    def _chunk_ranges(self, start_offset):
+        fileobj, buf = _open_mmap(self.inputfile)
+        try:
+            pos = start_offset
+            while pos < len(buf):
+                end = _skip_lines(buf, pos, self.chunk_size)
+                yield pos, end
+                pos = end
+        finally:
+            if buf:
+                buf.close()
+            fileobj.close()
+
+    def _report(self, checkpoint, start_time, start_offset):
+        elapsed = time.time() - start_time
+        done = checkpoint['input_offset'] - start_offset
+        remaining = checkpoint['input_size'] - checkpoint['input_offset']
+        eta = elapsed * remaining / done if done else None
+        status = {'num_sentences': checkpoint['num_sentences'],
+                  'input_offset': checkpoint['input_offset'],
+                  'input_size': checkpoint['input_size'],
+                  'fraction_done': (float(checkpoint['input_offset']) / checkpoint['input_size']
+                                    if checkpoint['input_size'] else 1.0),
+                  'elapsed': elapsed,
+                  'eta': eta}
+        self.logger.info('Processed {} sentences ({:.1%}), ETA {}'.format(status['num_sentences'],
+                                                                         status['fraction_done'],
+                                                                         _format_duration(eta) if eta is not None else 'unknown'))
+        if self.progress:
+            self.progress(status)
+
+    def run(self, **kwargs):
+        """
+        Run the file method with the given keyword arguments and
+        return the total number of sentences processed.
+        """
+        if kwargs.get('output_format', 'text') != 'text':
+            raise ValueError('Checkpointed runs only support the "text" output format.')
+
+        checkpoint = self._start()
+        start_time = time.time()
+        start_offset = checkpoint['input_offset']
+        chunk_dir = tempfile.mkdtemp(prefix='zpar_chunks',
+                                     dir=os.path.dirname(os.path.abspath(self.outputfile)))
+        tasks = ((self.model_name, self.method_name, self.inputfile,
+                  start_byte, end_byte, chunk_dir, kwargs)
+                 for start_byte, end_byte in self._chunk_ranges(start_offset))
+        try:
+            if self.processes > 1:
+                runner = self.z._get_batch_runner(self.processes)
+                results = runner._get_pool().imap(_process_chunk_in_worker, tasks)
+            else:
+                results = (_process_chunk(self.z, *task) for task in tasks)
+
+            # the chunks come back in input order, so each one is
+            # appended to the output and checkpointed as it arrives
+            with open(self.outputfile, 'ab') as outputf:
+                for start_byte, end_byte, num_sentences, chunk_output in results:
+                    with open(chunk_output, 'rb') as chunkf:
+                        shutil.copyfileobj(chunkf, outputf)
+                    os.unlink(chunk_output)
+                    outputf.flush()
+                    os.fsync(outputf.fileno())
+
+                    checkpoint['input_offset'] = end_byte
+                    checkpoint['output_offset'] = outputf.tell()
+                    checkpoint['num_sentences'] += num_sentences
+                    write_checkpoint(self.checkpoint_file, checkpoint)
+                    self._report(checkpoint, start_time, start_offset)
+        finally:
+            shutil.rmtree(chunk_dir, ignore_errors=True)
+
+        if os.path.exists(self.checkpoint_file):
+            os.unlink(self.checkpoint_file)
+        return checkpoint['num_sentences']
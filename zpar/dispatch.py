@@ -0,0 +1,543 @@
+# License: MIT
+'''
+Run one of the file methods over a corpus that is too big for one
+machine by spreading it over a set of ``zpar_server`` workers, on
+this host or on others. The files (or ranges of them) listed in a
+manifest are split into chunks of sentences that are sent to the
+workers along with the request, so the workers do not need to share
+a file system with the coordinator. Each worker starts out with its
+own run of consecutive chunks and, once it is done with them, steals
+chunks from the end of the longest remaining run. Chunks that fail
+are retried on another worker, a worker that keeps failing is
+dropped, and once there is nothing left to hand out, idle workers
+re-run chunks that have been running for much longer than usual
+and the first copy to finish wins. The outputs of the chunks are
+then put back together in order.
+
+:author: Nitin Madnani (nmadnani@ets.org)
+:organization: ETS
+'''
+
+import argparse
+import collections
+import io
+import json
+import logging
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+from six.moves import xmlrpc_client
+
+from .checkpoint import FILE_METHODS
+from .sentence_index import RANGE_UNITS, _open_mmap, _skip_lines, byte_range
+from .wire import CompactClient, CompressingTransport
+from .zpar_server import CLIENT_LIMIT_FAULT, OVERLOADED_FAULT
+
+# one file, or range of a file, to process
+ManifestEntry = collections.namedtuple('ManifestEntry',
+                                       ['input', 'output', 'start', 'end', 'unit'])
+
+
+class DispatchError(Exception):
+    pass
+
+
+def read_manifest(manifest_file):
+    """
+    Return the list of ``ManifestEntry`` tuples in the given manifest,
+    which has one JSON object per line with the ``input`` and ``output``
+    file paths and, optionally, the ``start`` and ``end`` of the range of
+    the input to process, in sentences or bytes (``unit``).
+    """
+    entries = []
+    with io.open(manifest_file, 'r', encoding='utf-8') as manifestf:
+        for line_number, line in enumerate(manifestf, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if 'input' not in record or 'output' not in record:
+                raise ValueError('Line {} of {} needs both an "input" and an '
+                                 '"output".'.format(line_number, manifest_file))
+            unit = record.get('unit', 'sentence')
+            if unit not in RANGE_UNITS:
+                raise ValueError('Unknown range unit {}. Choices are: '
+                                 '"sentence" and "byte".'.format(unit))
+            entries.append(ManifestEntry(record['input'],
+                                         record['output'],
+                                         record.get('start'),
+                                         record.get('end'),
+                                         unit))
+    return entries
+
+
+class Chunk(object):
+    """
+    A run of consecutive sentences of one of the manifest entries.
+    ``running`` maps each worker that is processing the chunk to
+    when it started, since a straggler can be running on two.
+    """
+
+    def __init__(self, entry_index, number, start_byte, end_byte):
+        self.entry_index = entry_index
+        self.number = number
+        self.start_byte = start_byte
+        self.end_byte = end_byte
+        self.attempts = 0
+        self.running = {}
+        self.done = False
+
+    def read(self, inputfile):
+        fileobj, buf = _open_mmap(inputfile)
+        try:
+            data = buf[self.start_byte:self.end_byte]
+        finally:
+            if buf:
+                buf.close()
+            fileobj.close()
+        # ZPar needs each sentence to end in a newline
+        if data and not data.endswith(b'\n'):
+            data += b'\n'
+        return data
+
+
+def make_chunks(entries, chunk_lines=1000):
+    """
+    Split the given manifest entries into chunks of at most the
+    given number of sentences and return them in order.
+    """
+    chunks = []
+    for entry_index, entry in enumerate(entries):
+        if not os.path.isfile(entry.input):
+            raise OSError('File {} does not exist.'.format(entry.input))
+        fileobj, buf = _open_mmap(entry.input)
+        try:
+            start_byte, end_byte = byte_range(entry.input, buf, start=entry.start,
+                                              end=entry.end, unit=entry.unit)
+            number = 0
+            while start_byte < end_byte:
+                next_byte = min(_skip_lines(buf, start_byte, chunk_lines), end_byte)
+                chunks.append(Chunk(entry_index, number, start_byte, next_byte))
+                number += 1
+                start_byte = next_byte
+        finally:
+            if buf:
+                buf.close()
+            fileobj.close()
+    return chunks
+
+
+class _Worker(object):
+
+    def __init__(self, address, index):
+        self.address = address
+        self.index = index
+        self.queue = collections.deque()
+        self.alive = True
+        self.failures = 0
+        self.num_chunks = 0
+        self.busy_time = 0.0
+
+
+class Dispatcher(object):
+    """
+    Runs the file method of the given model ('tagger', 'parser' or
+    'depparser'; the ``tagged`` variant for already tagged input) over
+    the entries of a manifest using the ``zpar_server`` workers at the
+    given ``host:port`` addresses, each of which has to serve that
+    model. The extra arguments of the file method (e.g., ``tokenize``)
+    are given as ``method_args``. A chunk that fails is retried up to
+    ``max_retries`` times and a worker that fails ``max_worker_failures``
+    times in a row is dropped. Once there are no more chunks to hand
+    out, an idle worker re-runs a chunk that has been running for over
+    ``speculation_factor`` times the median chunk time (``None`` turns
+    this off). With ``compact``, the output of the tagger and the
+    dependency parser is sent back in the compact encoding of
+    :mod:`zpar.wire`. After each run, ``stats`` holds how many chunks were
+    retried, stolen and re-run along with how busy each worker was.
+    """
+
+    def __init__(self,
+                 workers,
+                 model='depparser',
+                 tagged=False,
+                 method_args=(),
+                 chunk_lines=1000,
+                 max_retries=3,
+                 max_worker_failures=3,
+                 speculation_factor=2.0,
+                 timeout=None,
+                 retry_delay=1.0,
+                 compact=False):
+        super(Dispatcher, self).__init__()
+
+        if (model, tagged) not in FILE_METHODS:
+            raise ValueError('Unknown model {} for {} input. Choices are: "tagger", '
+                             '"parser", and "depparser" (only the parsers for tagged '
+                             'input).'.format(model, 'tagged' if tagged else 'untagged'))
+        if not workers:
+            raise ValueError('At least one worker is needed.')
+
+        self.addresses = list(workers)
+        self.model = model
+        self.method_name = FILE_METHODS[(model, tagged)]
+        self.method_args = list(method_args)
+        self.chunk_lines = chunk_lines
+        self.max_retries = max_retries
+        self.max_worker_failures = max_worker_failures
+        self.speculation_factor = speculation_factor
+        self.timeout = timeout
+        self.retry_delay = retry_delay
+        self.compact = compact
+        self.stats = {}
+
+        # set up a logger
+        self.logger = logging.getLogger(__name__)
+
+    def _proxy(self, worker):
+        proxy = xmlrpc_client.ServerProxy('http://{}'.format(worker.address),
+                                          transport=CompressingTransport(timeout=self.timeout),
+                                          allow_none=True)
+        return CompactClient(proxy) if self.compact else proxy
+
+    def _chunk_path(self, chunk):
+        return os.path.join(self._chunk_dir, '{}-{}.output'.format(chunk.entry_index,
+                                                                    chunk.number))
+
+    def _straggler(self, worker):
+        # the chunk that has been running the longest for over
+        # the speculation threshold and is not yet being re-run
+        if self.speculation_factor is None or not self._durations:
+            return None
+        durations = sorted(self._durations)
+        threshold = self.speculation_factor * durations[len(durations) // 2]
+        now = time.time()
+        candidates = [chunk for chunk in self._running
+                      if len(chunk.running) == 1 and worker.address not in chunk.running
+                      and now - min(chunk.running.values()) > threshold]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda chunk: min(chunk.running.values()))
+
+    def _next_chunk(self, worker):
+        """
+        Wait for and return the next chunk for the given worker, or
+        ``None`` if the worker should stop. Must hold the lock.
+        """
+        while True:
+            if self._finished or not self._pending or not worker.alive:
+                return None
+            if worker.queue:
+                return worker.queue.popleft()
+
+            # steal from the end of the longest run of chunks left,
+            # which includes those left behind by dropped workers
+            victim = max(self._workers, key=lambda other: len(other.queue))
+            if victim.queue:
+                self.num_stolen += 1
+                return victim.queue.pop()
+
+            chunk = self._straggler(worker)
+            if chunk is not None:
+                self.num_speculative += 1
+                self.logger.info('Re-running chunk {} of {} on {}'.format(chunk.number,
+                                                                          self._entries[chunk.entry_index].input,
+                                                                          worker.address))
+                return chunk
+
+            # check for stragglers again every so often
+            self._cond.wait(0.5)
+
+    def _requeue(self, worker, chunk):
+        # hand the chunk to the live worker with the fewest chunks
+        # left, preferring any worker other than the one it failed on
+        others = [other for other in self._workers if other.alive and other is not worker]
+        candidates = others or [other for other in self._workers if other.alive]
+        if not candidates:
+            self._error = DispatchError('All of the workers have failed.')
+            self._finished = True
+            return
+        min(candidates, key=lambda other: len(other.queue)).queue.appendleft(chunk)
+
+    def _fail(self, worker, chunk, error):
+        """
+        Record that the given chunk failed on the given worker with
+        the given error and retry it if it has any tries left. Must
+        hold the lock.
+        """
+        del chunk.running[worker.address]
+        if chunk.done:
+            return
+
+        if not isinstance(error, xmlrpc_client.Fault):
+            # the worker could not be reached or broke off
+            worker.failures += 1
+            if worker.failures >= self.max_worker_failures:
+                self.logger.warning('Dropping worker {} after {} failures in a '
+                                    'row: {}'.format(worker.address, worker.failures, error))
+                worker.alive = False
+
+        chunk.attempts += 1
+        self.num_retries += 1
+        self.logger.warning('Chunk {} of {} failed on {} (attempt {}): '
+                            '{}'.format(chunk.number, self._entries[chunk.entry_index].input,
+                                        worker.address, chunk.attempts, error))
+        if chunk.attempts > self.max_retries:
+            self._error = DispatchError('Chunk {} of {} failed {} times; the last error '
+                                        'was: {}'.format(chunk.number,
+                                                         self._entries[chunk.entry_index].input,
+                                                         chunk.attempts, error))
+            self._finished = True
+        elif not chunk.running:
+            self._running.discard(chunk)
+            self._requeue(worker, chunk)
+
+    def _complete(self, worker, chunk, outputpath, elapsed):
+        """
+        Record that the given worker finished the given chunk, whose
+        output is in the given file. Must hold the lock.
+        """
+        del chunk.running[worker.address]
+        worker.failures = 0
+        worker.num_chunks += 1
+        worker.busy_time += elapsed
+        if chunk.done:
+            # the other copy of a re-run chunk got there first
+            os.unlink(outputpath)
+            return
+        os.rename(outputpath, self._chunk_path(chunk))
+        chunk.done = True
+        self._running.discard(chunk)
+        self._durations.append(elapsed)
+        self._pending -= 1
+
+    def _work(self, worker):
+        proxy = self._proxy(worker)
+        process_chunk = getattr(proxy, 'process_chunk')
+        while True:
+            with self._cond:
+                chunk = self._next_chunk(worker)
+                if chunk is None:
+                    self._cond.notify_all()
+                    return
+                chunk.running[worker.address] = time.time()
+                self._running.add(chunk)
+
+            start_time = time.time()
+            try:
+                data = chunk.read(self._entries[chunk.entry_index].input)
+                output = process_chunk(self.method_name,
+                                       xmlrpc_client.Binary(data),
+                                       self.method_args)
+                if self.compact:
+                    output = output.encode('utf-8')
+                outputpath = '{}.{}'.format(self._chunk_path(chunk), worker.index)
+                with open(outputpath, 'wb') as outputf:
+                    outputf.write(getattr(output, 'data', output))
+            except xmlrpc_client.Fault as e:
+                if e.faultCode in [OVERLOADED_FAULT, CLIENT_LIMIT_FAULT]:
+                    # the worker is busy, so put the chunk back
+                    # at the front of its run and try again later
+                    with self._cond:
+                        del chunk.running[worker.address]
+                        if not chunk.done and not chunk.running:
+                            self._running.discard(chunk)
+                            worker.queue.appendleft(chunk)
+                        self._cond.notify_all()
+                    time.sleep(self.retry_delay)
+                    continue
+                with self._cond:
+                    self._fail(worker, chunk, e)
+                    self._cond.notify_all()
+                continue
+            except (socket.error, xmlrpc_client.ProtocolError, IOError, OSError) as e:
+                with self._cond:
+                    self._fail(worker, chunk, e)
+                    self._cond.notify_all()
+                    failures = worker.failures
+                # back off a little more after each failure in a row
+                time.sleep(self.retry_delay * 2 ** max(0, failures - 1))
+                continue
+            except Exception as e:
+                # anything else (e.g., a broken HTTP response or an
+                # output that cannot be decoded) fails just this chunk
+                with self._cond:
+                    self._fail(worker, chunk, e)
+                    self._cond.notify_all()
+                continue
+
+            with self._cond:
+                self._complete(worker, chunk, outputpath, time.time() - start_time)
+                self._cond.notify_all()
+
+    def _assemble(self):
+        # put the outputs of the chunks of each entry back together
+        for entry_index, entry in enumerate(self._entries):
+            with open(entry.output, 'wb') as outputf:
+                for chunk in self._chunks_by_entry[entry_index]:
+                    chunk_path = self._chunk_path(chunk)
+                    with open(chunk_path, 'rb') as chunkf:
+                        shutil.copyfileobj(chunkf, outputf)
+                    os.unlink(chunk_path)
+
+    def run(self, entries):
+        """
+        Process the given list of ``ManifestEntry`` tuples, writing the
+        output for each one to its output file, and return the number of
+        chunks that were processed. Raises a ``DispatchError`` if a chunk
+        fails too many times or all of the workers are dropped.
+        """
+        start_time = time.time()
+        self._entries = list(entries)
+        chunks = make_chunks(self._entries, chunk_lines=self.chunk_lines)
+        self._chunks_by_entry = [[] for _ in self._entries]
+        for chunk in chunks:
+            self._chunks_by_entry[chunk.entry_index].append(chunk)
+
+        # each worker starts with its own run of consecutive chunks
+        self._workers = [_Worker(address, index) for index, address in enumerate(self.addresses)]
+        run_length = -(-len(chunks) // len(self._workers))
+        for i, worker in enumerate(self._workers):
+            worker.queue.extend(chunks[i * run_length:(i + 1) * run_length])
+
+        self._cond = threading.Condition()
+        self._pending = len(chunks)
+        self._running = set()
+        self._durations = []
+        self._error = None
+        self._finished = False
+        self.num_retries = 0
+        self.num_stolen = 0
+        self.num_speculative = 0
+
+        # the chunk outputs are kept next to the first output file
+        output_dir = os.path.dirname(os.path.abspath(self._entries[0].output)) if self._entries else None
+        self._chunk_dir = tempfile.mkdtemp(prefix='zpar_dispatch', dir=output_dir)
+        try:
+            threads = []
+            for worker in self._workers:
+                thread = threading.Thread(target=self._work, args=(worker,))
+                thread.daemon = True
+                thread.start()
+                threads.append(thread)
+
+            with self._cond:
+                while self._pending and self._error is None:
+                    if not any(worker.alive for worker in self._workers):
+                        self._error = DispatchError('All of the workers have failed.')
+                        break
+                    self._cond.wait(0.5)
+                # stop the workers that are still re-running chunks
+                self._finished = True
+                self._cond.notify_all()
+
+            if self._error is not None:
+                raise self._error
+            self._assemble()
+        finally:
+            shutil.rmtree(self._chunk_dir, ignore_errors=True)
+
+        wall_time = time.time() - start_time
+        self.stats = {'num_chunks': len(chunks),
+                      'num_retries': self.num_retries,
+                      'num_stolen': self.num_stolen,
+                      'num_speculative': self.num_speculative,
+                      'dropped_workers': [worker.address for worker in self._workers
+                                          if not worker.alive],
+                      'wall_time': wall_time,
+                      'worker_chunks': dict((worker.address, worker.num_chunks)
+                                            for worker in self._workers),
+                      'worker_utilization': dict((worker.address,
+                                                  worker.busy_time / wall_time if wall_time else 0.0)
+                                                 for worker in self._workers)}
+        return len(chunks)
+
+
+def main():
+    # set up an argument parser
+    parser = argparse.ArgumentParser(prog='zpar_dispatch',
+                                     description="Process the files listed in a "
+                                                 "manifest with a set of zpar_server "
+                                                 "workers",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('manifest',
+                        help="JSON lines file with the input and output path "
+                             "(and, optionally, the start, end and unit of the "
+                             "range) of each file to process")
+    parser.add_argument('--workers', dest='workers', nargs='+',
+                        help="host:port of each zpar_server worker",
+                        required=True)
+    parser.add_argument('--model', dest='model',
+                        choices=['tagger', 'parser', 'depparser'],
+                        help="The model to process the files with",
+                        default='depparser')
+    parser.add_argument('--tagged', dest='tagged', action='store_true',
+                        help="The input is already tagged")
+    parser.add_argument('--sep', dest='sep',
+                        help="The separator between words and tags in tagged input",
+                        default='/')
+    parser.add_argument('--no-tokenize', dest='tokenize', action='store_false',
+                        help="The input is already tokenized")
+    parser.add_argument('--with-lemmas', dest='with_lemmas', action='store_true',
+                        help="Add lemmas to the dependency parses")
+    parser.add_argument('--chunk-lines', dest='chunk_lines', type=int,
+                        help="Number of sentences in each chunk sent to a worker",
+                        default=1000)
+    parser.add_argument('--max-retries', dest='max_retries', type=int,
+                        help="Number of times to retry a chunk that fails",
+                        default=3)
+    parser.add_argument('--max-worker-failures', dest='max_worker_failures', type=int,
+                        help="Drop a worker after this many failures in a row",
+                        default=3)
+    parser.add_argument('--speculation', dest='speculation_factor', type=float,
+                        help="Re-run chunks that take this many times longer "
+                             "than the median chunk (0 to turn off)",
+                        default=2.0)
+    parser.add_argument('--timeout', dest='timeout', type=float,
+                        help="Seconds to wait for a worker to process a chunk")
+    parser.add_argument('--compact', dest='compact', action='store_true',
+                        help="Have the workers send tags and labels as ids")
+
+    # parse given command line arguments
+    args = parser.parse_args()
+
+    # set up the logging
+    logging.basicConfig(format='%(levelname)s:%(message)s', level=logging.INFO)
+
+    method_args = [args.sep] if args.tagged else [args.tokenize]
+    if args.model == 'depparser':
+        method_args.append(args.with_lemmas)
+
+    try:
+        dispatcher = Dispatcher(args.workers,
+                                model=args.model,
+                                tagged=args.tagged,
+                                method_args=method_args,
+                                chunk_lines=args.chunk_lines,
+                                max_retries=args.max_retries,
+                                max_worker_failures=args.max_worker_failures,
+                                speculation_factor=args.speculation_factor or None,
+                                timeout=args.timeout,
+                                compact=args.compact)
+        dispatcher.run(read_manifest(args.manifest))
+    except (DispatchError, OSError, ValueError) as e:
+        sys.stderr.write('Error: {}\n'.format(e))
+        sys.exit(1)
+
+    stats = dispatcher.stats
+    logging.info('Processed {} chunks in {:.1f} s ({} retried, {} stolen, {} '
+                 're-run)'.format(stats['num_chunks'], stats['wall_time'],
+                                  stats['num_retries'], stats['num_stolen'],
+                                  stats['num_speculative']))
+    for address in dispatcher.addresses:
+        logging.info('{}: {} chunks, {:.0%} busy'.format(address,
+                                                         stats['worker_chunks'][address],
+                                                         stats['worker_utilization'][address]))
+
+
+if __name__ == '__main__':
+    main()
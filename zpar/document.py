@@ -0,0 +1,176 @@
+# License: MIT
+'''
+Utilities to split documents into sentences and to map the tokens
+in the ZPar analyses of those sentences back to character offsets
+in the original text.
+
+:author: Nitin Madnani (nmadnani@ets.org)
+:organization: ETS
+'''
+
+import re
+
+from collections import namedtuple
+
+# an analyzed sentence of a document along with its character
+# offsets in the document and the offsets of each of its tokens
+AnalyzedSentence = namedtuple('AnalyzedSentence',
+                              ['start', 'end', 'text', 'analysis',
+                               'token_offsets'])
+
+# the sentence method that is called for each model
+SENTENCE_METHODS = {'tagger': 'tag_sentence',
+                    'parser': 'parse_sentence',
+                    'depparser': 'dep_parse_sentence'}
+
+# paragraphs are separated by one or more blank lines
+_PARAGRAPH_RE = re.compile(r'(?:[^\n]|\n(?![ \t]*\n))+')
+
+# a candidate sentence end: terminal punctuation, optionally
+# followed by closing quotes or brackets, and then whitespace
+_SENTENCE_END_RE = re.compile(r'[.!?]+[\'")\]]*(?=\s|$)')
+
+_LAST_WORD_RE = re.compile(r'(\S*)$')
+
+_INITIALISM_RE = re.compile(r'^(?:[A-Za-z]\.)*[A-Za-z]$')
+
+_ABBREVIATIONS = frozenset(['mr', 'mrs', 'ms', 'dr', 'prof', 'sr', 'jr',
+                            'st', 'vs', 'etc', 'e.g', 'i.e', 'inc', 'ltd',
+                            'co', 'corp', 'dept', 'univ', 'no', 'fig',
+                            'gen', 'gov', 'sen', 'rep', 'rev', 'hon', 'mt',
+                            'jan', 'feb', 'mar', 'apr', 'jun', 'jul', 'aug',
+                            'sep', 'sept', 'oct', 'nov', 'dec', 'a.m', 'p.m'])
+
+# the characters that ZPar (and the Penn Treebank) may
+# substitute for characters in the original text
+_TOKEN_FORMS = {'``': ['"', "''"],
+                "''": ['"', '``'],
+                '-LRB-': ['('],
+                '-RRB-': [')'],
+                '-LSB-': ['['],
+                '-RSB-': [']'],
+                '-LCB-': ['{'],
+                '-RCB-': ['}']}
+
+_LEAF_RE = re.compile(r'\(([^\s()]+) ([^\s()]+)\)')
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def _is_abbreviation(paragraph, period_pos):
+    word = _LAST_WORD_RE.search(paragraph, max(0, period_pos - 32), period_pos).group(1)
+    word = word.lstrip('"\'([')
+    return (word.lower() in _ABBREVIATIONS or
+            bool(_INITIALISM_RE.match(word)))
+
+
+def _trimmed_span(text, start, end):
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def segment_sentences(text):
+    """
+    Split the given text into paragraphs and the paragraphs into
+    sentences and return the list of (start, end) character
+    offsets of the sentences. Sentences end at terminal punctuation
+    that is followed by whitespace and then by an upper case letter,
+    a digit, a quote, a bracket or the end of the paragraph, unless
+    the punctuation is the period of a known abbreviation or initial.
+    """
+    spans = []
+    for paragraph_match in _PARAGRAPH_RE.finditer(text):
+        paragraph = paragraph_match.group()
+        offset = paragraph_match.start()
+        sentence_start = 0
+        for end_match in _SENTENCE_END_RE.finditer(paragraph):
+            following = paragraph[end_match.end():].lstrip()[:1]
+            if following and not (following.isupper() or
+                                  following.isdigit() or
+                                  following in '"\'(['):
+                continue
+            if (end_match.group().rstrip('\'")]') == '.' and
+                    following and
+                    _is_abbreviation(paragraph, end_match.start())):
+                continue
+            start, end = _trimmed_span(paragraph, sentence_start, end_match.end())
+            if start < end:
+                spans.append((offset + start, offset + end))
+            sentence_start = end_match.end()
+        start, end = _trimmed_span(paragraph, sentence_start, len(paragraph))
+        if start < end:
+            spans.append((offset + start, offset + end))
+    return spans
+
+
+def normalize_whitespace(sentence):
+    """
+    Collapse all whitespace in the given sentence, including
+    line breaks, into single spaces since ZPar reads exactly
+    one sentence per line.
+    """
+    return _WHITESPACE_RE.sub(' ', sentence).strip()
+
+
+def tree_leaves(tree):
+    """
+    Return the list of (tag, word) tuples for the leaves
+    of the given bracketed constituency parse tree.
+    """
+    return _LEAF_RE.findall(tree)
+
+
+def analysis_tokens(model_name, analysis):
+    """
+    Return the list of tokens in the given analysis produced by
+    the given model ('tagger', 'parser' or 'depparser').
+    """
+    if model_name == 'tagger':
+        return [tagged_token.rsplit('/', 1)[0] for tagged_token in analysis.split()]
+    elif model_name == 'parser':
+        return [word for tag, word in tree_leaves(analysis)]
+    else:
+        return [line.split('\t')[0] for line in analysis.split('\n') if line.strip()]
+
+
+def align_tokens(text, tokens, offset=0):
+    """
+    Return the (start, end) character offsets of each of the given
+    tokens in the given text, added to the given offset. Tokens are
+    matched left to right, skipping only whitespace in between, so a
+    token that cannot be found is given ``None`` as its offsets.
+    """
+    spans = []
+    pos = 0
+    for token in tokens:
+        while pos < len(text) and text[pos].isspace():
+            pos += 1
+        for form in [token] + _TOKEN_FORMS.get(token, []):
+            if text.startswith(form, pos):
+                spans.append((offset + pos, offset + pos + len(form)))
+                pos += len(form)
+                break
+        else:
+            spans.append(None)
+    return spans
+
+
+def analyze_spans(runner, model_name, text, spans, **kwargs):
+    """
+    Analyze the sentences at the given spans of the given text with
+    the given batch runner and model and return the list of
+    :class:`AnalyzedSentence` tuples.
+    """
+    sentences = [normalize_whitespace(text[start:end]) for start, end in spans]
+    analyses = runner.run(model_name, SENTENCE_METHODS[model_name], sentences, **kwargs)
+
+    analyzed_sentences = []
+    for (start, end), analysis in zip(spans, analyses):
+        tokens = analysis_tokens(model_name, analysis)
+        token_offsets = align_tokens(text[start:end], tokens, offset=start)
+        analyzed_sentences.append(AnalyzedSentence(start, end, text[start:end],
+                                                   analysis, token_offsets))
+    return analyzed_sentences
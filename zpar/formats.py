@@ -0,0 +1,186 @@
+# License: MIT
+'''
+Writers for the structured output formats of the file methods. The
+analyses in ZPar's usual text formats are converted, one sentence
+at a time, into records with typed token, tag, head, label and tree
+fields and written as JSON lines, Arrow IPC or Parquet files.
+
+:author: Nitin Madnani (nmadnani@ets.org)
+:organization: ETS
+'''
+
+import json
+import os
+import tempfile
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from io import open
+
+from .document import tree_leaves
+
+# the output formats that the file methods can write
+OUTPUT_FORMATS = ['text', 'jsonl', 'arrow', 'parquet']
+
+# the number of sentences in each Arrow record batch
+_BATCH_SIZE = 10000
+
+
+def check_output_format(output_format):
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError('Unknown output format {}. Choices are: '
+                         '{}.'.format(output_format,
+                                      ', '.join('"{}"'.format(f) for f in OUTPUT_FORMATS)))
+
+
+@contextmanager
+def temporary_output(outputfile, suffix='.tmp'):
+    """
+    Yield the path to a temporary file in the same directory as the
+    given output file (or the default temporary directory if that
+    one is not writable), and delete the temporary file afterwards.
+    """
+    directory = os.path.dirname(os.path.abspath(outputfile))
+    if not os.access(directory, os.W_OK):
+        # e.g., the output is a pipe under /dev/fd
+        directory = None
+    fd, tmpfile = tempfile.mkstemp(dir=directory, suffix=suffix)
+    os.close(fd)
+    try:
+        yield tmpfile
+    finally:
+        os.unlink(tmpfile)
+
+
+def read_analyses(inputfile, model_name):
+    """
+    Yield the analyses of the sentences in the given file written
+    in the usual text format of the given model: one sentence per
+    line for the tagger and the parser and blocks of CoNLL lines,
+    each followed by a blank line, for the dependency parser.
+    """
+    with open(inputfile, 'r', encoding='utf-8') as inputf:
+        if model_name != 'depparser':
+            for line in inputf:
+                yield line.rstrip('\n')
+        else:
+            lines = []
+            for line in inputf:
+                if line.strip():
+                    lines.append(line)
+                else:
+                    yield ''.join(lines)
+                    lines = []
+            if lines:
+                yield ''.join(lines)
+
+
+def parse_conll_fields(parse, names=('tokens', 'tags', 'heads', 'labels')):
+    """
+    Split the given CoNLL dependency parse into a dictionary of
+    lists of its tokens, tags, heads, labels and lemmas.
+    """
+    fields = dict((name, []) for name in names)
+    for line in parse.split('\n'):
+        if not line.strip():
+            continue
+        values = line.strip().split('\t')
+        for i, name in enumerate(names):
+            fields[name].append(int(values[i]) if name == 'heads' else values[i])
+    return fields
+
+
+def record_fields(model_name, with_lemmas=False):
+    """
+    Return the names of the fields in the records for the given model.
+    """
+    if model_name == 'tagger':
+        return ['tokens', 'tags']
+    elif model_name == 'parser':
+        return ['tree', 'tokens', 'tags']
+    else:
+        return ['tokens', 'tags', 'heads', 'labels'] + (['lemmas'] if with_lemmas else [])
+
+
+def analysis_record(model_name, analysis, with_lemmas=False):
+    """
+    Convert the given analysis in the text format of the given
+    model into a record with one typed field per annotation.
+    """
+    if model_name == 'tagger':
+        tagged_tokens = [tagged_token.rsplit('/', 1) for tagged_token in analysis.split()]
+        return OrderedDict([('tokens', [token for token, tag in tagged_tokens]),
+                            ('tags', [tag for token, tag in tagged_tokens])])
+    elif model_name == 'parser':
+        leaves = tree_leaves(analysis)
+        return OrderedDict([('tree', analysis),
+                            ('tokens', [word for tag, word in leaves]),
+                            ('tags', [tag for tag, word in leaves])])
+    else:
+        names = record_fields(model_name, with_lemmas)
+        fields = parse_conll_fields(analysis, names)
+        return OrderedDict((name, fields[name]) for name in names)
+
+
+def _arrow_schema(fields, extra_fields):
+    import pyarrow as pa
+    types = {'tree': pa.string(),
+             'heads': pa.list_(pa.int32()),
+             'start': pa.int64(),
+             'end': pa.int64()}
+    return pa.schema([(name, types.get(name, pa.list_(pa.string())))
+                      for name in list(extra_fields) + fields])
+
+
+def _batches(records, batch_size):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def write_records(records,
+                  outputfile,
+                  output_format,
+                  model_name,
+                  with_lemmas=False,
+                  extra_fields=()):
+    """
+    Write the given records for the given model to the given output
+    file in the given output format ('jsonl', 'arrow' or 'parquet').
+    The records may have extra integer fields (e.g., character
+    offsets) that come before the annotation fields.
+    """
+    if output_format == 'jsonl':
+        with open(outputfile, 'w', encoding='utf-8') as outf:
+            for record in records:
+                outf.write(json.dumps(record, ensure_ascii=False) + u'\n')
+        return
+
+    import pyarrow as pa
+    schema = _arrow_schema(record_fields(model_name, with_lemmas), extra_fields)
+    if output_format == 'arrow':
+        writer = pa.ipc.new_file(outputfile, schema)
+    else:
+        import pyarrow.parquet as pq
+        writer = pq.ParquetWriter(outputfile, schema)
+    try:
+        for batch in _batches(records, _BATCH_SIZE):
+            writer.write_batch(pa.RecordBatch.from_pylist(batch, schema=schema))
+    finally:
+        writer.close()
+
+
+def convert_file(inputfile, outputfile, model_name, output_format, with_lemmas=False):
+    """
+    Convert the analyses in the given file, written in the text
+    format of the given model, to the given output format.
+    """
+    records = (analysis_record(model_name, analysis, with_lemmas)
+               for analysis in read_analyses(inputfile, model_name))
+    write_records(records, outputfile, output_format, model_name,
+                  with_lemmas=with_lemmas)
@@ -0,0 +1,212 @@
+# License: MIT
+'''
+Helpers to annotate whole pandas Series or Arrow arrays of sentences
+through the batch engine and get the results back as columns, either
+as strings in the usual ZPar formats or as list-typed token, tag,
+head and label columns.
+
+:author: Nitin Madnani (nmadnani@ets.org)
+:organization: ETS
+'''
+
+from collections import OrderedDict
+
+from .formats import parse_conll_fields
+
+# pyarrow is needed to build the result columns and
+# pandas is only needed if we are given pandas input
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:
+    _HAS_PYARROW = False
+else:
+    _HAS_PYARROW = True
+
+try:
+    import pandas as pd
+except ImportError:
+    _HAS_PANDAS = False
+else:
+    _HAS_PANDAS = True
+
+
+# the kinds of results the helpers can return
+OUTPUTS = ['string', 'lists']
+
+
+def _check_pyarrow():
+    if not _HAS_PYARROW:
+        raise ImportError('The zpar.frame helpers need pyarrow. '
+                          'Please install it first.')
+
+
+def _check_output(output):
+    if output not in OUTPUTS:
+        raise ValueError('Unknown output {}. Choices are: "string" '
+                         'and "lists".'.format(output))
+
+
+def _is_pandas(column):
+    return _HAS_PANDAS and isinstance(column, pd.Series)
+
+
+def _to_arrow(column):
+    """
+    Return the given Series or Arrow array as one Arrow array,
+    without copying it if it is already backed by Arrow.
+    """
+    if _is_pandas(column):
+        return pa.Array.from_pandas(column, type=pa.string())
+    elif isinstance(column, pa.ChunkedArray):
+        return column.combine_chunks()
+    elif isinstance(column, pa.Array):
+        return column
+    else:
+        raise TypeError('Expected a pandas Series or an Arrow array, '
+                        'got {}.'.format(type(column).__name__))
+
+
+def _decode_column(z, model_name, method_name, column, processes, **kwargs):
+    """
+    Decode the non-null sentences of the given column in one batch
+    and return the Arrow array of the column along with the outputs
+    for its non-null entries, in order.
+    """
+    array = _to_arrow(column)
+    # the decoder takes the sentences as strings, so the non-null
+    # ones are converted in one go, straight from the Arrow buffers
+    sentences = array.drop_null().to_pylist()
+    outputs = z._get_batch_runner(processes).run(model_name,
+                                                 method_name,
+                                                 sentences,
+                                                 **kwargs)
+    return array, outputs
+
+
+def _output_indices(array):
+    """
+    Return the index of the output for each entry of the given array
+    among the outputs for its non-null entries, or null for the null
+    entries, computed with Arrow kernels rather than row by row.
+    """
+    valid = array.is_valid()
+    positions = pc.subtract(pc.cumulative_sum(pc.cast(valid, pa.int64())), 1)
+    return pc.if_else(valid, positions, pa.scalar(None, type=pa.int64()))
+
+
+def _string_result(column, array, outputs):
+    # put the outputs back where the non-null inputs
+    # were, keeping the nulls where they are
+    result = pa.array(outputs, type=pa.string())
+    if array.null_count:
+        result = result.take(_output_indices(array))
+    if _is_pandas(column):
+        return pd.Series(result, dtype=pd.ArrowDtype(result.type),
+                         index=column.index, name=column.name)
+    return result
+
+
+def _list_result(column, array, fields, field_types):
+    # build flat value arrays plus one shared offsets array
+    # for all the list columns, with nulls kept as null lists
+    first_name = list(field_types)[0]
+    values = dict((name, []) for name in field_types)
+    lengths = []
+    for sentence_fields in fields:
+        lengths.append(len(sentence_fields[first_name]))
+        for name in field_types:
+            values[name].extend(sentence_fields[name])
+
+    # the null entries get empty lists, which the mask makes null
+    lengths = pa.array(lengths, type=pa.int32())
+    if array.null_count:
+        lengths = pc.fill_null(lengths.take(_output_indices(array)), 0)
+    offsets = pa.concat_arrays([pa.array([0], type=pa.int32()),
+                                pc.cumulative_sum(lengths)])
+    mask = array.is_null()
+    columns = [pa.ListArray.from_arrays(offsets,
+                                        pa.array(values[name], type=field_type),
+                                        mask=mask)
+               for name, field_type in field_types.items()]
+    table = pa.Table.from_arrays(columns, names=list(field_types))
+    if _is_pandas(column):
+        return pd.DataFrame(dict((name, pd.Series(table.column(name).combine_chunks(),
+                                                  dtype=pd.ArrowDtype(table.schema.field(name).type),
+                                                  index=column.index))
+                                 for name in field_types),
+                            columns=list(field_types))
+    return table
+
+
+def tag_column(z, column, tokenize=True, processes=1, output='string'):
+    """
+    POS tag all the sentences in the given pandas Series or Arrow
+    array with the tagger of the given ZPar object. With the
+    'string' output, returns a column of tagged sentences in the
+    usual "WORD/TAG" format; with the 'lists' output, returns a
+    table of list-typed 'tokens' and 'tags' columns.
+    """
+    _check_pyarrow()
+    _check_output(output)
+    array, outputs = _decode_column(z, 'tagger', 'tag_sentence', column,
+                                    processes, tokenize=tokenize)
+    if output == 'string':
+        return _string_result(column, array, outputs)
+
+    fields = []
+    for tagged_sentence in outputs:
+        tokens, tags = [], []
+        for tagged_token in tagged_sentence.split():
+            token, tag = tagged_token.rsplit('/', 1)
+            tokens.append(token)
+            tags.append(tag)
+        fields.append({'tokens': tokens, 'tags': tags})
+    field_types = _field_types(['tokens', 'tags'])
+    return _list_result(column, array, fields, field_types)
+
+
+def parse_column(z, column, tokenize=True, processes=1):
+    """
+    Constituency parse all the sentences in the given pandas Series
+    or Arrow array with the parser of the given ZPar object and
+    return a column of bracketed parse trees.
+    """
+    _check_pyarrow()
+    array, outputs = _decode_column(z, 'parser', 'parse_sentence', column,
+                                    processes, tokenize=tokenize)
+    return _string_result(column, array, outputs)
+
+
+def dep_parse_column(z,
+                     column,
+                     tokenize=True,
+                     processes=1,
+                     with_lemmas=False,
+                     output='lists'):
+    """
+    Dependency parse all the sentences in the given pandas Series or
+    Arrow array with the dependency parser of the given ZPar object.
+    With the 'lists' output, returns a table of list-typed 'tokens',
+    'tags', 'heads' and 'labels' columns (and 'lemmas', if asked
+    for); with the 'string' output, returns a column of parses in
+    the usual CoNLL format.
+    """
+    _check_pyarrow()
+    _check_output(output)
+    array, outputs = _decode_column(z, 'depparser', 'dep_parse_sentence',
+                                    column, processes, tokenize=tokenize,
+                                    with_lemmas=with_lemmas)
+    if output == 'string':
+        return _string_result(column, array, outputs)
+
+    names = ['tokens', 'tags', 'heads', 'labels']
+    if with_lemmas:
+        names.append('lemmas')
+    fields = [parse_conll_fields(parse, names) for parse in outputs]
+    return _list_result(column, array, fields, _field_types(names))
+
+
+def _field_types(names):
+    return OrderedDict((name, pa.int32() if name == 'heads' else pa.string())
+                       for name in names)
@@ -0,0 +1,255 @@
+# License: MIT
+'''
+A registry of instrumentation hooks that are called around each
+sentence, batch and file call made through the ZPar wrappers, e.g.,
+to feed their timings into a tracing system. With no hooks
+registered, an instrumented call only costs one extra check.
+
+:author: Nitin Madnani (nmadnani@ets.org)
+:organization: ETS
+'''
+
+import functools
+import importlib
+import logging
+import threading
+import time
+
+
+class CallInfo(object):
+    """
+    What the hooks are told about an instrumented call: its ``kind``
+    ('sentence', 'batch', 'file' or 'document'), the ``model``
+    ('tagger', 'parser', 'depparser' or 'tokenizer') and ``method``,
+    the number of sentences and (whitespace-separated) tokens in the
+    input, where known (they are ``None`` for file calls), the
+    ``start_time`` and ``end_time`` of the call, the ``cache`` status
+    (the number of ``hits`` and ``misses`` for calls that reuse earlier
+    analyses and ``None`` otherwise) and the ``error`` raised by the
+    call, if any. Hooks can keep their own data for the call, e.g., a
+    tracing span, in the ``data`` dictionary.
+    """
+
+    __slots__ = ['kind', 'model', 'method', 'num_sentences', 'num_tokens',
+                 'start_time', 'end_time', 'cache', 'error', 'data']
+
+    def __init__(self, kind, model, method, num_sentences=None, num_tokens=None):
+        self.kind = kind
+        self.model = model
+        self.method = method
+        self.num_sentences = num_sentences
+        self.num_tokens = num_tokens
+        self.start_time = None
+        self.end_time = None
+        self.cache = None
+        self.error = None
+        self.data = {}
+
+    @property
+    def elapsed(self):
+        if self.start_time is None or self.end_time is None:
+            return None
+        return self.end_time - self.start_time
+
+    def __repr__(self):
+        return ('CallInfo(kind={!r}, model={!r}, method={!r}, num_sentences={!r}, '
+                'num_tokens={!r}, elapsed={!r}, cache={!r}, '
+                'error={!r})'.format(self.kind, self.model, self.method,
+                                     self.num_sentences, self.num_tokens,
+                                     self.elapsed, self.cache, self.error))
+
+
+class _Hook(object):
+
+    def __init__(self, before=None, after=None, span=None):
+        self.before = before
+        self.after = after
+        self.span = span
+
+
+class _Call(object):
+    """
+    The context manager that runs the registered hooks
+    around one instrumented call.
+    """
+
+    def __init__(self, hooks, info, key):
+        self._hooks = hooks
+        self._entries = hooks._entries
+        self._spans = []
+        self.info = info
+        self._key = key
+
+    def __enter__(self):
+        self._hooks._active().add(self._key)
+        for hook in self._entries:
+            try:
+                if hook.span is not None:
+                    span = hook.span(self.info)
+                    span.__enter__()
+                    self._spans.append(span)
+                elif hook.before is not None:
+                    hook.before(self.info)
+            except Exception:
+                self._hooks.logger.exception('Instrumentation hook failed')
+        self.info.start_time = time.time()
+        return self.info
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.info.end_time = time.time()
+        self.info.error = exc_value
+        self._hooks._active().discard(self._key)
+        for hook in reversed(self._entries):
+            try:
+                if hook.span is not None:
+                    if self._spans:
+                        self._spans.pop().__exit__(exc_type, exc_value, traceback)
+                elif hook.after is not None:
+                    hook.after(self.info)
+            except Exception:
+                self._hooks.logger.exception('Instrumentation hook failed')
+        return False
+
+
+class _NoCall(object):
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+class Hooks(object):
+    """
+    The instrumentation hooks of a ZPar object (``z.hooks``), which
+    are shared by all of its models, batches and worker processes
+    forked from it. A hook is either a pair of ``before`` and ``after``
+    callables or a ``span`` callable that returns a context manager to
+    enter around the call; each of these is given the ``CallInfo`` for
+    the call. Hooks are called in the order they were added (``after``
+    and the end of the spans in the reverse order) and any exceptions
+    they raise are logged instead of failing the call.
+    """
+
+    def __init__(self):
+        super(Hooks, self).__init__()
+
+        # the registered hooks, as a tuple that is replaced
+        # rather than changed so that calls in progress in
+        # other threads are not affected
+        self._entries = ()
+
+        # the calls in progress in each thread, so that a method
+        # that calls itself again (e.g., a file method reading
+        # from a pipe) is only reported once
+        self._local = threading.local()
+
+        # set up a logger
+        self.logger = logging.getLogger(__name__)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, before=None, after=None):
+        """
+        Register the given callables to be called with the ``CallInfo``
+        before and after each call and return a handle for ``remove()``.
+        """
+        if before is None and after is None:
+            raise ValueError('At least one of before and after must be given.')
+        hook = _Hook(before=before, after=after)
+        self._entries = self._entries + (hook,)
+        return hook
+
+    def add_span(self, span):
+        """
+        Register the given callable, which is given the ``CallInfo`` and
+        returns a context manager to enter around each call (e.g., a
+        tracing span), and return a handle for ``remove()``.
+        """
+        hook = _Hook(span=span)
+        self._entries = self._entries + (hook,)
+        return hook
+
+    def remove(self, handle):
+        """
+        Unregister the hook with the given handle.
+        """
+        self._entries = tuple(hook for hook in self._entries if hook is not handle)
+
+    def clear(self):
+        self._entries = ()
+
+    def _active(self):
+        active = getattr(self._local, 'active', None)
+        if active is None:
+            active = self._local.active = set()
+        return active
+
+    def call(self, kind, model, method, obj=None, num_sentences=None, num_tokens=None):
+        """
+        Return a context manager that runs the hooks around a call of
+        the given method of the given object, which gives the
+        ``CallInfo`` for the call, or ``None`` if the same call is
+        already in progress in this thread.
+        """
+        key = (id(obj), method)
+        if key in self._active():
+            return _NoCall()
+        return _Call(self, CallInfo(kind, model, method,
+                                    num_sentences=num_sentences,
+                                    num_tokens=num_tokens), key)
+
+
+def count_tokens(kind, args, kwargs):
+    """
+    Return the number of sentences and tokens in the input
+    of a sentence or batch call with the given arguments.
+    """
+    if args:
+        sentences = args[0]
+    else:
+        sentences = next((value for name, value in kwargs.items()
+                          if name.endswith('sentence') or name.endswith('sentences')), None)
+    if sentences is None or kind not in ['sentence', 'batch']:
+        return None, None
+    if kind == 'sentence':
+        return 1, len(sentences.split())
+    return len(sentences), sum(len(sentence.split()) for sentence in sentences)
+
+
+def instrumented(kind):
+    """
+    Decorate a sentence, batch or file method of one of the models so
+    that the hooks of the model (its ``hooks`` attribute) are run
+    around each call. The model is named by its ``model_name``.
+    """
+    def decorator(method):
+        method_name = method.__name__
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            hooks = self.hooks
+            if not hooks._entries:
+                return method(self, *args, **kwargs)
+            num_sentences, num_tokens = count_tokens(kind, args, kwargs)
+            with hooks.call(kind, self.model_name, method_name, obj=self,
+                            num_sentences=num_sentences, num_tokens=num_tokens):
+                return method(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def load_hook_setup(spec):
+    """
+    Return the function named by the given ``module:function`` string,
+    which is called with a ``Hooks`` registry to register its hooks.
+    """
+    module_name, _, function_name = spec.partition(':')
+    if not module_name or not function_name:
+        raise ValueError('Hook setup {} is not of the form '
+                         '"module:function".'.format(spec))
+    return getattr(importlib.import_module(module_name), function_name)
@@ -0,0 +1,117 @@
+# License: MIT
+'''
+Incremental re-analysis of documents that are edited over time,
+where only the sentences that are new or have changed since the
+last version of the document are sent to ZPar.
+
+:author: Nitin Madnani (nmadnani@ets.org)
+:organization: ETS
+'''
+
+import hashlib
+
+from .document import (AnalyzedSentence, SENTENCE_METHODS, align_tokens,
+                       analysis_tokens, normalize_whitespace,
+                       segment_sentences)
+
+
+def sentence_key(sentence):
+    """
+    Return the content hash used to cache the analysis
+    of the given sentence.
+    """
+    return hashlib.sha1(sentence.encode('utf-8')).hexdigest()
+
+
+class DocumentSession(object):
+    """
+    Keeps the analyses of the sentences of a document keyed by the
+    hash of their content. Each call to :meth:`update` with a new
+    version of the document compares its sentences against the
+    cached ones, analyzes only the sentences that are new or have
+    changed and reassembles the analysis of the whole document with
+    the offsets shifted to match the new text.
+    """
+
+    def __init__(self, runner, model='depparser', **kwargs):
+        super(DocumentSession, self).__init__()
+
+        if model not in SENTENCE_METHODS:
+            raise ValueError('Unknown model {}. Choices are: "tagger", "parser", '
+                             'and "depparser".'.format(model))
+
+        self.runner = runner
+        self.model = model
+        self.kwargs = kwargs
+        self.sentences = []
+
+        # the cached analyses along with the token offsets
+        # relative to the start of each sentence
+        self._cache = {}
+
+        # the number of sentences analyzed and reused
+        # during the last update
+        self.num_analyzed = 0
+        self.num_reused = 0
+
+    def _analyze(self, sentences):
+        return self.runner.run(self.model,
+                               SENTENCE_METHODS[self.model],
+                               [normalize_whitespace(sentence) for sentence in sentences],
+                               **self.kwargs)
+
+    def update(self, text):
+        """
+        Analyze the given new version of the document and return the
+        list of ``AnalyzedSentence`` tuples for all of its sentences.
+        """
+        spans = segment_sentences(text)
+        keys = [sentence_key(text[start:end]) for start, end in spans]
+
+        # find the sentences that we have not seen before; they
+        # are only cached once they have all been analyzed, so a
+        # failed update leaves the cache as it was
+        new_keys = []
+        new_sentences = []
+        seen_keys = set()
+        for (start, end), key in zip(spans, keys):
+            if key not in self._cache and key not in seen_keys:
+                seen_keys.add(key)
+                new_keys.append(key)
+                new_sentences.append(text[start:end])
+
+        hooks = getattr(self.runner.z, 'hooks', None)
+        if hooks:
+            # report how many of the sentences were reused
+            with hooks.call('document', self.model, SENTENCE_METHODS[self.model],
+                            obj=self, num_sentences=len(spans),
+                            num_tokens=len(text.split())) as info:
+                if info is not None:
+                    info.cache = {'hits': len(spans) - len(new_keys),
+                                  'misses': len(new_keys)}
+                analyses = self._analyze(new_sentences)
+        else:
+            analyses = self._analyze(new_sentences)
+        for key, sentence, analysis in zip(new_keys, new_sentences, analyses):
+            tokens = analysis_tokens(self.model, analysis)
+            self._cache[key] = (analysis, align_tokens(sentence, tokens))
+
+        # reassemble the whole document, shifting the cached token
+        # offsets to where each sentence now starts
+        self.sentences = []
+        for (start, end), key in zip(spans, keys):
+            analysis, relative_offsets = self._cache[key]
+            token_offsets = [(start + offsets[0], start + offsets[1])
+                             if offsets else None
+                             for offsets in relative_offsets]
+            self.sentences.append(AnalyzedSentence(start, end, text[start:end],
+                                                   analysis, token_offsets))
+
+        # forget the sentences that are no longer in the document
+        current_keys = set(keys)
+        self._cache = dict((key, value) for key, value in self._cache.items()
+                           if key in current_keys)
+
+        self.num_analyzed = len(new_keys)
+        self.num_reused = len(spans) - len(new_keys)
+        return self.sentences
@@ -0,0 +1,392 @@
+# License: MIT
+'''
+A fast lemmatizer that produces the same lemmas as NLTK's
+``WordNetLemmatizer`` but looks them up in a compact, memory-mapped
+table precomputed from WordNet and memoizes every lookup.
+
+:author: Nitin Madnani (nmadnani@ets.org)
+:organization: ETS
+'''
+
+import argparse
+import io
+import json
+import logging
+import mmap
+import multiprocessing
+import struct
+import sys
+
+# the magic bytes at the start of every lemma table file
+_TABLE_MAGIC = b'ZPLEMMA1'
+
+# record flags marking whether the word is itself a
+# WordNet lemma name for the part of speech or not
+_FLAG_LEMMA = b'1'
+_FLAG_OTHER = b'0'
+
+
+def coarse_pos(tag):
+    """
+    Map a Penn Treebank POS tag to the coarse WordNet
+    part of speech used for lemmatization.
+    """
+    if tag.startswith('J'):
+        return 'a'
+    elif tag.startswith('R'):
+        return 'r'
+    elif tag.startswith('V'):
+        return 'v'
+    else:
+        return 'n'
+
+
+def _record_key(word, pos):
+    return (pos + word).encode('utf-8')
+
+
+class LemmaTable(object):
+    """
+    A read-only (word, coarse POS) to lemma table backed by a
+    memory-mapped file written by :func:`build_lemma_table`.
+
+    The file contains a JSON header with the morphological rules
+    used by WordNet, an array of record offsets and the records
+    themselves, sorted by key so that they can be binary searched
+    without loading the file into memory.
+    """
+
+    def __init__(self, table_path):
+        super(LemmaTable, self).__init__()
+
+        self.table_path = table_path
+        self._fileobj = open(table_path, 'rb')
+        self._buf = mmap.mmap(self._fileobj.fileno(), 0,
+                              access=mmap.ACCESS_READ)
+
+        if self._buf[:len(_TABLE_MAGIC)] != _TABLE_MAGIC:
+            self.close()
+            raise ValueError('{} is not a lemma table.'.format(table_path))
+
+        pos = len(_TABLE_MAGIC)
+        header_len, = struct.unpack_from('<I', self._buf, pos)
+        pos += 4
+        header = json.loads(self._buf[pos:pos + header_len].decode('utf-8'))
+        pos += header_len
+
+        self.substitutions = dict((p, [tuple(rule) for rule in rules])
+                                  for p, rules in header['substitutions'].items())
+        self.nltk_version = header.get('nltk_version')
+
+        # whether the NLTK version the table was built with keeps
+        # applying the rules to words that no single rule maps to
+        # a lemma name (older versions) or gives up after one pass
+        self.repeat_rules = header.get('repeat_rules', False)
+        self._num_records = header['num_records']
+        self._offsets_start = pos
+        self._records_start = pos + 4 * (self._num_records + 1)
+
+    def __len__(self):
+        return self._num_records
+
+    def _record(self, i):
+        start, end = struct.unpack_from('<II', self._buf,
+                                        self._offsets_start + 4 * i)
+        return self._buf[self._records_start + start:self._records_start + end]
+
+    def _find(self, key):
+        lo, hi = 0, self._num_records
+        while lo < hi:
+            mid = (lo + hi) // 2
+            record = self._record(mid)
+            record_key = record[:record.index(b'\t')]
+            if record_key < key:
+                lo = mid + 1
+            elif record_key > key:
+                hi = mid
+            else:
+                return record[len(key) + 1:]
+        return None
+
+    def lookup(self, word, pos):
+        """
+        Return a tuple of the lemma for the given word and
+        whether the word is itself a WordNet lemma name, or
+        ``None`` if the word is not in the table.
+        """
+        value = self._find(_record_key(word, pos))
+        if value is None:
+            return None
+        flag, lemma = value[:1], value[1:].decode('utf-8')
+        return (lemma or word), flag == _FLAG_LEMMA
+
+    def is_lemma_name(self, word, pos):
+        found = self.lookup(word, pos)
+        return found is not None and found[1]
+
+    def close(self):
+        if self._buf is not None:
+            self._buf.close()
+            self._buf = None
+        if self._fileobj is not None:
+            self._fileobj.close()
+            self._fileobj = None
+
+
+class Lemmatizer(object):
+    """
+    A memoizing lemmatizer that gives the same output as NLTK's
+    ``WordNetLemmatizer``. If a lemma table is given, lemmas are
+    looked up in it and NLTK is not needed at all; otherwise every
+    new (word, POS) pair is lemmatized once with NLTK and cached.
+    """
+
+    def __init__(self, table_path=None):
+        super(Lemmatizer, self).__init__()
+
+        self.table = LemmaTable(table_path) if table_path else None
+        self._wordnet_lemmatizer = None
+        self._cache = {}
+
+        if not self.table:
+            from nltk.stem.wordnet import WordNetLemmatizer
+            self._wordnet_lemmatizer = WordNetLemmatizer()
+
+    def _lemmatize_miss(self, word, pos):
+        """
+        Lemmatize a word that is not in the table. The table holds
+        every lemma name and every form that one WordNet rule (or an
+        exception list entry) maps to a lemma name, so WordNet's
+        ``morphy`` only finds a lemma for such a word if the NLTK
+        version the table was built with keeps applying the rules,
+        which we then do the same way.
+        """
+        if not self.table.repeat_rules:
+            return word
+        substitutions = self.table.substitutions[pos]
+        forms = [word]
+        while forms:
+            forms = [form[:-len(old)] + new
+                     for form in forms
+                     for old, new in substitutions
+                     if form.endswith(old)]
+            results = []
+            for form in forms:
+                if form not in results and self.table.is_lemma_name(form, pos):
+                    results.append(form)
+            if results:
+                return min(results, key=len)
+        return word
+
+    def lemmatize(self, word, pos='n'):
+        """
+        Return the lemma of the given word with the given
+        coarse part of speech ('n', 'v', 'a' or 'r').
+        """
+        key = (word, pos)
+        try:
+            return self._cache[key]
+        except KeyError:
+            pass
+
+        if self.table:
+            found = self.table.lookup(word, pos)
+            lemma = found[0] if found else self._lemmatize_miss(word, pos)
+        else:
+            lemma = self._wordnet_lemmatizer.lemmatize(word, pos)
+
+        self._cache[key] = lemma
+        return lemma
+
+    def close(self):
+        if self.table:
+            self.table.close()
+            self.table = None
+        self._cache = {}
+
+
+def annotate_conll_lines(lines, lemmatizer):
+    """
+    Add a lemma field to each token line of the given CoNLL
+    dependency parse lines, leaving blank lines as they are.
+    """
+    annotated_lines = []
+    for line in lines:
+        line = line.strip()
+        if line:
+            fields = line.split('\t')
+            word, pos = fields[:2]
+            lemma = lemmatizer.lemmatize(word.lower(), coarse_pos(pos))
+            line = '\t'.join(fields + [lemma])
+        annotated_lines.append(line + '\n')
+    return ''.join(annotated_lines)
+
+
+# the lemmatizer used by each annotation worker process
+_worker_lemmatizer = None
+
+
+def _init_annotation_worker(table_path):
+    global _worker_lemmatizer
+    _worker_lemmatizer = Lemmatizer(table_path)
+
+
+def _annotate_chunk(lines):
+    return annotate_conll_lines(lines, _worker_lemmatizer)
+
+
+def _read_chunks(inputf, chunk_size):
+    chunk = []
+    for line in inputf:
+        chunk.append(line)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def annotation_pool(lemmatizer, processes):
+    """
+    Return a pool of the given number of worker processes that each
+    lemmatize with the same lemma table as the given lemmatizer, for
+    ``annotate_conll_file()``.
+    """
+    table_path = lemmatizer.table.table_path if lemmatizer.table else None
+    return multiprocessing.Pool(processes,
+                                initializer=_init_annotation_worker,
+                                initargs=(table_path,))
+
+
+def annotate_conll_file(inputfile,
+                        outputfile,
+                        lemmatizer,
+                        chunk_size=10000,
+                        processes=1,
+                        pool=None):
+    """
+    Stream the CoNLL dependency parses in the given input file (a path
+    or a binary file object) to the given output file, adding a lemma
+    field to each token line. Lines are processed in chunks of
+    ``chunk_size`` lines and, if ``processes`` is more than one, the
+    chunks are lemmatized in that many worker processes while keeping
+    their order. A pool from ``annotation_pool()`` can be given instead,
+    which is left running; it has to be created before the input is
+    opened if the input is a pipe, since the forked workers would
+    otherwise keep its write end open.
+    """
+    # a given file object is left open for the caller
+    close_input = not hasattr(inputfile, 'read')
+    if close_input:
+        inputf = io.open(inputfile, 'r', encoding='utf-8')
+    else:
+        inputf = io.TextIOWrapper(inputfile, encoding='utf-8')
+    try:
+        with io.open(outputfile, 'w', encoding='utf-8') as outf:
+            chunks = _read_chunks(inputf, chunk_size)
+            if pool is not None:
+                for annotated_chunk in pool.imap(_annotate_chunk, chunks):
+                    outf.write(annotated_chunk)
+            elif processes > 1:
+                pool = annotation_pool(lemmatizer, processes)
+                try:
+                    for annotated_chunk in pool.imap(_annotate_chunk, chunks):
+                        outf.write(annotated_chunk)
+                finally:
+                    pool.close()
+                    pool.join()
+            else:
+                for chunk in chunks:
+                    outf.write(annotate_conll_lines(chunk, lemmatizer))
+    finally:
+        if close_input:
+            inputf.close()
+        else:
+            inputf.detach()
+
+
+def build_lemma_table(table_path):
+    """
+    Precompute the lemma of every WordNet lemma name and of every
+    form that a single WordNet morphological rule or exception list
+    entry maps to a lemma name, using NLTK's ``WordNetLemmatizer``,
+    and write them to a lemma table at the given path. Returns the
+    number of records written.
+    """
+    import nltk
+    from nltk.corpus import wordnet as wn
+    from nltk.stem.wordnet import WordNetLemmatizer
+
+    wordnet_lemmatizer = WordNetLemmatizer()
+
+    records = []
+    for pos in ['n', 'v', 'a', 'r']:
+        lemma_names = set(name.lower() for name in wn.all_lemma_names(pos))
+        candidates = set(lemma_names)
+        for name in lemma_names:
+            for old, new in wn.MORPHOLOGICAL_SUBSTITUTIONS[pos]:
+                if name.endswith(new):
+                    candidates.add(name[:len(name) - len(new)] + old)
+        candidates.update(wn._exception_map[pos])
+
+        for word in candidates:
+            if '\t' in word or '\n' in word:
+                continue
+            lemma = wordnet_lemmatizer.lemmatize(word, pos)
+            flag = _FLAG_LEMMA if word in lemma_names else _FLAG_OTHER
+            value = b'' if lemma == word else lemma.encode('utf-8')
+            records.append(_record_key(word, pos) + b'\t' + flag + value)
+
+    records.sort(key=lambda record: record[:record.index(b'\t')])
+
+    # only the NLTK versions that apply the rules more than once
+    # get from this word to "dog", since "dogs" is not a lemma name
+    repeat_rules = wordnet_lemmatizer.lemmatize('dogss', 'n') != 'dogss'
+
+    header = json.dumps({'num_records': len(records),
+                         'nltk_version': nltk.__version__,
+                         'repeat_rules': repeat_rules,
+                         'substitutions': dict((pos, wn.MORPHOLOGICAL_SUBSTITUTIONS[pos])
+                                               for pos in ['n', 'v', 'a', 'r'])}).encode('utf-8')
+
+    with open(table_path, 'wb') as tablef:
+        tablef.write(_TABLE_MAGIC)
+        tablef.write(struct.pack('<I', len(header)))
+        tablef.write(header)
+        offset = 0
+        tablef.write(struct.pack('<I', offset))
+        for record in records:
+            offset += len(record)
+            tablef.write(struct.pack('<I', offset))
+        for record in records:
+            tablef.write(record)
+
+    return len(records)
+
+
+def main():
+    # set up an argument parser
+    parser = argparse.ArgumentParser(prog='zpar_lemma_table',
+                                     description="Precompute a lemma table "
+                                                 "from the NLTK WordNet corpus")
+    parser.add_argument('table_path',
+                        help="Path to the lemma table file to write")
+
+    # parse given command line arguments
+    args = parser.parse_args()
+
+    # set up the logging
+    logging.basicConfig(format='%(levelname)s:%(message)s', level=logging.INFO)
+
+    logging.info('Building lemma table ...')
+    try:
+        num_records = build_lemma_table(args.table_path)
+    except (ImportError, LookupError) as e:
+        sys.stderr.write('Error: NLTK and its WordNet corpus are needed '
+                         'to build a lemma table: {}\n'.format(e))
+        sys.exit(1)
+    logging.info('Wrote {} lemmas to {}'.format(num_records, args.table_path))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+# License: MIT
+'''
+Process many (usually small) input files with one call. The files
+are packed into batches and each batch is run through the model's
+file method as one combined input file, so that the per-call
+overhead on the Python and C++ sides is paid once per batch rather
+than once per file; the combined output is then split back into one
+output file per input file. Batches can be spread over a pool of
+worker processes.
+
+:author: Nitin Madnani (nmadnani@ets.org)
+:organization: ETS
+'''
+
+import glob
+import os
+import shutil
+import tempfile
+import time
+
+from collections import namedtuple
+from six import string_types
+
+from . import batch
+from .formats import convert_file
+
+# the result of processing one input file
+FileResult = namedtuple('FileResult',
+                        ['inputfile', 'outputfile', 'status',
+                         'num_sentences', 'seconds', 'error'])
+
+# the default extension of the output files for each model
+OUTPUT_SUFFIXES = {'tagger': '.tag',
+                   'parser': '.parse',
+                   'depparser': '.dep'}
+
+
+def expand_files(files, output_dir=None, output_suffix='.out'):
+    """
+    Return the list of (input, output) file pairs for the given
+    files, which can be a list of (input, output) pairs, a
+    directory (all the files in it) or a glob pattern. For a
+    directory or a glob pattern, each output file is named after
+    its input file with the given suffix added and written to the
+    given output directory (next to the input file by default).
+    """
+    if not isinstance(files, string_types):
+        return [tuple(pair) for pair in files]
+
+    if os.path.isdir(files):
+        inputfiles = sorted(os.path.join(files, name) for name in os.listdir(files)
+                            if os.path.isfile(os.path.join(files, name)))
+    else:
+        inputfiles = sorted(glob.glob(files))
+
+    pairs = []
+    for inputfile in inputfiles:
+        directory = output_dir or os.path.dirname(inputfile)
+        outputfile = os.path.join(directory, os.path.basename(inputfile) + output_suffix)
+        pairs.append((inputfile, outputfile))
+    return pairs
+
+
+def group_files(pairs, batch_bytes=1 << 20):
+    """
+    Split the given (input, output) pairs into batches whose
+    input files add up to at most about ``batch_bytes`` bytes.
+    """
+    batches = []
+    current = []
+    current_bytes = 0
+    for inputfile, outputfile in pairs:
+        try:
+            size = os.path.getsize(inputfile)
+        except OSError:
+            size = 0
+        if current and current_bytes + size > batch_bytes:
+            batches.append(current)
+            current = []
+            current_bytes = 0
+        current.append((inputfile, outputfile))
+        current_bytes += size
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _output_units(outputf, model_name):
+    """
+    Yield the output for each sentence from the given combined
+    output file: one line for the tagger and the parser and the
+    CoNLL lines up to and including the following blank line
+    for the dependency parser.
+    """
+    if model_name != 'depparser':
+        for line in outputf:
+            yield line
+    else:
+        lines = []
+        for line in outputf:
+            lines.append(line)
+            if not line.strip():
+                yield b''.join(lines)
+                lines = []
+        if lines:
+            yield b''.join(lines)
+
+
+def process_file_batch(z, model_name, method_name, pairs, output_format, kwargs):
+    """
+    Run the given file method of the given model over the given
+    (input, output) pairs as one combined input file and split the
+    output back into the output files. Returns the list of
+    :class:`FileResult` tuples for the files; the time taken for
+    the batch is divided among them by their share of its sentences.
+    """
+    tmpdir = tempfile.mkdtemp(prefix='zpar_files')
+    combined_input = os.path.join(tmpdir, 'input.txt')
+    combined_output = os.path.join(tmpdir, 'output.txt')
+    results = []
+    try:
+        # only one input file is open at a time while
+        # we write the combined input file
+        counts = []
+        with open(combined_input, 'wb') as combinedf:
+            for inputfile, outputfile in pairs:
+                try:
+                    with open(inputfile, 'rb') as inputf:
+                        data = inputf.read()
+                except (IOError, OSError) as e:
+                    counts.append(None)
+                    results.append(FileResult(inputfile, outputfile, 'error', 0, 0.0, str(e)))
+                    continue
+                if data and not data.endswith(b'\n'):
+                    data += b'\n'
+                counts.append(data.count(b'\n'))
+                combinedf.write(data)
+                results.append(None)
+
+        start_time = time.time()
+        try:
+            if sum(count for count in counts if count):
+                model = batch.get_model(z, model_name)
+                getattr(model, method_name)(combined_input, combined_output, **kwargs)
+            else:
+                open(combined_output, 'wb').close()
+        except Exception as e:
+            return [result or FileResult(inputfile, outputfile, 'error', 0, 0.0, str(e))
+                    for (inputfile, outputfile), result in zip(pairs, results)]
+        elapsed = time.time() - start_time
+        total = max(1, sum(count for count in counts if count))
+
+        # and only one output file is open at a time while
+        # we split up the combined output file
+        with open(combined_output, 'rb') as combinedf:
+            units = _output_units(combinedf, model_name)
+            for i, ((inputfile, outputfile), count) in enumerate(zip(pairs, counts)):
+                if count is None:
+                    continue
+                try:
+                    textfile = outputfile if output_format == 'text' else outputfile + '.txt'
+                    with open(textfile, 'wb') as outputf:
+                        for _ in range(count):
+                            outputf.write(next(units))
+                    if output_format != 'text':
+                        convert_file(textfile, outputfile, model_name, output_format,
+                                     with_lemmas=kwargs.get('with_lemmas', False))
+                        os.unlink(textfile)
+                except StopIteration:
+                    results[i] = FileResult(inputfile, outputfile, 'error', 0, 0.0,
+                                            'Output ended early.')
+                except (IOError, OSError) as e:
+                    results[i] = FileResult(inputfile, outputfile, 'error', 0, 0.0, str(e))
+                else:
+                    results[i] = FileResult(inputfile, outputfile, 'ok', count,
+                                            elapsed * count / total, None)
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+    return results
+
+
+def _process_file_batch_in_worker(args):
+    return process_file_batch(batch._worker_zpar, *args)
+
+
+def process_files(z,
+                  model_name,
+                  method_name,
+                  pairs,
+                  processes=1,
+                  batch_bytes=1 << 20,
+                  output_format='text',
+                  **kwargs):
+    """
+    Process the given (input, output) pairs in batches with the given
+    file method of the given model, using the given number of worker
+    processes, and return the :class:`FileResult` tuples for all of
+    them in the same order.
+    """
+    batches = group_files(pairs, batch_bytes=batch_bytes)
+    tasks = [(model_name, method_name, file_batch, output_format, kwargs)
+             for file_batch in batches]
+    if processes > 1 and len(tasks) > 1:
+        runner = z._get_batch_runner(processes)
+        batch_results = runner._get_pool().imap(_process_file_batch_in_worker, tasks)
+    else:
+        batch_results = (process_file_batch(z, *task) for task in tasks)
+
+    results = []
+    for file_results in batch_results:
+        results.extend(file_results)
+    return results
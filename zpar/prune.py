@@ -0,0 +1,315 @@
+# License: MIT
+'''
+Shrink ZPar models by pruning the feature weights that are (close to)
+zero and, optionally, quantizing the rest. ZPar keeps every feature
+weight it reads in its hash tables, so dropping the long tail of tiny
+weights from the model files directly reduces the memory each loaded
+model takes. The compacted files keep ZPar's text format, so the
+library loads them unchanged.
+
+Each weight in a model file is written by ZPar as the current weight
+followed by the summed weight kept for averaging (``3 / 1024``), either
+on its own line after its feature (``key : 3 / 1024``) or inside the
+packed weights of a feature (``key : { NN : 3 / 1024 , VB : -1 / -20 }``).
+A weight is pruned only if all of its numbers are at most the threshold
+in magnitude. Lines that are not in either form (e.g., the names of the
+feature tables) are copied as they are.
+
+:author: Nitin Madnani (nmadnani@ets.org)
+:organization: ETS
+'''
+
+import argparse
+import decimal
+import io
+import json
+import logging
+import os
+import re
+import resource
+import shutil
+import subprocess
+import sys
+import time
+
+from .agreement import agreement, format_agreement
+
+# the model files in a ZPar model directory
+MODEL_FILES = ['tagger', 'conparser', 'depparser']
+
+_NUMBER = r'-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?'
+# a weight has at least two numbers, so that the word counts
+# and other bare numbers in the model files are left alone
+_WEIGHT = r'{0}(?: / {0})+'.format(_NUMBER)
+_SCALAR_LINE = re.compile(r'^(?P<key>.* : )(?P<weight>{})$'.format(_WEIGHT))
+_PACKED_LINE = re.compile(r'^(?P<key>.* : )\{ (?P<items>.*) \}$')
+_PACKED_ITEM = re.compile(r'(?P<key>.+?) : (?P<weight>{})(?: , |$)'.format(_WEIGHT))
+
+# the model in each model file, the getter that loads it
+# and the method used to decode with it
+_MODEL_METHODS = [('tagger', 'tagger', 'get_tagger', 'tag_sentence'),
+                  ('conparser', 'parser', 'get_parser', 'parse_sentence'),
+                  ('depparser', 'depparser', 'get_depparser', 'dep_parse_sentence')]
+
+
+def _quantize_number(number, quantize):
+    value = round(float(number) / quantize) * quantize
+    if re.match(r'^-?\d+$', number):
+        # integer weights have to stay integers
+        return str(int(round(value)))
+    # the step can be in exponent notation (e.g., 1e-05), so its
+    # number of decimals is taken from its decimal exponent
+    decimals = max(0, -decimal.Decimal(str(quantize)).normalize().as_tuple().exponent)
+    return '{:.{}f}'.format(value, decimals)
+
+
+def compact_weight(weight, threshold=0.0, quantize=None):
+    """
+    Return the given weight (as written in a model file) quantized
+    to multiples of ``quantize``, if given, or ``None`` if all of its
+    numbers are then at most ``threshold`` in magnitude.
+    """
+    numbers = weight.split(' / ')
+    if quantize:
+        numbers = [_quantize_number(number, quantize) for number in numbers]
+    if all(abs(float(number)) <= threshold for number in numbers):
+        return None
+    return ' / '.join(numbers)
+
+
+def compact_line(line, stats, threshold=0.0, quantize=None):
+    """
+    Return the given line of a model file with its weights compacted,
+    or ``None`` if all of them were pruned. The number of weights seen
+    and pruned are added up in the given ``stats`` dictionary.
+    """
+    text = line.rstrip('\n')
+
+    match = _PACKED_LINE.match(text)
+    if match:
+        items = match.group('items')
+        kept = []
+        pos = 0
+        for item in _PACKED_ITEM.finditer(items):
+            if item.start() != pos:
+                break
+            pos = item.end()
+            stats['weights'] += 1
+            weight = compact_weight(item.group('weight'), threshold, quantize)
+            if weight is None:
+                stats['pruned'] += 1
+            else:
+                kept.append('{} : {}'.format(item.group('key'), weight))
+        if pos == len(items):
+            if not kept:
+                return None
+            return '{}{{ {} }}\n'.format(match.group('key'), ' , '.join(kept))
+        # not something we can parse, so leave it alone
+        return line
+
+    match = _SCALAR_LINE.match(text)
+    if match:
+        stats['weights'] += 1
+        weight = compact_weight(match.group('weight'), threshold, quantize)
+        if weight is None:
+            stats['pruned'] += 1
+            return None
+        return '{}{}\n'.format(match.group('key'), weight)
+
+    return line
+
+
+def compact_model_file(inputfile, outputfile, threshold=0.0, quantize=None):
+    """
+    Write a compacted copy of the given model file and return the
+    number of weights seen and pruned along with the file sizes.
+    """
+    stats = {'weights': 0, 'pruned': 0}
+    with io.open(inputfile, 'r', encoding='utf-8', newline='\n') as inputf:
+        with io.open(outputfile, 'w', encoding='utf-8', newline='\n') as outputf:
+            for line in inputf:
+                compacted = compact_line(line, stats, threshold=threshold,
+                                         quantize=quantize)
+                if compacted is not None:
+                    outputf.write(compacted)
+    stats['input_size'] = os.path.getsize(inputfile)
+    stats['output_size'] = os.path.getsize(outputfile)
+    return stats
+
+
+def compact_model_dir(modeldir, outputdir, models=None, threshold=0.0, quantize=None):
+    """
+    Write a compacted copy of the given ZPar model directory to the
+    given output directory; the files of the given models (all of
+    them by default) are compacted and all of the other files are
+    copied as they are. Returns the stats for each compacted model.
+    """
+    models = models or MODEL_FILES
+    if not os.path.exists(outputdir):
+        os.makedirs(outputdir)
+
+    all_stats = {}
+    for name in sorted(os.listdir(modeldir)):
+        path = os.path.join(modeldir, name)
+        outputpath = os.path.join(outputdir, name)
+        if name in models and os.path.isfile(path):
+            logging.info('Compacting {} ...'.format(path))
+            all_stats[name] = compact_model_file(path, outputpath,
+                                                 threshold=threshold,
+                                                 quantize=quantize)
+        elif os.path.isdir(path):
+            shutil.copytree(path, outputpath)
+        else:
+            shutil.copy2(path, outputpath)
+    return all_stats
+
+
+def _peak_rss_bytes():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes and macOS reports bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def measure_models(modeldir, models, sentences):
+    """
+    Load the models in the given model files from the given directory,
+    decode the given sentences with each one and return the load time,
+    the growth in peak memory and the outputs for each model file. This
+    should be run in a fresh process so that the memory numbers are
+    meaningful.
+    """
+    from . import ZPar
+
+    results = {}
+    with ZPar(modeldir) as z:
+        for name, _, getter, method_name in _MODEL_METHODS:
+            if name not in models:
+                continue
+            rss_before = _peak_rss_bytes()
+            start = time.time()
+            model = getattr(z, getter)()
+            load_seconds = time.time() - start
+            results[name] = {'load_seconds': load_seconds,
+                             'memory_bytes': _peak_rss_bytes() - rss_before,
+                             'outputs': [getattr(model, method_name)(sentence)
+                                         for sentence in sentences]}
+    return results
+
+
+def _measure_in_fresh_process(modeldir, models, samplefile):
+    cmd = [sys.executable, '-m', 'zpar.prune', '--measure',
+           modeldir, '--models'] + list(models)
+    if samplefile:
+        cmd += ['--sample', samplefile]
+    output = subprocess.check_output(cmd)
+    return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+
+def _read_sample(samplefile):
+    if not samplefile:
+        return []
+    with io.open(samplefile, 'r', encoding='utf-8') as samplef:
+        return [line.strip() for line in samplef if line.strip()]
+
+
+def report(modeldir, outputdir, models, stats, samplefile=None):
+    """
+    Log the size, load time, memory and (if a held-out sample of
+    sentences is given) accuracy deltas of the compacted models
+    relative to the original ones and return them.
+    """
+    original = _measure_in_fresh_process(modeldir, models, samplefile)
+    compacted = _measure_in_fresh_process(outputdir, models, samplefile)
+
+    deltas = {}
+    for name, model_name, _, _ in _MODEL_METHODS:
+        if name not in models:
+            continue
+        model_deltas = {}
+        if name in stats:
+            model_stats = stats[name]
+            model_deltas.update(model_stats)
+            logging.info('{}: pruned {} of {} weights, {:.1f} MB -> {:.1f} MB on '
+                         'disk'.format(name, model_stats['pruned'],
+                                       model_stats['weights'],
+                                       model_stats['input_size'] / 1e6,
+                                       model_stats['output_size'] / 1e6))
+        before, after = original[name], compacted[name]
+        model_deltas.update({'load_seconds': (before['load_seconds'], after['load_seconds']),
+                             'memory_bytes': (before['memory_bytes'], after['memory_bytes'])})
+        logging.info('{}: loaded in {:.2f} s -> {:.2f} s, peak memory '
+                     '+{:.1f} MB -> +{:.1f} MB'.format(name,
+                                                       before['load_seconds'],
+                                                       after['load_seconds'],
+                                                       before['memory_bytes'] / 1e6,
+                                                       after['memory_bytes'] / 1e6))
+        if samplefile:
+            scores = agreement(model_name, after['outputs'], before['outputs'])
+            model_deltas['agreement'] = scores
+            logging.info('{}: agreement with the original model on {}: '
+                         '{}'.format(name, samplefile, format_agreement(scores)))
+        deltas[name] = model_deltas
+    return deltas
+
+
+def main():
+    # set up an argument parser
+    parser = argparse.ArgumentParser(prog='zpar_prune',
+                                     description="Write a compacted copy of a "
+                                                 "ZPar model directory with the "
+                                                 "smallest weights pruned")
+    parser.add_argument('modeldir',
+                        help="Path to directory containing zpar English models")
+    parser.add_argument('outputdir', nargs='?',
+                        help="Path to the directory to write the compacted models to")
+    parser.add_argument('--models', dest='models', nargs='+',
+                        help="Compact only these models",
+                        default=MODEL_FILES)
+    parser.add_argument('--threshold', dest='threshold', type=float,
+                        help="Prune weights whose numbers are all at most "
+                             "this large in magnitude",
+                        default=0.0)
+    parser.add_argument('--quantize', dest='quantize', type=float,
+                        help="Round the weights to multiples of this step "
+                             "before pruning")
+    parser.add_argument('--sample', dest='samplefile',
+                        help="Held-out file with one sentence per line on "
+                             "which to compare the compacted and the "
+                             "original models")
+    parser.add_argument('--no-report', dest='report', action='store_false',
+                        help="Do not load the models to report the load "
+                             "time, memory and accuracy deltas")
+    parser.add_argument('--measure', dest='measure', action='store_true',
+                        help=argparse.SUPPRESS)
+
+    # parse given command line arguments
+    args = parser.parse_args()
+
+    if set(args.models).difference(MODEL_FILES):
+        sys.stderr.write('Error: invalid model(s) specified. Choices are: "tagger", '
+                         '"conparser", and "depparser".\n')
+        sys.exit(1)
+
+    # the measurements for the report are made in fresh processes
+    # running this same script, which print them as JSON
+    if args.measure:
+        results = measure_models(args.modeldir, args.models,
+                                 _read_sample(args.samplefile))
+        print(json.dumps(results))
+        return
+
+    if not args.outputdir:
+        parser.error('the output directory is required')
+
+    # set up the logging
+    logging.basicConfig(format='%(levelname)s:%(message)s', level=logging.INFO)
+
+    stats = compact_model_dir(args.modeldir, args.outputdir, models=args.models,
+                              threshold=args.threshold, quantize=args.quantize)
+    if args.report:
+        report(args.modeldir, args.outputdir, args.models, stats,
+               samplefile=args.samplefile)
+
+
+if __name__ == '__main__':
+    main()
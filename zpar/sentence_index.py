@@ -0,0 +1,288 @@
+# License: MIT
+'''
+A compact index of the byte offsets of every Nth sentence of an input
+file (ZPar reads one sentence per line), and utilities to read any
+range of sentences or bytes of the file through mmap so that several
+workers can each process a slice of the same shared file.
+
+:author: Nitin Madnani (nmadnani@ets.org)
+:organization: ETS
+'''
+
+import argparse
+import json
+import logging
+import mmap
+import os
+import struct
+
+from contextlib import contextmanager
+
+from .streams import native_paths
+
+# the magic bytes at the start of every sentence index file
+_INDEX_MAGIC = b'ZPINDEX1'
+
+# the extension of the index file that is used by
+# default for an input file if it exists
+INDEX_SUFFIX = '.zpidx'
+
+# the size of the blocks in which newlines are counted
+_BLOCK_SIZE = 1 << 20
+
+# the units in which ranges of the input can be given
+RANGE_UNITS = ['sentence', 'byte']
+
+
+def _open_mmap(inputfile):
+    fileobj = open(inputfile, 'rb')
+    if not os.fstat(fileobj.fileno()).st_size:
+        # empty files cannot be memory-mapped
+        return fileobj, b''
+    return fileobj, mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _skip_lines(buf, pos, num_lines):
+    """
+    Return the offset of the line that is the given number
+    of lines after the one starting at the given offset,
+    counting newlines a block at a time until we are close.
+    """
+    size = len(buf)
+    while num_lines > 0 and pos < size:
+        block_end = min(pos + _BLOCK_SIZE, size)
+        block_lines = buf[pos:block_end].count(b'\n')
+        if block_lines < num_lines:
+            num_lines -= block_lines
+            pos = block_end
+            continue
+        while num_lines > 0:
+            pos = buf.find(b'\n', pos) + 1
+            num_lines -= 1
+    return min(pos, size)
+
+
+def _line_start(buf, pos):
+    """
+    Return the offset of the first line that starts at or after the
+    given byte offset, so that adjacent byte ranges snapped with this
+    function never split or share a sentence.
+    """
+    if pos <= 0:
+        return 0
+    if pos >= len(buf):
+        return len(buf)
+    if buf[pos - 1:pos] == b'\n':
+        return pos
+    newline = buf.find(b'\n', pos)
+    return newline + 1 if newline >= 0 else len(buf)
+
+
+def build_sentence_index(inputfile, index_path=None, every=1000):
+    """
+    Write an index of the byte offset of every ``every``-th sentence
+    of the given input file to the given path (the input file path
+    plus ``.zpidx`` by default) and return the number of sentences
+    in the file.
+    """
+    index_path = index_path or inputfile + INDEX_SUFFIX
+    offsets = []
+    fileobj, buf = _open_mmap(inputfile)
+    try:
+        pos = 0
+        num_sentences = 0
+        while pos < len(buf):
+            offsets.append(pos)
+            next_pos = _skip_lines(buf, pos, every)
+            num_sentences += buf[pos:next_pos].count(b'\n')
+            if next_pos == len(buf) and buf[next_pos - 1:next_pos] != b'\n':
+                # the last sentence does not end in a newline
+                num_sentences += 1
+            pos = next_pos
+    finally:
+        if buf:
+            buf.close()
+        fileobj.close()
+
+    stat = os.stat(inputfile)
+    header = json.dumps({'every': every,
+                         'num_sentences': num_sentences,
+                         'file_size': stat.st_size,
+                         'file_mtime': stat.st_mtime}).encode('utf-8')
+    with open(index_path, 'wb') as indexf:
+        indexf.write(_INDEX_MAGIC)
+        indexf.write(struct.pack('<I', len(header)))
+        indexf.write(header)
+        indexf.write(struct.pack('<{}Q'.format(len(offsets)), *offsets))
+    return num_sentences
+
+
+class SentenceIndex(object):
+    """
+    The sentence offsets of an input file read from an index
+    written by :func:`build_sentence_index`.
+    """
+
+    def __init__(self, index_path):
+        super(SentenceIndex, self).__init__()
+
+        self.index_path = index_path
+        with open(index_path, 'rb') as indexf:
+            data = indexf.read()
+
+        if data[:len(_INDEX_MAGIC)] != _INDEX_MAGIC:
+            raise ValueError('{} is not a sentence index.'.format(index_path))
+
+        pos = len(_INDEX_MAGIC)
+        header_len, = struct.unpack_from('<I', data, pos)
+        pos += 4
+        header = json.loads(data[pos:pos + header_len].decode('utf-8'))
+        pos += header_len
+
+        self.every = header['every']
+        self.num_sentences = header['num_sentences']
+        self.file_size = header['file_size']
+        self.file_mtime = header['file_mtime']
+        num_offsets = (len(data) - pos) // 8
+        self.offsets = struct.unpack_from('<{}Q'.format(num_offsets), data, pos)
+
+    def matches(self, inputfile):
+        """
+        Check that the index is still up to date for the given file.
+        """
+        stat = os.stat(inputfile)
+        return (stat.st_size == self.file_size and
+                stat.st_mtime == self.file_mtime)
+
+    def sentence_offset(self, buf, sentence_number):
+        """
+        Return the byte offset of the given sentence in the given
+        buffer holding the indexed file.
+        """
+        if sentence_number >= self.num_sentences:
+            return len(buf)
+        entry = min(sentence_number // self.every, len(self.offsets) - 1)
+        return _skip_lines(buf, self.offsets[entry],
+                           sentence_number - entry * self.every)
+
+
+def load_sentence_index(inputfile, index_path=None):
+    """
+    Return the index of the given input file if there is one (at
+    the given path or at the input file path plus ``.zpidx``) and
+    it is up to date, and ``None`` otherwise.
+    """
+    index_path = index_path or inputfile + INDEX_SUFFIX
+    if not os.path.exists(index_path):
+        return None
+    index = SentenceIndex(index_path)
+    if not index.matches(inputfile):
+        logging.warning('Ignoring out-of-date sentence index {}'.format(index_path))
+        return None
+    return index
+
+
+def byte_range(inputfile, buf, start=None, end=None, unit='sentence', index=None):
+    """
+    Return the (start, end) byte offsets in the given buffer holding
+    the given input file for the given range of sentences (start is
+    inclusive and end is exclusive) or bytes. Byte offsets are moved
+    forward to the start of the next sentence unless they are already
+    at the start of one, so each sentence belongs to exactly one of a
+    set of adjacent byte ranges.
+    """
+    if unit not in RANGE_UNITS:
+        raise ValueError('Unknown range unit {}. Choices are: '
+                         '"sentence" and "byte".'.format(unit))
+
+    if unit == 'byte':
+        start_byte = _line_start(buf, start or 0)
+        end_byte = _line_start(buf, end if end is not None else len(buf))
+    else:
+        if index is None:
+            index = load_sentence_index(inputfile)
+        start = start or 0
+        if index is not None:
+            start_byte = index.sentence_offset(buf, start)
+            end_byte = (index.sentence_offset(buf, end)
+                        if end is not None else len(buf))
+        else:
+            start_byte = _skip_lines(buf, 0, start)
+            end_byte = (_skip_lines(buf, start_byte, end - start)
+                        if end is not None else len(buf))
+    return start_byte, max(start_byte, end_byte)
+
+
+class _RangeReader(object):
+    """
+    Read the given range of bytes of the given buffer as a file.
+    """
+
+    def __init__(self, buf, start_byte, end_byte):
+        self.buf = buf
+        self.pos = start_byte
+        self.end_byte = end_byte
+
+    def read(self, size=-1):
+        if size < 0:
+            size = self.end_byte - self.pos
+        data = self.buf[self.pos:min(self.pos + size, self.end_byte)]
+        self.pos += len(data)
+        return data
+
+
+@contextmanager
+def range_input(inputfile, outputfile, start=None, end=None, unit='sentence', index=None):
+    """
+    Yield the path for the file methods to read just the given range
+    of sentences or bytes of the given input file from. The range is
+    streamed from the memory-mapped input through a pipe, so nothing
+    is copied to disk. The output file is not touched and is only
+    given so that it is written directly by ZPar.
+    """
+    if not os.path.isfile(inputfile):
+        raise ValueError('Ranges can only be used with regular, '
+                         'uncompressed input files.')
+    fileobj, buf = _open_mmap(inputfile)
+    try:
+        start_byte, end_byte = byte_range(inputfile, buf, start=start, end=end,
+                                          unit=unit, index=index)
+        with native_paths(_RangeReader(buf, start_byte, end_byte),
+                          outputfile) as (inputpath, _):
+            yield inputpath
+    finally:
+        if buf:
+            buf.close()
+        fileobj.close()
+
+
+def main():
+    # set up an argument parser
+    parser = argparse.ArgumentParser(prog='zpar_index',
+                                     description="Build a sentence offset "
+                                                 "index for an input file")
+    parser.add_argument('inputfile',
+                        help="Path to the input file with one sentence per line")
+    parser.add_argument('--index', dest='index_path',
+                        help="Path to the index file to write (default: "
+                             "the input file path plus {})".format(INDEX_SUFFIX),
+                        required=False)
+    parser.add_argument('--every', dest='every', type=int,
+                        help="Record the offset of every Nth sentence",
+                        default=1000,
+                        required=False)
+
+    # parse given command line arguments
+    args = parser.parse_args()
+
+    # set up the logging
+    logging.basicConfig(format='%(levelname)s:%(message)s', level=logging.INFO)
+
+    num_sentences = build_sentence_index(args.inputfile,
+                                         index_path=args.index_path,
+                                         every=args.every)
+    logging.info('Indexed {} sentences in {}'.format(num_sentences, args.inputfile))
+
+
+if __name__ == '__main__':
+    main()
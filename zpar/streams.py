@@ -0,0 +1,280 @@
+# License: MIT
+'''
+Let the file methods read from and write to file descriptors, Python
+file objects and compressed files. The data is streamed through OS
+pipes that ZPar's own reader and writer open by their ``/dev/fd``
+paths, with a thread on the Python side copying (and compressing or
+decompressing) the data in and out of each pipe as ZPar goes, so
+nothing is written to temporary files.
+
+:author: Nitin Madnani (nmadnani@ets.org)
+:organization: ETS
+'''
+
+import codecs
+import errno
+import io
+import os
+import threading
+
+from contextlib import contextmanager
+
+from six import string_types
+
+# the file extensions of the compressed files we can stream
+COMPRESSION_SUFFIXES = {'.gz': 'gzip',
+                        '.bz2': 'bz2',
+                        '.xz': 'xz',
+                        '.zst': 'zstd'}
+
+# the size of the chunks copied in and out of the pipes
+_CHUNK_SIZE = 1 << 16
+
+
+def compression(path):
+    """
+    Return the compression of the given file ('gzip', 'bz2', 'xz'
+    or 'zstd') from its extension, or ``None`` if it is not one of
+    the compressed files that can be streamed.
+    """
+    return COMPRESSION_SUFFIXES.get(os.path.splitext(path)[1].lower())
+
+
+def open_compressed(path, mode):
+    """
+    Open the given compressed file for reading ('rb') or writing
+    ('wb') with streaming decompression or compression.
+    """
+    # the compression modules are only imported when they are
+    # needed since they add to the time it takes to import zpar;
+    # lzma is only in the standard library on Python 3 and
+    # zstandard is an optional third-party package
+    kind = compression(path)
+    if kind == 'gzip':
+        import gzip
+        return gzip.open(path, mode)
+    elif kind == 'bz2':
+        import bz2
+        return bz2.BZ2File(path, mode)
+    elif kind == 'xz':
+        try:
+            import lzma
+        except ImportError:
+            raise ImportError('Reading and writing xz files needs Python 3.')
+        return lzma.open(path, mode)
+    elif kind == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError('Reading and writing zstd files needs the zstandard '
+                              'package. Please install it first.')
+        return zstandard.open(path, mode)
+    else:
+        raise ValueError('{} is not a compressed file.'.format(path))
+
+
+def needs_streaming(inputfile, outputfile):
+    """
+    Check whether either of the given input and output files is
+    not a plain uncompressed path that ZPar can open directly.
+    """
+    return any(not isinstance(f, string_types) or compression(f) is not None
+               for f in [inputfile, outputfile])
+
+
+class _Pump(threading.Thread):
+    """
+    A thread that copies everything from one file object to another
+    and closes the destination when it is done if asked to. If the
+    copying fails and ``drain`` is set, the rest of the source is read
+    and thrown away so that the writer at the other end of the source
+    pipe does not block forever on a full pipe.
+    """
+
+    def __init__(self, source, destination, close_destination=False, drain=False):
+        super(_Pump, self).__init__()
+        self.daemon = True
+        self.source = source
+        self.destination = destination
+        self.close_destination = close_destination
+        self.drain = drain
+        self.error = None
+
+    def run(self):
+        try:
+            while True:
+                data = self.source.read(_CHUNK_SIZE)
+                if not data:
+                    break
+                if not isinstance(data, bytes):
+                    data = data.encode('utf-8')
+                self.destination.write(data)
+            if isinstance(self.destination, _TextWriter):
+                self.destination.finish()
+        except (IOError, OSError) as e:
+            # the reader of a pipe may stop before the end
+            if getattr(e, 'errno', None) != errno.EPIPE:
+                self.error = e
+        except Exception as e:
+            self.error = e
+        finally:
+            if self.error is not None and self.drain:
+                self._drain()
+            if self.close_destination:
+                try:
+                    self.destination.close()
+                except (IOError, OSError):
+                    pass
+
+    def _drain(self):
+        try:
+            while self.source.read(_CHUNK_SIZE):
+                pass
+        except (IOError, OSError, ValueError):
+            pass
+
+
+class _TextWriter(object):
+    """
+    Write the UTF-8 bytes read from a pipe to a text file object. The
+    bytes are decoded incrementally since a chunk read from the pipe
+    can end in the middle of a character.
+    """
+
+    def __init__(self, textf):
+        self.textf = textf
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+
+    def write(self, data):
+        self.textf.write(self._decoder.decode(data))
+
+    def finish(self):
+        self.textf.write(self._decoder.decode(b'', final=True))
+
+
+def _input_source(inputfile):
+    if isinstance(inputfile, string_types):
+        return open_compressed(inputfile, 'rb'), True
+    elif isinstance(inputfile, int):
+        return io.open(inputfile, 'rb', closefd=False), True
+    elif hasattr(inputfile, 'read'):
+        return inputfile, False
+    raise TypeError('Expected a path, a file descriptor or a file object '
+                    'to read from, got {}.'.format(type(inputfile).__name__))
+
+
+def _output_destination(outputfile):
+    if isinstance(outputfile, string_types):
+        return open_compressed(outputfile, 'wb'), True
+    elif isinstance(outputfile, int):
+        return io.open(outputfile, 'wb', closefd=False), True
+    elif hasattr(outputfile, 'write'):
+        if isinstance(outputfile, io.TextIOBase):
+            return _TextWriter(outputfile), False
+        return outputfile, False
+    raise TypeError('Expected a path, a file descriptor or a file object '
+                    'to write to, got {}.'.format(type(outputfile).__name__))
+
+
+@contextmanager
+def native_paths(inputfile, outputfile):
+    """
+    Yield the paths that ZPar should read its input from and write its
+    output to for the given input and output files. Plain paths are
+    passed through; for everything else, the path is the ``/dev/fd``
+    path of one end of a pipe whose other end is fed from, or drained
+    into, the given file descriptor, file object or compressed file by
+    a thread. Once the block is done, the pipes are closed and the
+    threads finish copying, so the output is complete on exit.
+    """
+    opened = []
+    pipe_fds = []
+    pipe_files = []
+    pumps = []
+    try:
+        if isinstance(inputfile, string_types) and compression(inputfile) is None:
+            inputpath = inputfile
+        else:
+            source, close_source = _input_source(inputfile)
+            if close_source:
+                opened.append(source)
+            input_read_fd, input_write_fd = os.pipe()
+            pipe_fds.append(input_read_fd)
+            pumps.append(_Pump(source, io.open(input_write_fd, 'wb'),
+                               close_destination=True))
+            inputpath = '/dev/fd/{}'.format(input_read_fd)
+
+        if isinstance(outputfile, string_types) and compression(outputfile) is None:
+            outputpath = outputfile
+        else:
+            destination, close_destination = _output_destination(outputfile)
+            output_read_fd, output_write_fd = os.pipe()
+            pipe_fds.append(output_write_fd)
+            pipe_files.append(io.open(output_read_fd, 'rb'))
+            pumps.append(_Pump(pipe_files[-1], destination, drain=True))
+            if close_destination:
+                opened.append(destination)
+            outputpath = '/dev/fd/{}'.format(output_write_fd)
+
+        for pump in pumps:
+            pump.start()
+
+        yield inputpath, outputpath
+
+    finally:
+        # closing our ends of the pipes lets the input thread stop
+        # if ZPar did not read everything and lets the output thread
+        # see the end of the output that ZPar has written
+        for fd in pipe_fds:
+            os.close(fd)
+        for pump in pumps:
+            if pump.ident is not None:
+                pump.join()
+        for f in pipe_files + opened:
+            f.close()
+
+    for pump in pumps:
+        if pump.error is not None:
+            raise pump.error
+
+
+@contextmanager
+def piped_output(consumer):
+    """
+    Yield the ``/dev/fd`` path of the write end of a pipe for ZPar to
+    write its output to, while a thread calls the given function with
+    a binary file object reading the other end, so that the output is
+    processed as it is written instead of going to disk first. If the
+    function fails, the rest of the output is read and thrown away so
+    that ZPar does not block on a full pipe, and the error is raised
+    once the block is done.
+    """
+    read_fd, write_fd = os.pipe()
+    readf = io.open(read_fd, 'rb')
+    errors = []
+
+    def consume():
+        try:
+            consumer(readf)
+        except Exception as e:
+            errors.append(e)
+            try:
+                while readf.read(_CHUNK_SIZE):
+                    pass
+            except (IOError, OSError, ValueError):
+                pass
+
+    thread = threading.Thread(target=consume)
+    thread.daemon = True
+    thread.start()
+    try:
+        yield '/dev/fd/{}'.format(write_fd)
+    finally:
+        # closing our end of the pipe lets the thread see the end
+        # of the output once ZPar has closed its end too
+        os.close(write_fd)
+        thread.join()
+        readf.close()
+
+    if errors:
+        raise errors[0]
@@ -0,0 +1,107 @@
+# License: MIT
+'''
+:author: Nitin Madnani (nmadnani@ets.org)
+:organization: ETS
+'''
+import codecs
+import ctypes as c
+import os
+import threading
+
+from .hooks import Hooks, instrumented
+from .streams import native_paths, needs_streaming
+
+# the size of each thread's new output buffer
+_INITIAL_SIZE = 1 << 12
+
+
+class Tokenizer(object):
+    """
+    The ZPar English tokenizer, which needs no models. Its output is
+    the same as the tokenization done by the ``*_sentence`` methods
+    of the models, so the tokens can be passed on to them with
+    ``tokenize=False``. The library calls release the GIL and each
+    thread gets its own output buffer, so several threads can
+    tokenize at the same time.
+    """
+
+    # the name of the model reported to the instrumentation hooks
+    model_name = 'tokenizer'
+
+    def __init__(self, libptr, hooks=None):
+        super(Tokenizer, self).__init__()
+
+        # the instrumentation hooks run around each call
+        self.hooks = hooks if hooks is not None else Hooks()
+
+        # get the library methods that tokenize sentences and files
+        self._tokenize_sentence_into = libptr.tokenize_sentence_into
+        self._tokenize_sentence_into.restype = c.c_long
+        self._tokenize_sentence_into.argtypes = [c.c_char_p, c.c_void_p, c.c_long]
+
+        self._tokenize_file = libptr.tokenize_file
+        self._tokenize_file.restype = None
+        self._tokenize_file.argtypes = [c.c_char_p, c.c_char_p]
+
+        self._local = threading.local()
+
+    def _buffer(self, size=_INITIAL_SIZE):
+        buf = getattr(self._local, 'buffer', None)
+        if buf is None or len(buf[0]) < size:
+            # the ctypes array shares the memory of the bytearray
+            data = bytearray(size)
+            view = (c.c_char * size).from_buffer(data)
+            buf = self._local.buffer = (data, view, c.addressof(view))
+        return buf
+
+    @instrumented('sentence')
+    def tokenize(self, sentence):
+        """
+        Return the list of tokens in the given sentence.
+        """
+        if not sentence.strip():
+            return []
+        zpar_compatible_sentence = (sentence.strip() + "\n ").encode('utf-8')
+        data, _, address = self._buffer()
+        length = self._tokenize_sentence_into(zpar_compatible_sentence, address, len(data))
+        if length > len(data):
+            # tokenizing again is cheaper than keeping
+            # the output around for each thread
+            data, _, address = self._buffer(max(length, 2 * len(data)))
+            length = self._tokenize_sentence_into(zpar_compatible_sentence, address, len(data))
+        return codecs.decode(memoryview(data)[:length], 'utf-8').split()
+
+    @instrumented('batch')
+    def tokenize_batch(self, sentences, threads=1):
+        """
+        Return the list of tokens for each of the given sentences,
+        tokenizing them in the given number of threads.
+        """
+        if threads <= 1:
+            return [self.tokenize(sentence) for sentence in sentences]
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            return list(executor.map(self.tokenize, sentences,
+                                     chunksize=max(1, len(sentences) // (threads * 4))))
+
+    @instrumented('file')
+    def tokenize_file(self, inputfile, outputfile):
+        """
+        Tokenize the sentences in the given input file, one per line,
+        and write them to the given output file, one per line with
+        the tokens separated by spaces.
+        """
+        if needs_streaming(inputfile, outputfile):
+            # let ZPar read and write through pipes that are
+            # fed from and drained into the given files
+            with native_paths(inputfile, outputfile) as (inputpath, outputpath):
+                self.tokenize_file(inputpath, outputpath)
+        elif not os.path.exists(inputfile):
+            raise OSError('File {} does not exist.'.format(inputfile))
+        else:
+            self._tokenize_file(inputfile.encode('utf-8'), outputfile.encode('utf-8'))
+
+    def cleanup(self):
+        self._tokenize_sentence_into = None
+        self._tokenize_file = None
+        self._local = threading.local()
@@ -0,0 +1,265 @@
+# License: MIT
+'''
+A compact, read-only constituency parse tree that is stored as flat
+parallel arrays of node labels, parent indices and token spans, with
+light-weight node views that are only created when asked for.
+
+:author: Nitin Madnani (nmadnani@ets.org)
+:organization: ETS
+'''
+
+import re
+
+from array import array
+
+# the labels of all trees are stored as indices into one shared
+# label vocabulary since there are only a few dozen of them
+_LABELS = []
+_LABEL_IDS = {}
+
+_TOKEN_RE = re.compile(r'\(|\)|[^\s()]+')
+
+
+def _label_id(label):
+    try:
+        return _LABEL_IDS[label]
+    except KeyError:
+        _LABEL_IDS[label] = len(_LABELS)
+        _LABELS.append(label)
+        return _LABEL_IDS[label]
+
+
+class ParseTree(object):
+    """
+    A constituency parse tree whose nodes are numbered in pre-order,
+    with the label, the parent index and the (start, end) token span
+    of every node kept in flat arrays and the words kept in a tuple.
+    Pre-terminal nodes (the POS tags) are nodes whose span covers a
+    single token and that have no children.
+    """
+
+    __slots__ = ('_label_ids', 'parents', 'starts', 'ends', 'words', '_children')
+
+    def __init__(self, label_ids, parents, starts, ends, words):
+        self._label_ids = label_ids
+        self.parents = parents
+        self.starts = starts
+        self.ends = ends
+        self.words = words
+        self._children = None
+
+    @classmethod
+    def from_string(cls, bracketed):
+        """
+        Build a tree from the given bracketed parse
+        string produced by ZPar's constituency parser.
+        """
+        label_ids = array('H')
+        parents = array('i')
+        starts = array('i')
+        ends = array('i')
+        words = []
+
+        stack = []
+        expecting_label = False
+        for token in _TOKEN_RE.findall(bracketed):
+            if token == '(':
+                expecting_label = True
+            elif token == ')':
+                ends[stack.pop()] = len(words)
+            elif expecting_label:
+                label_ids.append(_label_id(token))
+                parents.append(stack[-1] if stack else -1)
+                starts.append(len(words))
+                ends.append(len(words))
+                stack.append(len(label_ids) - 1)
+                expecting_label = False
+            else:
+                words.append(token)
+
+        return cls(label_ids, parents, starts, ends, tuple(words))
+
+    def __getstate__(self):
+        # the label ids are only meaningful in this process, so
+        # the label vocabulary of the tree is pickled along with
+        # them and mapped back to local ids when it is unpickled
+        vocabulary = sorted(set(self._label_ids))
+        local_ids = dict((label_id, i) for i, label_id in enumerate(vocabulary))
+        return ([_LABELS[label_id] for label_id in vocabulary],
+                array('H', [local_ids[label_id] for label_id in self._label_ids]),
+                self.parents, self.starts, self.ends, self.words)
+
+    def __setstate__(self, state):
+        labels, label_ids, self.parents, self.starts, self.ends, self.words = state
+        local_ids = [_label_id(label) for label in labels]
+        self._label_ids = array('H', [local_ids[label_id] for label_id in label_ids])
+        self._children = None
+
+    def __len__(self):
+        return len(self._label_ids)
+
+    def __str__(self):
+        return self.to_string()
+
+    def __repr__(self):
+        return 'ParseTree({!r})'.format(self.to_string())
+
+    @property
+    def root(self):
+        return Node(self, 0) if len(self) else None
+
+    def label(self, index):
+        return _LABELS[self._label_ids[index]]
+
+    @property
+    def labels(self):
+        return [_LABELS[label_id] for label_id in self._label_ids]
+
+    def span(self, index):
+        return self.starts[index], self.ends[index]
+
+    def children(self, index):
+        """
+        Return the indices of the children of the given node. The
+        child lists of all nodes are built the first time this is
+        called and then kept with the tree.
+        """
+        if self._children is None:
+            children = [[] for _ in range(len(self))]
+            for child, parent in enumerate(self.parents):
+                if parent >= 0:
+                    children[parent].append(child)
+            self._children = children
+        return self._children[index]
+
+    def is_preterminal(self, index):
+        next_index = index + 1
+        return (next_index >= len(self) or
+                self.parents[next_index] != index)
+
+    def node(self, index):
+        return Node(self, index)
+
+    def nodes(self, label=None):
+        """
+        Return the nodes of the tree in pre-order,
+        optionally only those with the given label.
+        """
+        if label is None:
+            return [Node(self, index) for index in range(len(self))]
+        label_id = _LABEL_IDS.get(label)
+        return [Node(self, index) for index, node_label_id in enumerate(self._label_ids)
+                if node_label_id == label_id]
+
+    def spans(self, label=None):
+        """
+        Return the (label, start, end) tuples of the constituents of
+        the tree, optionally only those with the given label. The
+        pre-terminal (POS tag) nodes are not included.
+        """
+        return [(node.label, node.start, node.end) for node in self.nodes(label)
+                if not node.is_preterminal]
+
+    def covering(self, start, end):
+        """
+        Return the smallest node that covers the given token span.
+        """
+        best = None
+        for index in range(len(self)):
+            if self.starts[index] <= start and self.ends[index] >= end:
+                best = index
+        return Node(self, best) if best is not None else None
+
+    def pos(self):
+        """
+        Return the list of (word, tag) tuples of the tree.
+        """
+        return [(self.words[self.starts[index]], self.label(index))
+                for index in range(len(self)) if self.is_preterminal(index)]
+
+    def to_string(self, index=0):
+        """
+        Return the bracketed string of the subtree
+        rooted at the given node (the whole tree by default).
+        """
+        if not len(self):
+            return ''
+        if self.is_preterminal(index):
+            return '({} {})'.format(self.label(index), self.words[self.starts[index]])
+        return '({} {})'.format(self.label(index),
+                                ' '.join(self.to_string(child) for child in self.children(index)))
+
+    def to_nltk(self, index=0):
+        """
+        Return the subtree rooted at the given node (the whole
+        tree by default) as an ``nltk.Tree``; needs NLTK.
+        """
+        from nltk import Tree
+        if self.is_preterminal(index):
+            return Tree(self.label(index), [self.words[self.starts[index]]])
+        return Tree(self.label(index), [self.to_nltk(child) for child in self.children(index)])
+
+
+class Node(object):
+    """
+    A view of one node of a :class:`ParseTree`.
+    """
+
+    __slots__ = ('tree', 'index')
+
+    def __init__(self, tree, index):
+        self.tree = tree
+        self.index = index
+
+    def __eq__(self, other):
+        return (isinstance(other, Node) and
+                self.tree is other.tree and
+                self.index == other.index)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((id(self.tree), self.index))
+
+    def __str__(self):
+        return self.tree.to_string(self.index)
+
+    def __repr__(self):
+        return 'Node({}, {}, {})'.format(self.label, self.start, self.end)
+
+    @property
+    def label(self):
+        return self.tree.label(self.index)
+
+    @property
+    def start(self):
+        return self.tree.starts[self.index]
+
+    @property
+    def end(self):
+        return self.tree.ends[self.index]
+
+    @property
+    def span(self):
+        return self.tree.span(self.index)
+
+    @property
+    def parent(self):
+        parent = self.tree.parents[self.index]
+        return Node(self.tree, parent) if parent >= 0 else None
+
+    @property
+    def children(self):
+        return [Node(self.tree, child) for child in self.tree.children(self.index)]
+
+    @property
+    def is_preterminal(self):
+        return self.tree.is_preterminal(self.index)
+
+    @property
+    def words(self):
+        return self.tree.words[self.start:self.end]
+
+    def to_nltk(self):
+        return self.tree.to_nltk(self.index)
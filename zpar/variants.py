@@ -0,0 +1,162 @@
+# License: MIT
+'''
+Pick which of the optimized builds of the zpar shared library to load.
+Besides the generic ``zpar.so``, the Makefile can build ``native``
+(``-march=native``), ``lto`` (plus link-time optimization) and ``pgo``
+(plus profile-guided optimization) variants. Since all of them are
+tuned for the CPU they were built on, the CPU of the build machine is
+recorded for each variant and a variant is only loaded on a CPU with at
+least the same features. Among those, the variant with the largest
+speedup recorded by ``benchmarks/variant_speedup.py`` is loaded, or,
+if no speedups were recorded, the most optimized one.
+
+:author: Nitin Madnani (nmadnani@ets.org)
+:organization: ETS
+'''
+
+import json
+import os
+import platform
+
+# the optimized variants, from the most to the least optimized
+VARIANTS = ['pgo', 'lto', 'native']
+
+# the file in the library directory recording the
+# build machine and the speedup of each variant
+VARIANTS_FILE = 'variants.json'
+
+# the environment variable that forces a particular
+# variant (or the generic build, with 'generic')
+VARIANT_ENV = 'ZPAR_VARIANT'
+
+_cpu_flags = None
+
+
+def cpu_flags():
+    """
+    Return the set of features of the current CPU, or ``None``
+    if they cannot be determined on this platform.
+    """
+    global _cpu_flags
+    if _cpu_flags is None:
+        flags = set()
+        if os.path.exists('/proc/cpuinfo'):
+            with open('/proc/cpuinfo') as cpuinfo:
+                for line in cpuinfo:
+                    key, _, value = line.partition(':')
+                    if key.strip() in ['flags', 'Features']:
+                        flags.update(value.split())
+                        break
+        elif platform.system() == 'Darwin':
+            import subprocess
+            for key in ['machdep.cpu.features', 'machdep.cpu.leaf7_features']:
+                try:
+                    output = subprocess.check_output(['sysctl', '-n', key],
+                                                     stderr=subprocess.STDOUT)
+                except (OSError, subprocess.CalledProcessError):
+                    continue
+                flags.update(output.decode('utf-8').lower().split())
+        _cpu_flags = flags
+    return _cpu_flags or None
+
+
+def read_variants(dist_path):
+    """
+    Return the recorded information about the variants
+    built in the given library directory.
+    """
+    variants_path = os.path.join(dist_path, VARIANTS_FILE)
+    if not os.path.exists(variants_path):
+        return {}
+    with open(variants_path) as variantsf:
+        return json.load(variantsf)
+
+
+def _write_variants(dist_path, variants):
+    variants_path = os.path.join(dist_path, VARIANTS_FILE)
+    with open(variants_path + '.tmp', 'w') as variantsf:
+        json.dump(variants, variantsf, indent=2, sort_keys=True)
+    os.rename(variants_path + '.tmp', variants_path)
+
+
+def record_build(variant, dist_path):
+    """
+    Record that the given variant was just built in the given
+    library directory on this machine; any speedup recorded
+    for an earlier build of it is dropped.
+    """
+    variants = read_variants(dist_path)
+    flags = cpu_flags()
+    variants[variant] = {'machine': platform.machine(),
+                         'cpu_flags': sorted(flags) if flags else None}
+    _write_variants(dist_path, variants)
+
+
+def record_speedups(speedups, dist_path):
+    """
+    Record the given speedups of the variants over the
+    generic build in the given library directory.
+    """
+    variants = read_variants(dist_path)
+    for variant, speedup in speedups.items():
+        if variant in variants:
+            variants[variant]['speedup'] = speedup
+    _write_variants(dist_path, variants)
+
+
+def library_name(variant):
+    return 'zpar.so' if variant == 'generic' else 'zpar-{}.so'.format(variant)
+
+
+def is_compatible(info):
+    """
+    Check whether a variant built on the machine described by
+    the given information can run on the current CPU.
+    """
+    if info.get('machine') != platform.machine():
+        return False
+    flags = cpu_flags()
+    build_flags = info.get('cpu_flags')
+    return bool(flags and build_flags and flags.issuperset(build_flags))
+
+
+def best_variant(dist_path):
+    """
+    Return the name of the variant of the library to load from the
+    given library directory: the one named by ``ZPAR_VARIANT`` if
+    that is set, otherwise the fastest built variant that can run on
+    this CPU, or 'generic' if there is none.
+    """
+    forced = os.environ.get(VARIANT_ENV)
+    if forced:
+        if not os.path.exists(os.path.join(dist_path, library_name(forced))):
+            raise OSError('The {} variant of the zpar library named by {} '
+                          'was not built.'.format(forced, VARIANT_ENV))
+        return forced
+
+    variants = read_variants(dist_path)
+    candidates = []
+    for variant, info in variants.items():
+        if (variant in VARIANTS and
+                os.path.exists(os.path.join(dist_path, library_name(variant))) and
+                is_compatible(info)):
+            candidates.append(variant)
+    if not candidates:
+        return 'generic'
+
+    # variants that were benchmarked are ranked by their speedup (and
+    # not used at all if they were slower); otherwise the most
+    # optimized one is assumed to be the fastest
+    speedups = dict((variant, variants[variant].get('speedup'))
+                    for variant in candidates)
+    if all(speedup is not None for speedup in speedups.values()):
+        best = max(candidates, key=lambda variant: speedups[variant])
+        return best if speedups[best] > 1.0 else 'generic'
+    return min(candidates, key=VARIANTS.index)
+
+
+if __name__ == '__main__':
+    # the Makefile runs this file directly after building each
+    # variant so that the package does not have to be importable
+    import sys
+    record_build(sys.argv[1], sys.argv[2])
@@ -0,0 +1,368 @@
+# License: MIT
+'''
+Smaller ``zpar_server`` responses. Responses can be compressed with
+zstd (if the zstandard package is installed) or gzip, whichever the
+client prefers among those it accepts, and tagged sentences and
+dependency parses can be sent in a compact encoding in which each
+tag and label is replaced by a short id. The strings behind the ids
+are kept in a vocabulary that only grows, so each client gets each
+string once, along with the first response that uses it.
+
+In the compact encoding, each line of the analysis becomes one
+record and the records are separated by newlines, after a header
+line with the kind of analysis (``t`` for tagged sentences and ``d``
+for dependency parses), the width of the ids and whether lemmas are
+included. A tagged sentence is a space-separated list of tokens,
+each written as the id of its tag followed by the word. A line of a
+dependency parse is written as the ids of its tag and label followed
+by the head, a tab, the word and, if included, a tab and the lemma.
+
+:author: Nitin Madnani (nmadnani@ets.org)
+:organization: ETS
+'''
+
+import gzip
+import io
+import threading
+import uuid
+
+from six.moves import xmlrpc_client, xmlrpc_server
+
+# zstandard is an optional third-party package
+try:
+    import zstandard
+except ImportError:
+    _HAS_ZSTANDARD = False
+else:
+    _HAS_ZSTANDARD = True
+
+# the encodings that responses can be compressed with, most preferred first
+COMPRESSIONS = ['zstd', 'gzip'] if _HAS_ZSTANDARD else ['gzip']
+
+# the characters that ids are written with; printable, not whitespace
+# and not escaped in XML so that each one takes up a single byte
+_ID_CHARS = ''.join(chr(c) for c in range(0x21, 0x7f) if chr(c) not in '<>&')
+_ID_VALUES = dict((char, value) for value, char in enumerate(_ID_CHARS))
+
+# the model that writes the output of each method that
+# has a compact encoding
+_METHOD_MODELS = {'tag_sentence': 'tagger',
+                  'tag_file': 'tagger',
+                  'dep_parse_sentence': 'depparser',
+                  'dep_parse_tagged_sentence': 'depparser',
+                  'dep_parse_file': 'depparser',
+                  'dep_parse_tagged_file': 'depparser'}
+
+
+def compress(data, encoding):
+    if encoding == 'gzip':
+        buf = io.BytesIO()
+        with gzip.GzipFile(fileobj=buf, mode='wb', compresslevel=6) as gzipf:
+            gzipf.write(data)
+        return buf.getvalue()
+    elif encoding == 'zstd' and _HAS_ZSTANDARD:
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    raise ValueError('Unknown compression {}.'.format(encoding))
+
+
+def decompress(data, encoding):
+    if encoding == 'gzip':
+        with gzip.GzipFile(fileobj=io.BytesIO(data), mode='rb') as gzipf:
+            return gzipf.read()
+    elif encoding == 'zstd' and _HAS_ZSTANDARD:
+        # the size is not in the frame header when streamed
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    raise ValueError('Unknown compression {}.'.format(encoding))
+
+
+class CompressingRequestHandler(xmlrpc_server.SimpleXMLRPCRequestHandler):
+    """
+    An XML-RPC request handler that compresses each response larger
+    than the ``compression_threshold`` of the server with the first of
+    the server's ``compressions`` that the client accepts, preferring
+    the ones the client gives a higher weight.
+    """
+
+    def response_encoding(self, size):
+        compressions = getattr(self.server, 'compressions', COMPRESSIONS)
+        threshold = getattr(self.server, 'compression_threshold', self.encode_threshold)
+        if threshold is None or size <= threshold:
+            return None
+        accepted = self.accept_encodings()
+        candidates = [(-accepted[encoding], rank, encoding)
+                      for rank, encoding in enumerate(compressions)
+                      if accepted.get(encoding, 0) > 0]
+        return min(candidates)[2] if candidates else None
+
+    def do_POST(self):
+        # this follows the handler it extends, which can only gzip
+        if not self.is_rpc_path_valid():
+            self.report_404()
+            return
+
+        try:
+            data = self.rfile.read(int(self.headers['content-length']))
+            data = self.decode_request_content(data)
+            if data is None:
+                # the error response has been sent
+                return
+            response = self.server._marshaled_dispatch(data,
+                                                       getattr(self, '_dispatch', None),
+                                                       self.path)
+        except Exception:
+            self.send_response(500)
+            self.send_header('Content-length', '0')
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('Content-type', 'text/xml')
+        encoding = self.response_encoding(len(response))
+        if encoding:
+            response = compress(response, encoding)
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Content-length', str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+
+class CompressingTransport(xmlrpc_client.Transport):
+    """
+    An XML-RPC transport for ``ServerProxy`` that accepts responses
+    compressed with zstd (if the zstandard package is installed) as
+    well as gzip and that can time out after the given number of
+    seconds. On Python 2, only gzip is asked for.
+    """
+
+    def __init__(self, timeout=None, compressions=None):
+        xmlrpc_client.Transport.__init__(self)
+        self.timeout = timeout
+        compressions = COMPRESSIONS if compressions is None else compressions
+        self.accept_encoding = ', '.join(compressions) or 'identity'
+
+    def make_connection(self, host):
+        connection = xmlrpc_client.Transport.make_connection(self, host)
+        if self.timeout:
+            connection.timeout = self.timeout
+        return connection
+
+    def send_headers(self, connection, headers):
+        headers = [(key, self.accept_encoding if key == 'Accept-Encoding' else value)
+                   for key, value in headers]
+        xmlrpc_client.Transport.send_headers(self, connection, headers)
+
+    def parse_response(self, response):
+        if (hasattr(response, 'getheader') and
+                response.getheader('Content-Encoding', '') == 'zstd'):
+            parser, unmarshaller = self.getparser()
+            parser.feed(decompress(response.read(), 'zstd'))
+            parser.close()
+            return unmarshaller.close()
+        return xmlrpc_client.Transport.parse_response(self, response)
+
+
+def _write_id(value, width):
+    chars = []
+    for _ in range(width):
+        value, digit = divmod(value, len(_ID_CHARS))
+        chars.append(_ID_CHARS[digit])
+    return ''.join(reversed(chars))
+
+
+def _read_id(text, start, width):
+    value = 0
+    for char in text[start:start + width]:
+        value = value * len(_ID_CHARS) + _ID_VALUES[char]
+    return value
+
+
+class Vocabulary(object):
+    """
+    The tags and labels that have been given ids, which never change
+    for as long as the vocabulary exists; its ``vocab_id`` tells the
+    clients whether the ids they know about are still valid.
+    """
+
+    def __init__(self):
+        super(Vocabulary, self).__init__()
+
+        self.vocab_id = uuid.uuid4().hex[:12]
+        self.strings = []
+        self._ids = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.strings)
+
+    def intern(self, string):
+        try:
+            return self._ids[string]
+        except KeyError:
+            with self._lock:
+                if string not in self._ids:
+                    self._ids[string] = len(self.strings)
+                    self.strings.append(string)
+                return self._ids[string]
+
+
+def _split_analysis(model_name, text):
+    """
+    Return the lines of the given output of the given model split into
+    fields, or ``None`` if they are not in the expected form.
+    """
+    rows = []
+    if model_name == 'tagger':
+        for line in text.split('\n'):
+            tokens = [token.rpartition('/') for token in line.split(' ')] if line else []
+            if any(not sep for _, sep, _ in tokens):
+                return None
+            rows.append([(word, tag) for word, _, tag in tokens])
+    else:
+        num_fields = None
+        for line in text.split('\n'):
+            if not line:
+                rows.append(None)
+                continue
+            fields = line.split('\t')
+            num_fields = num_fields or len(fields)
+            if (len(fields) != num_fields or num_fields not in [4, 5] or
+                    fields[2].lstrip('-') == '' or
+                    not fields[2].lstrip('-').isdigit() or
+                    str(int(fields[2])) != fields[2]):
+                return None
+            rows.append(fields)
+    return rows
+
+
+def encode(model_name, text, vocabulary):
+    """
+    Return the given output of the given model ('tagger' or 'depparser')
+    in the compact encoding with the ids from the given vocabulary, or
+    ``None`` if it cannot be encoded.
+    """
+    rows = _split_analysis(model_name, text)
+    if rows is None:
+        return None
+    if model_name == 'tagger' and any('\t' in tag for row in rows for _, tag in row):
+        return None
+
+    # give all of the tags and labels ids first so
+    # that we know how many characters each id needs
+    if model_name == 'tagger':
+        ids = dict((tag, vocabulary.intern(tag)) for row in rows for _, tag in row)
+    else:
+        ids = dict((field, vocabulary.intern(field))
+                   for row in rows if row for field in (row[1], row[3]))
+    width = 1
+    while len(vocabulary) > len(_ID_CHARS) ** width:
+        width += 1
+    chars = dict((string, _write_id(value, width)) for string, value in ids.items())
+
+    lemmas = model_name == 'depparser' and any(row and len(row) == 5 for row in rows)
+    records = ['{}{}{}'.format('t' if model_name == 'tagger' else 'd', width, int(lemmas))]
+    if model_name == 'tagger':
+        for row in rows:
+            records.append(' '.join(chars[tag] + word for word, tag in row))
+    else:
+        for row in rows:
+            if row is None:
+                records.append('')
+            else:
+                records.append('{}{}{}\t{}'.format(chars[row[1]], chars[row[3]],
+                                                   row[2], '\t'.join([row[0]] + row[4:])))
+    return '\n'.join(records)
+
+
+def decode(compact, strings):
+    """
+    Return the analysis in the given compact encoding with
+    the ids looked up in the given list of strings.
+    """
+    header, _, body = compact.partition('\n')
+    kind, width = header[0], int(header[1:-1])
+    lines = []
+    if kind == 't':
+        for record in body.split('\n'):
+            lines.append(' '.join('{}/{}'.format(token[width:], strings[_read_id(token, 0, width)])
+                                  for token in record.split(' ')) if record else '')
+    else:
+        for record in body.split('\n'):
+            if not record:
+                lines.append('')
+                continue
+            ids_and_head, _, rest = record.partition('\t')
+            word, _, lemma = rest.partition('\t')
+            fields = [word,
+                      strings[_read_id(ids_and_head, 0, width)],
+                      ids_and_head[2 * width:],
+                      strings[_read_id(ids_and_head, width, width)]]
+            if header[-1] == '1':
+                fields.append(lemma)
+            lines.append('\t'.join(fields))
+    return '\n'.join(lines)
+
+
+def compact_response(method_name, text, vocabulary, known_vocab):
+    """
+    Return the response for the given output of the given method for a
+    client that knows about the given ``[vocab_id, size]`` of the given
+    vocabulary, as a single string. Its first line is ``c`` followed by
+    the vocabulary id, the index of the first string the client has not
+    seen yet and those strings, all separated by tabs, and the rest is
+    the compact encoding of the output. If the output cannot be encoded,
+    the response is ``p`` followed by the output itself.
+    """
+    model_name = _METHOD_MODELS.get(method_name)
+    compact = encode(model_name, text, vocabulary) if model_name else None
+    if compact is None:
+        return 'p' + text
+    vocab_id, known_size = known_vocab if known_vocab else (None, 0)
+    start = known_size if vocab_id == vocabulary.vocab_id else 0
+    # the strings are added to but never changed, so the snapshot
+    # taken after encoding covers every id in the encoding
+    strings = vocabulary.strings[start:]
+    return '\t'.join(['c' + vocabulary.vocab_id, str(start)] + strings) + '\n' + compact
+
+
+class CompactClient(object):
+    """
+    Calls the ``compact.*`` methods of a ``zpar_server`` through the
+    given ``ServerProxy`` and decodes their output, keeping track of
+    the vocabulary it has been sent so far. Use it like the proxy,
+    e.g., ``CompactClient(proxy).dep_parse_sentence(sentence)``.
+    """
+
+    def __init__(self, proxy):
+        super(CompactClient, self).__init__()
+
+        self.proxy = proxy
+        self.vocab_id = None
+        self.strings = []
+        self._lock = threading.Lock()
+
+    def decode_response(self, response):
+        if response.startswith('p'):
+            return response[1:]
+        vocab_line, _, compact = response.partition('\n')
+        fields = vocab_line[1:].split('\t')
+        vocab_id, start = fields[0], int(fields[1])
+        with self._lock:
+            if vocab_id != self.vocab_id or start == 0:
+                self.vocab_id = vocab_id
+                self.strings = []
+            self.strings[start:start + len(fields) - 2] = fields[2:]
+            strings = self.strings
+        return decode(compact, strings)
+
+    def __getattr__(self, method_name):
+        if method_name.startswith('_'):
+            raise AttributeError(method_name)
+        remote_method = getattr(self.proxy, 'compact.{}'.format(method_name))
+
+        def method(*args):
+            with self._lock:
+                known_vocab = [self.vocab_id, len(self.strings)] if self.vocab_id else None
+            return self.decode_response(remote_method(known_vocab, *args))
+
+        method.__name__ = str(method_name)
+        return method
@@ -1,17 +1,55 @@
 #!/usr/bin/env python
 
 import argparse
+import heapq
+import itertools
 import logging
 import os
+import shutil
+import signal
 import six
 import sys
+import tempfile
+import threading
+import time
 
+from io import open
+from six.moves.socketserver import ThreadingMixIn
 from zpar import ZPar
+from zpar.hooks import Hooks, load_hook_setup
+from zpar.streams import needs_streaming
+from zpar.wire import (COMPRESSIONS, CompressingRequestHandler, Vocabulary,
+                       compact_response)
 
 if six.PY2:
     from SimpleXMLRPCServer import SimpleXMLRPCServer
+    from xmlrpclib import Binary, Fault
 else:
     from xmlrpc.server import SimpleXMLRPCServer
+    from xmlrpc.client import Binary, Fault
+
+# the methods that each model exposes via the server
+_MODEL_METHODS = {'tagger': ['tag_sentence', 'tag_file'],
+                  'parser': ['parse_sentence', 'parse_file',
+                             'parse_tagged_sentence', 'parse_tagged_file'],
+                  'depparser': ['dep_parse_sentence', 'dep_parse_file',
+                                'dep_parse_tagged_sentence',
+                                'dep_parse_tagged_file']}
+
+# the position of the ``output_format`` argument of each file method
+_FILE_METHOD_FORMAT_ARG = {'tag_file': 3,
+                           'parse_file': 3,
+                           'parse_tagged_file': 3,
+                           'dep_parse_file': 5,
+                           'dep_parse_tagged_file': 5}
+
+# the request priority classes, highest priority first
+PRIORITY_CLASSES = ['interactive', 'bulk']
+
+# the fault codes returned when a request is shed
+OVERLOADED_FAULT = 503
+CLIENT_LIMIT_FAULT = 429
+
 
 class ModelNotFoundError(Exception):
 
@@ -28,46 +66,491 @@ class ModelNotFoundError(Exception):
             return "No models could be found at {}".format(self.model_path)
 
 
+def get_model_version(model_path):
+    """
+    Return a version string for the models in the given directory.
+    This is the contents of a ``VERSION`` file in that directory, if
+    there is one, and the absolute path of the directory otherwise.
+    """
+    version_file = os.path.join(model_path, 'VERSION')
+    if os.path.exists(version_file):
+        with open(version_file, 'r') as versionf:
+            return versionf.read().strip()
+    else:
+        return os.path.abspath(model_path)
+
+
+class ModelSet(object):
+    """
+    One generation of loaded ZPar models along with a count
+    of the requests that are currently using it. A model set
+    that has been retired is closed as soon as the last
+    in-flight request using it finishes.
+    """
+
+    def __init__(self, zpar_model_path, model_list, generation, beam=None,
+                 hooks=None):
+
+        self.model_path = zpar_model_path
+        self.model_list = list(model_list)
+        self.generation = generation
+        self.version = get_model_version(zpar_model_path)
+        self.beam = beam
+
+        # each generation gets its own copy of the library since
+        # loading (or unloading) models changes ZPar's global tables,
+        # which must not happen while another generation is decoding
+        self.z = ZPar(zpar_model_path, beam=beam, hooks=hooks, private_library=True)
+        self.functions = {}
+        try:
+            if 'tagger' in model_list:
+                self._add_functions('tagger', self.z.get_tagger())
+            if 'parser' in model_list:
+                self._add_functions('parser', self.z.get_parser())
+            if 'depparser' in model_list:
+                self._add_functions('depparser', self.z.get_depparser())
+        except OSError:
+            self.z.close()
+            raise ModelNotFoundError('all', zpar_model_path)
+
+        self.loaded_at = time.time()
+        self._lock = threading.Lock()
+        self._active = 0
+        self._retired = False
+
+    def _add_functions(self, model_name, model):
+        for method_name in _MODEL_METHODS[model_name]:
+            self.functions[method_name] = getattr(model, method_name)
+
+    def acquire(self):
+        with self._lock:
+            self._active += 1
+
+    def release(self):
+        with self._lock:
+            self._active -= 1
+            close_now = self._retired and self._active == 0
+        if close_now:
+            self.close()
+
+    def retire(self):
+        with self._lock:
+            self._retired = True
+            close_now = self._active == 0
+        if close_now:
+            self.close()
+
+    def close(self):
+        if self.z:
+            logging.info('Unloading generation {} models '
+                         '({})'.format(self.generation, self.version))
+            self.z.close()
+            self.z = None
+            self.functions = {}
+
+
+class AdmissionController(object):
+    """
+    Lets a fixed number of requests (one by default, since all
+    requests share the one ZPar session) use the models at a time
+    and queues the rest, picking the next request by priority class
+    and then by arrival order. A request is turned away right away
+    with an "overloaded" fault if the queue is full, if its client
+    already has too many requests queued or running, or if the
+    queue wait it would see, estimated from the recent service
+    times of the requests ahead of it, is over the wait threshold
+    for its class; it is also turned away if it actually ends up
+    waiting longer than that threshold.
+    """
+
+    def __init__(self,
+                 capacity=1,
+                 max_queue=100,
+                 max_queue_wait=None,
+                 max_client_requests=8):
+
+        self.capacity = capacity
+        self.max_queue = max_queue
+        self.max_queue_wait = {'interactive': 2.0, 'bulk': 600.0}
+        self.max_queue_wait.update(max_queue_wait or {})
+        self.max_client_requests = max_client_requests
+
+        self._cond = threading.Condition()
+        self._queue = []
+        self._num_queued = dict((name, 0) for name in PRIORITY_CLASSES)
+        self._sequence = itertools.count()
+        self._running = []
+        self._client_requests = {}
+        self._service_time = dict((name, 0.0) for name in PRIORITY_CLASSES)
+        self.num_rejected = dict((name, 0) for name in PRIORITY_CLASSES)
+
+    def _reject(self, priority_class, client, code, message):
+        self.num_rejected[priority_class] += 1
+        self._client_requests[client] -= 1
+        if not self._client_requests[client]:
+            del self._client_requests[client]
+        self._cond.notify_all()
+        raise Fault(code, message)
+
+    def _estimated_wait(self, priority):
+        # the requests that are running plus the ones
+        # queued ahead of a new request of this priority
+        wait = sum(self._service_time[PRIORITY_CLASSES[running_priority]]
+                   for running_priority in self._running) / self.capacity
+        for entry in self._queue:
+            if entry[0] <= priority and entry[2] == 'waiting':
+                wait += self._service_time[PRIORITY_CLASSES[entry[0]]] / self.capacity
+        return wait
+
+    def acquire(self, priority_class, client):
+        priority = PRIORITY_CLASSES.index(priority_class)
+        max_wait = self.max_queue_wait[priority_class]
+        with self._cond:
+            self._client_requests[client] = self._client_requests.get(client, 0) + 1
+            if self._client_requests[client] > self.max_client_requests:
+                self._reject(priority_class, client, CLIENT_LIMIT_FAULT,
+                             'Too many concurrent requests from {}'.format(client))
+
+            if len(self._running) < self.capacity and not sum(self._num_queued.values()):
+                self._running.append(priority)
+                return time.time()
+
+            if sum(self._num_queued.values()) >= self.max_queue:
+                self._reject(priority_class, client, OVERLOADED_FAULT,
+                             'Server overloaded: request queue is full')
+            if self._estimated_wait(priority) > max_wait:
+                self._reject(priority_class, client, OVERLOADED_FAULT,
+                             'Server overloaded: expected queue wait is '
+                             'over {} seconds'.format(max_wait))
+
+            # the entries are compared by priority and sequence number
+            # and the state is changed in place when the entry is granted
+            entry = [priority, next(self._sequence), 'waiting']
+            heapq.heappush(self._queue, entry)
+            self._num_queued[priority_class] += 1
+            deadline = time.time() + max_wait
+            while entry[2] == 'waiting':
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    entry[2] = 'expired'
+                    self._num_queued[priority_class] -= 1
+                    self._reject(priority_class, client, OVERLOADED_FAULT,
+                                 'Server overloaded: request waited over '
+                                 '{} seconds'.format(max_wait))
+                self._cond.wait(remaining)
+            return time.time()
+
+    def release(self, priority_class, client, start_time):
+        priority = PRIORITY_CLASSES.index(priority_class)
+        with self._cond:
+            # keep a moving average of how long each class of
+            # requests holds on to the models
+            elapsed = time.time() - start_time
+            if self._service_time[priority_class]:
+                self._service_time[priority_class] = 0.8 * self._service_time[priority_class] + 0.2 * elapsed
+            else:
+                self._service_time[priority_class] = elapsed
+
+            self._running.remove(priority)
+            self._client_requests[client] -= 1
+            if not self._client_requests[client]:
+                del self._client_requests[client]
+
+            while len(self._running) < self.capacity and self._queue:
+                entry = heapq.heappop(self._queue)
+                if entry[2] == 'waiting':
+                    entry[2] = 'granted'
+                    self._num_queued[PRIORITY_CLASSES[entry[0]]] -= 1
+                    self._running.append(entry[0])
+            self._cond.notify_all()
+
+    def wait_until_idle(self, timeout=None):
+        deadline = time.time() + timeout if timeout is not None else None
+        with self._cond:
+            while self._running or sum(self._num_queued.values()):
+                remaining = deadline - time.time() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def status(self):
+        with self._cond:
+            return {'running': len(self._running),
+                    'queued': dict(self._num_queued),
+                    'rejected': dict(self.num_rejected),
+                    'service_time': dict(self._service_time)}
+
+
 _baseclass = SimpleXMLRPCServer
-class StoppableServer(_baseclass):
+class StoppableServer(ThreadingMixIn, _baseclass):
 
     allow_reuse_address = True
+    daemon_threads = True
 
     def __init__(self, addr, zpar_model_path, model_list, *args, **kwds):
 
+        # pop the admission control settings
+        admission_options = {}
+        for option in ['max_queue', 'max_queue_wait', 'max_client_requests']:
+            if option in kwds:
+                admission_options[option] = kwds.pop(option)
+        self.bulk_clients = set(kwds.pop('bulk_clients', []))
+        self.bulk_chunk_lines = kwds.pop('bulk_chunk_lines', 100)
+
+        # the beam width of the zpar library variant to serve
+        # the models with (the default build if not given)
+        self.beam = kwds.pop('beam', None)
+
+        # the compressions that responses over the given size
+        # are compressed with, if the client accepts them
+        self.compressions = [encoding for encoding in kwds.pop('compressions', COMPRESSIONS)
+                             if encoding in COMPRESSIONS]
+        self.compression_threshold = kwds.pop('compression_threshold', 1400)
+        kwds.setdefault('requestHandler', CompressingRequestHandler)
+
+        # the ids of the tags and labels in compact responses
+        self.vocabulary = Vocabulary()
+
+        # the instrumentation hooks that are run around each call
+        # to the models, shared by all generations of the models
+        self.hooks = kwds.pop('hooks', None)
+        if self.hooks is None:
+            self.hooks = Hooks()
+
         # store the hostname and port number
         self.myhost, self.myport = addr
 
-        # store the link to the loaded zpar object
-        self.z = ZPar(zpar_model_path)
+        # requests are read in their own threads but take turns
+        # using the models in order of their priority class
+        self.admission = AdmissionController(**admission_options)
+        self._request_info = threading.local()
+
+        # load the first generation of models; the
+        # model set is swapped out on reload
+        self.model_list = list(model_list)
+        self.models = ModelSet(zpar_model_path, self.model_list, 1, beam=self.beam,
+                               hooks=self.hooks)
+        self._models_lock = threading.Lock()
+        self._reload_thread = None
+        self.last_reload_error = None
 
         # initialize the parent class
         _baseclass.__init__(self, addr, *args, **kwds)
 
-        # Call the individual loading functions
-        # and only register the appropriate methods
-        if 'tagger' in model_list:
-            tagger = self.z.get_tagger()
-            self.register_function(tagger.tag_sentence)
-            self.register_function(tagger.tag_file)
-        if 'parser' in model_list:
-            parser = self.z.get_parser()
-            self.register_function(parser.parse_sentence)
-            self.register_function(parser.parse_file)
-            self.register_function(parser.parse_tagged_sentence)
-            self.register_function(parser.parse_tagged_file)
-        if 'depparser' in model_list:
-            parser = self.z.get_depparser()
-            self.register_function(parser.dep_parse_sentence)
-            self.register_function(parser.dep_parse_file)
-            self.register_function(parser.dep_parse_tagged_sentence)
-            self.register_function(parser.dep_parse_tagged_file)
+        # only register the methods for the models that were
+        # asked for, and route each call to the model set
+        # that is current when the call arrives; each method
+        # is also registered under each priority class (e.g.,
+        # ``bulk.tag_sentence``) to override its default class
+        for model_name in ['tagger', 'parser', 'depparser']:
+            if model_name in self.model_list:
+                for method_name in _MODEL_METHODS[model_name]:
+                    self.register_function(self._model_function(method_name),
+                                           method_name)
+                    for priority_class in PRIORITY_CLASSES:
+                        self.register_function(self._model_function(method_name,
+                                                                    priority_class),
+                                               '{}.{}'.format(priority_class, method_name))
+
+        # the sentence methods of the tagger and the dependency
+        # parser can also send their output in the compact encoding
+        for model_name in ['tagger', 'depparser']:
+            if model_name in self.model_list:
+                for method_name in _MODEL_METHODS[model_name]:
+                    if method_name not in _FILE_METHOD_FORMAT_ARG:
+                        self.register_function(self._compact_function(method_name),
+                                               'compact.{}'.format(method_name))
+
+        # register the function that runs a file method over a
+        # chunk of input sent with the request, for zpar_dispatch
+        self.register_function(self.process_chunk)
+        self.register_function(self.compact_process_chunk, 'compact.process_chunk')
+
+        # register the functions to reload the models and
+        # to check on the status of the server
+        self.register_function(self.reload_models)
+        self.register_function(self.server_status)
 
         # register the function to remotely stop the server
         self.register_function(self.stop_server)
 
+        # check for the quit flag at least this often (in seconds)
+        # since stop_server() now runs in its own request thread
+        self.timeout = 0.5
+
         self.quit = False
 
+    @property
+    def z(self):
+        return self.models.z
+
+    def process_request_thread(self, request, client_address):
+        # remember which client the request in this thread came from
+        self._request_info.client = client_address[0]
+        ThreadingMixIn.process_request_thread(self, request, client_address)
+
+    def _priority_class(self, method_name, client):
+        # file methods and requests from the bulk clients are bulk
+        # work by default and everything else is interactive
+        if method_name in _FILE_METHOD_FORMAT_ARG or client in self.bulk_clients:
+            return 'bulk'
+        return 'interactive'
+
+    def _call_model(self, method_name, args, priority_class, client):
+        start_time = self.admission.acquire(priority_class, client)
+        try:
+            with self._models_lock:
+                models = self.models
+                models.acquire()
+            try:
+                return models.functions[method_name](*args)
+            finally:
+                models.release()
+        finally:
+            self.admission.release(priority_class, client, start_time)
+
+    def _call_file_method_in_chunks(self, method_name, args, priority_class, client):
+        # ZPar reads one sentence per line, so a long bulk file is
+        # processed a chunk of lines at a time, going back into the
+        # queue between chunks so that it does not hold up other requests
+        inputfile, outputfile = args[:2]
+        if not os.path.exists(inputfile):
+            raise OSError('File {} does not exist.'.format(inputfile))
+        tempdir = tempfile.mkdtemp(prefix='zpar_server')
+        chunk_input = os.path.join(tempdir, 'input.txt')
+        chunk_output = os.path.join(tempdir, 'output.txt')
+        try:
+            with open(inputfile, 'rb') as inputf, open(outputfile, 'wb') as outputf:
+                while True:
+                    lines = list(itertools.islice(inputf, self.bulk_chunk_lines))
+                    if not lines:
+                        break
+                    with open(chunk_input, 'wb') as chunkf:
+                        chunkf.writelines(lines)
+                    self._call_model(method_name,
+                                     (chunk_input, chunk_output) + tuple(args[2:]),
+                                     priority_class,
+                                     client)
+                    with open(chunk_output, 'rb') as chunkf:
+                        shutil.copyfileobj(chunkf, outputf)
+        finally:
+            shutil.rmtree(tempdir, ignore_errors=True)
+        return None
+
+    def _model_function(self, method_name, priority_class=None):
+        format_arg = _FILE_METHOD_FORMAT_ARG.get(method_name)
+
+        def model_function(*args):
+            client = getattr(self._request_info, 'client', None)
+            request_class = priority_class or self._priority_class(method_name, client)
+            if (request_class == 'bulk' and
+                    format_arg is not None and
+                    not needs_streaming(args[0], args[1]) and
+                    tuple(args[format_arg:]) in [(), ('text',)]):
+                return self._call_file_method_in_chunks(method_name, args,
+                                                        request_class, client)
+            return self._call_model(method_name, args, request_class, client)
+
+        model_function.__name__ = str(method_name)
+        return model_function
+
+    def _compact_function(self, method_name):
+        model_function = self._model_function(method_name)
+
+        def compact_function(known_vocab, *args):
+            return compact_response(method_name, model_function(*args),
+                                    self.vocabulary, known_vocab)
+
+        compact_function.__name__ = str(method_name)
+        return compact_function
+
+    def process_chunk(self, method_name, data, args=()):
+        """
+        Run the given file method over the given chunk of input, one
+        sentence per line, with the given extra arguments and return its
+        output, so that clients on other hosts do not need to share files
+        with the server. Like the other file methods, the chunk is bulk
+        work, but it is processed in one go rather than in smaller chunks.
+        """
+        if method_name not in _FILE_METHOD_FORMAT_ARG or method_name not in self.models.functions:
+            raise Fault(1, 'Unknown file method {}'.format(method_name))
+        client = getattr(self._request_info, 'client', None)
+        tempdir = tempfile.mkdtemp(prefix='zpar_server')
+        chunk_input = os.path.join(tempdir, 'input.txt')
+        chunk_output = os.path.join(tempdir, 'output.txt')
+        try:
+            with open(chunk_input, 'wb') as chunkf:
+                chunkf.write(getattr(data, 'data', data))
+            self._call_model(method_name,
+                             (chunk_input, chunk_output) + tuple(args),
+                             self._priority_class(method_name, client),
+                             client)
+            with open(chunk_output, 'rb') as chunkf:
+                return Binary(chunkf.read())
+        finally:
+            shutil.rmtree(tempdir, ignore_errors=True)
+
+    def compact_process_chunk(self, known_vocab, method_name, data, args=()):
+        """
+        Like ``process_chunk()`` but with the output of the tagger and
+        the dependency parser in the compact encoding.
+        """
+        output = self.process_chunk(method_name, data, args)
+        return compact_response(method_name, output.data.decode('utf-8'),
+                                self.vocabulary, known_vocab)
+
+    def _reload(self, zpar_model_path):
+        with self._models_lock:
+            generation = self.models.generation + 1
+        logging.info('Loading generation {} models from '
+                     '{} ...'.format(generation, zpar_model_path))
+        try:
+            new_models = ModelSet(zpar_model_path, self.model_list, generation,
+                                  beam=self.beam, hooks=self.hooks)
+        except Exception as e:
+            logging.error('Reload from {} failed: {}'.format(zpar_model_path, e))
+            self.last_reload_error = str(e)
+            return
+
+        # switch new requests over to the new models and let
+        # the old ones go once their in-flight requests are done
+        with self._models_lock:
+            old_models = self.models
+            self.models = new_models
+        self.last_reload_error = None
+        logging.info('Now serving generation {} models '
+                     '({})'.format(generation, new_models.version))
+        old_models.retire()
+
+    def reload_models(self, zpar_model_path=None):
+        if self._reload_thread and self._reload_thread.is_alive():
+            return 1, "Reload already in progress on host %r, port %r" % (self.myhost, self.myport)
+
+        zpar_model_path = zpar_model_path or self.models.model_path
+        if not os.path.isdir(zpar_model_path):
+            return 1, "Model directory %r does not exist" % zpar_model_path
+
+        self._reload_thread = threading.Thread(target=self._reload,
+                                               args=(zpar_model_path,))
+        self._reload_thread.daemon = True
+        self._reload_thread.start()
+        return 0, "Reloading models from %r on host %r, port %r" % (zpar_model_path, self.myhost, self.myport)
+
+    def server_status(self):
+        models = self.models
+        return {'ready': models.z is not None and not self.quit,
+                'models': models.model_list,
+                'model_dir': models.model_path,
+                'model_version': models.version,
+                'beam': models.beam,
+                'compressions': self.compressions,
+                'generation': models.generation,
+                'loaded_at': models.loaded_at,
+                'reloading': bool(self._reload_thread and self._reload_thread.is_alive()),
+                'last_reload_error': self.last_reload_error,
+                'admission': self.admission.status()}
+
     def serve_forever(self):
         while not self.quit:
             try:
@@ -75,7 +558,10 @@ class StoppableServer(_baseclass):
             except KeyboardInterrupt:
                 print("\nKeyboard interrupt received, exiting.")
                 break
-        self.z.close()
+        if self._reload_thread:
+            self._reload_thread.join()
+        self.admission.wait_until_idle(timeout=60)
+        self.models.close()
         self.server_close()
 
     def stop_server(self):
@@ -109,6 +595,69 @@ def main():
                         default=False,
                         help="Log server requests")
 
+    parser.add_argument('--max-queue', dest='max_queue', type=int,
+                        help="Maximum number of requests waiting for the models",
+                        default=100,
+                        required=False)
+
+    parser.add_argument('--max-queue-wait', dest='max_queue_wait', type=float,
+                        help="Maximum seconds an interactive request may wait",
+                        default=2.0,
+                        required=False)
+
+    parser.add_argument('--max-bulk-queue-wait', dest='max_bulk_queue_wait',
+                        type=float,
+                        help="Maximum seconds a bulk request may wait",
+                        default=600.0,
+                        required=False)
+
+    parser.add_argument('--max-client-requests', dest='max_client_requests',
+                        type=int,
+                        help="Maximum concurrent requests from one client",
+                        default=8,
+                        required=False)
+
+    parser.add_argument('--bulk-clients', dest='bulk_clients', nargs='+',
+                        help="Treat all requests from these client "
+                             "addresses as bulk work",
+                        default=[],
+                        required=False)
+
+    parser.add_argument('--bulk-chunk-lines', dest='bulk_chunk_lines',
+                        type=int,
+                        help="Number of lines of a bulk file to process "
+                             "before letting other requests in",
+                        default=100,
+                        required=False)
+
+    parser.add_argument('--beam', dest='beam', type=int,
+                        help="Serve the models with the zpar library built "
+                             "with this beam width (1 for greedy decoding; "
+                             "the default build if not given)",
+                        required=False)
+
+    parser.add_argument('--compression', dest='compressions', nargs='+',
+                        choices=['zstd', 'gzip', 'none'],
+                        help="Compress large responses with the first of "
+                             "these that the client accepts (zstd needs "
+                             "the zstandard package)",
+                        default=COMPRESSIONS,
+                        required=False)
+
+    parser.add_argument('--compression-threshold', dest='compression_threshold',
+                        type=int,
+                        help="Only compress responses larger than this "
+                             "many bytes",
+                        default=1400,
+                        required=False)
+
+    parser.add_argument('--hooks', dest='hooks', nargs='+',
+                        help="Register instrumentation hooks by calling "
+                             "these functions, given as module:function, "
+                             "with the server's hook registry",
+                        default=[],
+                        required=False)
+
 
     # parse given command line arguments
     args = parser.parse_args()
@@ -122,17 +671,42 @@ def main():
     # set up the logging
     logging.basicConfig(format='%(levelname)s:%(message)s', level=logging.INFO)
 
+    if set(args.compressions).difference(COMPRESSIONS + ['none']):
+        logging.warning('The zstandard package is not installed, so responses '
+                        'will not be compressed with zstd.')
+
+    # let the given functions register their hooks
+    hooks = Hooks()
+    for spec in args.hooks:
+        logging.info('Registering hooks from {} ...'.format(spec))
+        load_hook_setup(spec)(hooks)
+
     # Create a server that is built on top of this ZPAR data structure
     logging.info('Initializing server ...')
     server = StoppableServer((args.hostname, args.port),
                              args.modeldir, args.models,
                              logRequests=args.log,
-                             allow_none=True)
+                             allow_none=True,
+                             max_queue=args.max_queue,
+                             max_queue_wait={'interactive': args.max_queue_wait,
+                                             'bulk': args.max_bulk_queue_wait},
+                             max_client_requests=args.max_client_requests,
+                             bulk_clients=args.bulk_clients,
+                             bulk_chunk_lines=args.bulk_chunk_lines,
+                             beam=args.beam,
+                             compressions=args.compressions,
+                             compression_threshold=args.compression_threshold,
+                             hooks=hooks)
 
     # Register introspection functions with the server
     logging.info('Registering introspection ...')
     server.register_introspection_functions()
 
+    # reload the models from the same directory on SIGHUP
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP,
+                      lambda signum, frame: server.reload_models())
+
     # Start the server
     logging.info('Starting server on port {}...'.format(args.port))
     server.serve_forever()